@@ -0,0 +1,253 @@
+"""Contrôle d'admission devant le formulaire de soumission.
+
+Middleware WSGI placé avant Flask : il refuse les soumissions en excès
+(429 + Retry-After) avant que Werkzeug ne lise le corps multipart.
+
+- seaux à jetons par IP et global pour les nouvelles soumissions
+  (POST /formulaire, POST /upload-sessions)
+- nombre maximal d'envois simultanés, fragments PATCH compris, calculé
+  pour laisser aux pages admin une part réservée de la capacité
+  (ADMISSION_ADMIN_RESERVED_SHARE) ; la capacité par défaut est celle des
+  workers gunicorn (GUNICORN_THREADS ou GUNICORN_WORKER_CONNECTIONS)
+- état en mémoire par processus, ou partagé entre workers et instances via
+  Redis (ADMISSION_REDIS_URL)
+"""
+import json
+import math
+import time
+import threading
+
+from engine_profiles import server_concurrency
+
+try:
+    import redis
+except ImportError:  # Redis n'est requis que pour un état partagé
+    redis = None
+
+
+class MemoryAdmissionStore:
+    """État d'admission local au processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._counters = {}
+
+    def take(self, key, rate, burst):
+        """Prendre un jeton ; retourne (accepté, secondes avant le prochain jeton)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return True, 0
+            self._buckets[key] = (tokens, now)
+
+            # Éviter que la table des IP ne grossisse sans fin
+            if len(self._buckets) > 10000:
+                limit = now - burst / rate
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] > limit}
+            return False, (1 - tokens) / rate
+
+    def acquire(self, key, limit):
+        with self._lock:
+            count = self._counters.get(key, 0)
+            if count >= limit:
+                return False
+            self._counters[key] = count + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._counters[key] = max(0, self._counters.get(key, 0) - 1)
+
+
+class RedisAdmissionStore:
+    """État d'admission partagé entre workers et instances"""
+
+    TAKE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring((1 - tokens) / rate)}
+    """
+
+    ACQUIRE_SCRIPT = """
+    local count = redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+    if count > tonumber(ARGV[1]) then
+        redis.call('DECR', KEYS[1])
+        return 0
+    end
+    return 1
+    """
+
+    def __init__(self, url, prefix='admission:', slot_ttl=300):
+        if redis is None:
+            raise RuntimeError("Le paquet redis est requis pour ADMISSION_REDIS_URL")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        # Un worker tué en plein envoi ne bloque pas un emplacement indéfiniment
+        self.slot_ttl = slot_ttl
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+        self._acquire = self.client.register_script(self.ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, retry_after = self._take(keys=[self.prefix + key], args=[rate, burst, time.time()])
+        return bool(allowed), max(0.0, float(retry_after))
+
+    def acquire(self, key, limit):
+        return bool(self._acquire(keys=[self.prefix + key], args=[limit, self.slot_ttl]))
+
+    def release(self, key):
+        self.client.decr(self.prefix + key)
+
+
+class _ReleasingIterable:
+    """Libérer l'emplacement d'envoi quand la réponse est terminée."""
+
+    def __init__(self, iterable, release):
+        self._iterable = iterable
+        self._release = release
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            self._release()
+
+
+class AdmissionMiddleware:
+    """Middleware WSGI d'admission des soumissions"""
+
+    def __init__(self, wsgi_app, config, store=None):
+        self.wsgi_app = wsgi_app
+        self.per_ip_rate = config['ADMISSION_PER_IP_RATE'] / 60.0
+        self.per_ip_burst = config['ADMISSION_PER_IP_BURST']
+        self.global_rate = config['ADMISSION_GLOBAL_RATE'] / 60.0
+        self.global_burst = config['ADMISSION_GLOBAL_BURST']
+        self.trust_proxy = config['ADMISSION_TRUST_PROXY']
+        self.proxy_hops = max(1, config.get('ADMISSION_PROXY_HOPS', 1))
+
+        if store is not None:
+            self.store = store
+        elif config.get('ADMISSION_REDIS_URL'):
+            self.store = RedisAdmissionStore(config['ADMISSION_REDIS_URL'])
+        else:
+            self.store = MemoryAdmissionStore()
+
+        # Part de la capacité que les envois ne peuvent jamais occuper
+        capacity = config['ADMISSION_CAPACITY'] or self.default_capacity(self.store)
+        reserved = math.ceil(capacity * config['ADMISSION_ADMIN_RESERVED_SHARE'])
+        self.max_inflight = max(1, min(
+            config['ADMISSION_MAX_INFLIGHT_UPLOADS'],
+            capacity - reserved
+        ))
+
+    @staticmethod
+    def default_capacity(store):
+        """Requêtes simultanées des workers gunicorn (exportées par gunicorn.conf.py)."""
+        workers, per_worker = server_concurrency()
+        # Compteur Redis partagé par tous les workers, compteur mémoire par processus
+        if isinstance(store, RedisAdmissionStore):
+            return workers * per_worker
+        return per_worker
+
+    @staticmethod
+    def is_submission(environ):
+        method = environ.get('REQUEST_METHOD')
+        path = environ.get('PATH_INFO', '')
+        if method == 'POST' and path in ('/formulaire', '/upload-sessions'):
+            return True
+        return method == 'PATCH' and path.startswith('/upload-sessions/')
+
+    def client_ip(self, environ):
+        if self.trust_proxy:
+            # Les premières entrées viennent du client et peuvent être falsifiées :
+            # seule celle ajoutée par le proxy de confiance est retenue
+            hops = [hop.strip() for hop in environ.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+            if len(hops) >= self.proxy_hops:
+                return hops[-self.proxy_hops]
+        return environ.get('REMOTE_ADDR', 'inconnu')
+
+    def reject(self, environ, start_response, retry_after, reason):
+        retry_after = max(1, math.ceil(retry_after))
+        message = "Trop de demandes en cours, veuillez réessayer dans quelques instants."
+        if 'application/json' in environ.get('HTTP_ACCEPT', '') or environ.get('REQUEST_METHOD') == 'PATCH':
+            body = json.dumps({'error': message, 'reason': reason, 'retry_after': retry_after}).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            body = message.encode('utf-8')
+            content_type = 'text/plain; charset=utf-8'
+        start_response('429 Too Many Requests', [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(retry_after)),
+        ])
+        # Le corps de la requête n'est pas lu : le serveur WSGI le vide ou ferme
+        # la connexion (en-tête hop-by-hop interdit aux applications)
+        return [body]
+
+    def __call__(self, environ, start_response):
+        if not self.is_submission(environ):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            # Les fragments d'un envoi déjà admis ne consomment pas de jeton
+            if environ.get('REQUEST_METHOD') == 'POST':
+                allowed, retry_after = self.store.take(
+                    'ip:' + self.client_ip(environ), self.per_ip_rate, self.per_ip_burst
+                )
+                if not allowed:
+                    return self.reject(environ, start_response, retry_after, 'per_ip')
+
+                allowed, retry_after = self.store.take('global', self.global_rate, self.global_burst)
+                if not allowed:
+                    return self.reject(environ, start_response, retry_after, 'global')
+
+            if not self.store.acquire('inflight', self.max_inflight):
+                return self.reject(environ, start_response, 2, 'concurrency')
+        except Exception as e:
+            # Un magasin partagé indisponible ne doit pas bloquer les étudiants
+            print(f"✗ Erreur contrôle d'admission: {str(e)}")
+            return self.wsgi_app(environ, start_response)
+
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                try:
+                    self.store.release('inflight')
+                except Exception as e:
+                    print(f"✗ Erreur libération emplacement d'envoi: {str(e)}")
+
+        try:
+            return _ReleasingIterable(self.wsgi_app(environ, start_response), release)
+        except Exception:
+            release()
+            raise
+
+
+def init_admission(app):
+    if not app.config['ADMISSION_ENABLED']:
+        return None
+    middleware = AdmissionMiddleware(app.wsgi_app, app.config)
+    app.wsgi_app = middleware
+    return middleware
@@ -1,24 +1,100 @@
 import os
-import time
-import threading
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, session, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, session
 from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import io
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.lib.colors import HexColor
-import requests
 
 from config import Config
-from database import db, StudentRequest
+from engine_profiles import init_engine_profiles, apply_engine_profiles
+from database import db, StudentRequest, Document, FormSubmission, DOCUMENT_FIELDS
+from storage import init_storage, get_storage
+from replica import init_replica, read_only, mark_primary_reads
+from admission import init_admission
+from notifications import init_notifications
+from mailer import init_mailer
+from email_events import init_email_events, is_suppressed, filter_suppressed, delivery_status
+from inventory import init_inventory, HashingReader, register_document, forget_documents, storage_report
+from assets import init_assets
+from compression import init_compression
+from uploads import init_uploads, upload_ready, claim_upload
+from offline import init_offline
+from archive import init_archive
+from rollups import init_rollups, region_totals
+from warmup import init_warmup
+from profiler import init_profiler
+from bulk import init_bulk
+from review import init_review, record_decision
+from dossier import init_dossier, prepare_dossier, discard_dossier
+from segments import init_segments, load_segment, segment_recipients, resolve_segment, criteria_from_recipient_type
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Réglages du moteur selon la base (SQLite WAL, pool PostgreSQL...)
+init_engine_profiles(app)
+
 # Initialize database
 db.init_app(app)
+apply_engine_profiles(app, db)
+
+# Réplica en lecture seule pour les pages admin (DATABASE_REPLICA_URL)
+init_replica(app)
+
+# Stockage des documents (disque local ou S3)
+init_storage(app)
+
+# Contrôle d'admission des soumissions (avant la lecture du multipart)
+init_admission(app)
+
+# Fichiers statiques empreintés (python assets.py build)
+init_assets(app)
+
+# Compression gzip/brotli des pages et réponses JSON
+init_compression(app)
+
+# Envois fragmentés reprenables des documents
+init_uploads(app)
+
+# File d'envoi des emails SendGrid (hors du chemin des requêtes)
+init_mailer(app)
+
+# Formulaire hors ligne (service worker /sw.js)
+init_offline(app)
+
+# Webhook des événements SendGrid et liste de suppression
+init_email_events(app)
+
+# Inventaire des documents et nettoyage des orphelins (flask reconcile-uploads)
+init_inventory(app)
+
+# Archivage des demandes traitées anciennes (flask archive-requests)
+init_archive(app)
+
+# Agrégats journaliers pour les graphiques (flask backfill-rollups)
+init_rollups(app)
+
+# Sonde de disponibilité /healthz (voir gunicorn.conf.py)
+init_warmup(app)
+
+# Profilage des pages admin à la demande (?_profile=1)
+init_profiler(app)
+
+# Import et export JSONL (flask import-requests / export-requests)
+init_bulk(app)
+
+# File de revue des demandes en attente avec préchargement
+init_review(app)
+
+# Destinataires des emails groupés résolus côté serveur
+init_segments(app)
+
+# Dossier PDF unique par demande et archive ZIP de dossiers
+init_dossier(app)
 
 # Create necessary directories
 upload_folder = app.config['UPLOAD_FOLDER']
@@ -28,6 +104,20 @@ os.makedirs('instance', exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def delete_request_files(student_request):
+    """Supprimer du stockage les documents d'une demande"""
+    storage = get_storage()
+    for field in DOCUMENT_FIELDS:
+        filename = getattr(student_request, field)
+        if filename:
+            try:
+                if storage.delete(filename):
+                    print(f"✓ Fichier supprimé: {filename}")
+            except Exception as e:
+                print(f"✗ Erreur suppression fichier {filename}: {str(e)}")
+    forget_documents(student_request.id)
+    discard_dossier(student_request.id)
+
 def init_database():
     """Initialiser la base de données"""
     with app.app_context():
@@ -44,71 +134,15 @@ def init_database():
             except Exception as e2:
                 print(f"✗ Erreur grave: {str(e2)}")
 
-# Fonction SendGrid améliorée avec timeout
+# Envoi SendGrid (appel bloquant, voir mailer.py)
 def send_email_sendgrid(to_email, subject, body, from_email=None):
     """Envoyer un email via SendGrid API v3"""
-    try:
-        api_key = app.config['SENDGRID_API_KEY']
-        if not api_key:
-            print("✗ SendGrid API Key non configurée")
-            return False
-        
-        if from_email is None:
-            from_email = app.config['MAIL_DEFAULT_SENDER']
-            if not from_email:
-                print("✗ Expéditeur non configuré")
-                return False
-        
-        # URL de l'API SendGrid
-        url = "https://api.sendgrid.com/v3/mail/send"
-        
-        # Headers avec l'API Key
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Données JSON pour SendGrid
-        data = {
-            "personalizations": [
-                {
-                    "to": [{"email": to_email}],
-                    "subject": subject
-                }
-            ],
-            "from": {"email": from_email},
-            "content": [
-                {
-                    "type": "text/plain",
-                    "value": body
-                }
-            ]
-        }
-        
-        # Envoyer la requête avec timeout
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        if response.status_code in [200, 202]:
-            print(f"✓ Email envoyé à {to_email}")
-            return True
-        else:
-            print(f"✗ Erreur SendGrid ({response.status_code}): {response.text[:200]}")
-            return False
-            
-    except requests.exceptions.Timeout:
-        print(f"✗ Timeout SendGrid pour {to_email}")
-        return False
-    except Exception as e:
-        print(f"✗ Exception SendGrid pour {to_email}: {str(e)}")
-        return False
+    return app.extensions['mailer'].deliver(to_email, subject, body, from_email)
 
 # Fonction pour envoyer des emails en arrière-plan
 def send_email_async(to_email, subject, body):
-    """Envoyer un email en arrière-plan"""
-    try:
-        send_email_sendgrid(to_email, subject, body)
-    except Exception as e:
-        print(f"Erreur dans send_email_async: {str(e)}")
+    """Mettre un email dans la file d'envoi du processus"""
+    return app.extensions['mailer'].send(to_email, subject, body)
 
 # Routes
 @app.route('/')
@@ -133,6 +167,13 @@ def formulaire():
             email = request.form.get('email', '').strip().lower()
             region_universitaire = request.form.get('region_universitaire', 'Dakar').strip()
             
+            # Identifiant d'envoi (offline.js) : un envoi rejoué n'est pas enregistré deux fois
+            submission_id = request.form.get('submission_id', '').strip()
+            if not (0 < len(submission_id) <= 64 and submission_id.replace('-', '').isalnum()):
+                submission_id = None
+            if submission_id and db.session.get(FormSubmission, submission_id):
+                return submission_already_recorded(submission_id)
+            
             # Validate required fields
             if not all([nom, prenom, adresse, telephone, email, region_universitaire]):
                 flash('Tous les champs sont obligatoires', 'error')
@@ -169,8 +210,24 @@ def formulaire():
                 'copie_cni': 'copie_cni'
             }
             
+            # Documents déjà envoyés par fragments (voir uploads.py)
+            upload_ids = {
+                field: request.form.get(f'{field}_upload_id', '').strip()
+                for field in files_required
+            }
+            upload_tokens = {
+                field: request.form.get(f'{field}_upload_token', '').strip()
+                for field in files_required
+            }
+            
             # Vérifier d'abord tous les fichiers
             for field, file_key in files_required.items():
+                if upload_ids[field]:
+                    if not upload_ready(upload_ids[field], field, upload_tokens[field]):
+                        flash(f'L\'envoi du fichier {field.replace("_", " ")} est incomplet, veuillez le reprendre', 'error')
+                        return redirect(url_for('formulaire'))
+                    continue
+                
                 file = request.files.get(file_key)
                 if not file or file.filename == '':
                     flash(f'Le fichier {field.replace("_", " ")} est requis', 'error')
@@ -183,18 +240,26 @@ def formulaire():
             # Sauvegarder la demande d'abord
             db.session.add(new_request)
             db.session.flush()  # Get the ID without committing
+            if submission_id:
+                db.session.add(FormSubmission(id=submission_id, request_id=new_request.id))
             
             # Ensuite sauvegarder les fichiers
             for field, file_key in files_required.items():
+                if upload_ids[field]:
+                    filename = claim_upload(upload_ids[field], field, new_request.id, upload_tokens[field])
+                    setattr(new_request, field, filename)
+                    continue
+                
                 file = request.files.get(file_key)
                 if file and file.filename and allowed_file(file.filename):
                     # Utiliser un nom de fichier simple
                     ext = file.filename.rsplit('.', 1)[1].lower()
                     filename = secure_filename(f"{new_request.id}_{field}.{ext}")
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                     
-                    # Sauvegarder le fichier
-                    file.save(filepath)
+                    # Sauvegarder le fichier (taille et empreinte calculées au passage)
+                    reader = HashingReader(file.stream)
+                    get_storage().save(reader, filename, file.mimetype)
+                    register_document(filename, new_request.id, field, reader)
                     setattr(new_request, field, filename)
             
             # Commit toutes les données
@@ -215,6 +280,14 @@ def formulaire():
             flash('Votre demande a été soumise avec succès!', 'success')
             return redirect(url_for('information'))
             
+        except IntegrityError as e:
+            db.session.rollback()
+            # Même envoi enregistré entre-temps par une requête concurrente
+            if submission_id and db.session.get(FormSubmission, submission_id):
+                return submission_already_recorded(submission_id)
+            print(f"Erreur lors de la soumission: {str(e)}")
+            flash('Une erreur est survenue. Veuillez réessayer.', 'error')
+            return redirect(url_for('formulaire'))
         except Exception as e:
             db.session.rollback()
             print(f"Erreur lors de la soumission: {str(e)}")
@@ -225,7 +298,22 @@ def formulaire():
         'Tambacounda', 'Kaolack', 'Fatick', 'Diourbel', 'Louga',
         'Matam', 'Kédougou', 'Sédhiou'
     ]
-    return render_template('form.html', regions_universitaires=regions_universitaires)
+    return render_template('form.html',
+                         regions_universitaires=regions_universitaires,
+                         image_max_dimension=app.config['IMAGE_MAX_DIMENSION'],
+                         image_jpeg_quality=app.config['IMAGE_JPEG_QUALITY'])
+
+def submission_already_recorded(submission_id):
+    """Réponse à un envoi déjà enregistré : la même redirection que la première fois"""
+    print(f"✓ Envoi {submission_id} déjà enregistré, demande non dupliquée")
+    existing = db.session.get(FormSubmission, submission_id)
+    student = db.session.get(StudentRequest, existing.request_id) if existing else None
+    if student:
+        session['est_inscrit'] = True
+        session['nom_utilisateur'] = f"{student.prenom} {student.nom}"
+        session['email_utilisateur'] = student.email
+    flash('Votre demande a été soumise avec succès!', 'success')
+    return redirect(url_for('information'))
 
 def send_confirmation_email(to_email, nom, prenom, request_id):
     """Envoyer un email de confirmation à l'étudiant"""
@@ -242,18 +330,12 @@ Cordialement,
 La Commission Sociale REED
 """
     
-    try:
-        # Envoyer en arrière-plan
-        thread = threading.Thread(
-            target=send_email_async,
-            args=(to_email, subject, message)
-        )
-        thread.daemon = True
-        thread.start()
+    if is_suppressed(to_email):
+        print(f"✗ Adresse supprimée, confirmation non envoyée: {to_email}")
+        return
+    
+    if send_email_async(to_email, subject, message):
         print(f"✓ Email de confirmation programmé pour {to_email}")
-        
-    except Exception as email_error:
-        print(f"✗ Erreur d'envoi d'email: {email_error}")
 
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -276,6 +358,7 @@ def admin_login():
     return render_template('admin_login.html')
 
 @app.route('/admin/dashboard')
+@read_only
 def admin_dashboard():
     if not session.get('admin_logged_in'):
         flash('Veuillez vous connecter', 'error')
@@ -287,15 +370,8 @@ def admin_dashboard():
         approved_count = StudentRequest.query.filter_by(status='approved').count()
         rejected_count = StudentRequest.query.filter_by(status='rejected').count()
         
-        # NOUVEAU: Statistiques par région
-        regions_stats = {}
-        regions = StudentRequest.query.with_entities(
-            StudentRequest.region_universitaire,
-            db.func.count(StudentRequest.id).label('count')
-        ).group_by(StudentRequest.region_universitaire).all()
-        
-        for region, count in regions:
-            regions_stats[region] = count
+        # Statistiques par région (demandes actives), lues sur les agrégats journaliers
+        regions_stats = region_totals()
         
         return render_template('admin_dashboard.html', 
                              requests=requests,
@@ -321,51 +397,57 @@ def view_request(request_id):
     
     try:
         student_request = StudentRequest.query.get_or_404(request_id)
-        return render_template('view_request.html', request=student_request)
+        # Le dossier fusionné se construit pendant la lecture de la page
+        dossier = prepare_dossier(student_request)
+        return render_template('view_request.html',
+                             request=student_request,
+                             delivery=delivery_status(student_request.email),
+                             dossier=dossier)
     except Exception as e:
         flash('Demande non trouvée', 'error')
         return redirect(url_for('admin_dashboard'))
 
 @app.route('/uploads/<path:filename>')
 def serve_uploaded_file(filename):
-    """Servir les fichiers uploadés depuis le dossier d'uploads"""
+    """Servir les fichiers uploadés depuis le stockage (URL présignée pour S3)"""
     try:
-        # Chemin sécurisé vers le fichier
-        upload_folder = app.config['UPLOAD_FOLDER']
-        file_path = os.path.join(upload_folder, filename)
+        storage = get_storage()
         
-        # Vérifier que le fichier existe et est dans le bon dossier
-        if not os.path.exists(file_path):
+        # Vérifier que le fichier existe
+        if not storage.exists(filename):
             return "Fichier non trouvé", 404
         
         # Servir le fichier
-        return send_from_directory(upload_folder, filename)
+        return storage.send(filename)
     except Exception as e:
         print(f"Erreur serveur fichier: {str(e)}")
         return "Erreur serveur", 500
 
 @app.route('/check-uploads')
 def check_uploads():
-    """Vérifier les fichiers dans le dossier uploads"""
+    """Vérifier les fichiers du stockage à partir de l'inventaire"""
     upload_folder = app.config['UPLOAD_FOLDER']
     files = []
     
-    if os.path.exists(upload_folder):
-        for f in os.listdir(upload_folder):
-            filepath = os.path.join(upload_folder, f)
-            if os.path.isfile(filepath):
-                files.append({
-                    'name': f,
-                    'size': os.path.getsize(filepath),
-                    'path': filepath,
-                    'url': f'/uploads/{f}'
-                })
+    documents = Document.query.order_by(Document.id.desc()).limit(500).all()
+    for document in documents:
+        files.append({
+            'name': document.filename,
+            'size': document.size,
+            'mime_type': document.mime_type,
+            'request_id': document.request_id,
+            'url': f'/uploads/{document.filename}'
+        })
     
+    report = storage_report()
     return jsonify({
         'upload_folder': upload_folder,
+        'storage_backend': app.config['STORAGE_BACKEND'],
         'exists': os.path.exists(upload_folder),
         'files': files,
-        'total': len(files)
+        'total': report['total'],
+        'total_size': report['total_size'],
+        'orphans': report['orphans']
     })
 
 @app.route('/admin/update_status/<int:request_id>', methods=['POST'])
@@ -384,15 +466,7 @@ def update_status(request_id):
         notes = data.get('notes', '')
         
         if status in ['pending', 'approved', 'rejected']:
-            old_status = student_request.status
-            student_request.status = status
-            student_request.admin_notes = notes
-            student_request.date_processed = datetime.utcnow()
-            db.session.commit()
-            
-            # Envoyer un email à l'étudiant si le statut change
-            if old_status != status:
-                send_status_email(student_request, status, notes)
+            record_decision(student_request, status, notes)
             
             return jsonify({'success': True, 'message': 'Statut mis à jour'})
         else:
@@ -402,11 +476,8 @@ def update_status(request_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def send_status_email(student, status, notes):
-    """Envoyer un email à l'étudiant concernant le statut de sa demande"""
-    if not student.email:
-        return
-    
+def build_status_email(student, status, notes):
+    """Construire le sujet et le message de l'email de statut"""
     if status == 'approved':
         subject = "Félicitations ! Votre demande de logement a été acceptée"
         message = f"""Cher(e) {student.prenom} {student.nom},
@@ -420,14 +491,14 @@ Bienvenue dans notre communauté !
         subject = "Décision concernant votre demande de logement"
         message = f"""Cher(e) {student.prenom} {student.nom},
 
-Après examen de votre demande de logement du (ID: {student.de}), nous regrettons de vous informer qu'elle n'a pas pu être acceptée pour le moment.
+Après examen de votre demande de logement (ID: {student.id}), nous regrettons de vous informer qu'elle n'a pas pu être acceptée pour le moment.
 
 """
     else:
         subject = "Mise à jour sur votre demande de logement"
         message = f"""Cher(e) {student.prenom} {student.nom},
 
-Votre demande de logement du (ID: {student.date}) est actuellement en cours de traitement par notre équipe.
+Votre demande de logement (ID: {student.id}) est actuellement en cours de traitement par notre équipe.
 
 Nous vous contacterons dès que nous aurons une décision.
 
@@ -442,18 +513,29 @@ Merci pour votre compréhension.
 Cordialement,
 La Commission Sociale REED
 """
+    return subject, message
+
+def deliver_status_email(student, status, notes, wait=False):
+    """Envoyer l'email de statut (utilisé par la file de notifications)
+
+    wait=True : envoi bloquant, depuis le thread des notifications ; sinon
+    l'email est mis dans la file d'envoi. Retourne False si l'email n'a pas
+    pu être envoyé ou mis en file.
+    """
+    if not student.email:
+        return True
     
-    try:
-        # Envoyer en arrière-plan
-        thread = threading.Thread(
-            target=send_email_async,
-            args=(student.email, subject, message)
-        )
-        thread.daemon = True
-        thread.start()
-        print(f"✓ Email de statut programmé pour {student.email}")
-    except Exception as e:
-        print(f"✗ Erreur d'envoi d'email de statut: {e}")
+    if is_suppressed(student.email):
+        print(f"✗ Adresse supprimée, email de statut non envoyé: {student.email}")
+        return True
+    
+    subject, message = build_status_email(student, status, notes)
+    if wait:
+        return send_email_sendgrid(student.email, subject, message)
+    return send_email_async(student.email, subject, message)
+
+# Emails de statut regroupés (NOTIFY_QUIET_SECONDS)
+init_notifications(app, deliver_status_email)
 
 @app.route('/admin/send_email', methods=['POST'])
 def send_email():
@@ -471,73 +553,62 @@ def send_email():
         message = data.get('message', '').strip()
         custom_emails = data.get('custom_emails', [])
         selected_ids = data.get('selected_ids', [])
+        segment_token = data.get('segment_token')
         
         if not subject or not message:
             return jsonify({'error': 'Sujet et message sont requis'}), 400
         
-        # Récupérer les destinataires
-        emails_list = []
-        recipients = []
-        
+        # Récupérer les destinataires : segment déjà résolu (segments.py) ou type de destinataires
         try:
-            if recipient_type == 'approved':
-                recipients = StudentRequest.query.filter_by(status='approved').all()
-                emails_list = [s.email for s in recipients if s.email]
-            elif recipient_type == 'rejected':
-                recipients = StudentRequest.query.filter_by(status='rejected').all()
-                emails_list = [s.email for s in recipients if s.email]
-            elif recipient_type == 'pending':
-                recipients = StudentRequest.query.filter_by(status='pending').all()
-                emails_list = [s.email for s in recipients if s.email]
-            elif recipient_type == 'selected' and selected_ids:
-                recipients = StudentRequest.query.filter(StudentRequest.id.in_(selected_ids)).all()
-                emails_list = [s.email for s in recipients if s.email]
-            elif recipient_type == 'custom' and custom_emails:
-                emails_list = [email.strip() for email in custom_emails if email.strip()]
-                recipients = []  # Pas de données étudiant pour emails personnalisés
+            if segment_token:
+                segment = load_segment(segment_token)
+                if segment is None:
+                    return jsonify({'error': 'Sélection expirée, veuillez recalculer les destinataires'}), 410
+                recipients = segment_recipients(segment)
+                skipped_count = segment.skipped
+                # La liste de suppression a pu changer depuis la résolution
+                deliverable = set(filter_suppressed([email for _, email in recipients]))
+                skipped_count += len(recipients) - len(deliverable)
+                recipients = [(request_id, email) for request_id, email in recipients if email in deliverable]
             else:
-                recipients = StudentRequest.query.all()
-                emails_list = [s.email for s in recipients if s.email]
+                criteria = criteria_from_recipient_type(recipient_type, selected_ids, custom_emails)
+                recipients, skipped_count = resolve_segment(criteria)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as db_error:
             print(f"Erreur DB: {str(db_error)}")
             return jsonify({'error': 'Erreur base de données'}), 500
         
-        # Filtrer les emails valides
-        valid_emails = [email for email in emails_list if email and '@' in email and '.' in email]
-        
-        if not valid_emails:
+        if not recipients:
             return jsonify({'error': 'Aucun destinataire valide trouvé'}), 400
         
+        total_count = len(recipients)
+        
         # Limiter à 10 emails pour éviter les limites
-        valid_emails = valid_emails[:10]
+        recipients = recipients[:10]
+        
+        # Demandes des destinataires, pour personnaliser le message
+        ids = [request_id for request_id, _ in recipients if request_id is not None]
+        students = {s.id: s for s in StudentRequest.query.filter(StudentRequest.id.in_(ids)).all()} if ids else {}
         
         # Envoyer les emails en arrière-plan
         sent_count = 0
         
-        for email in valid_emails:
+        for request_id, email in recipients:
             try:
                 # Personnaliser le message si possible
                 personalized_message = message
-                if recipient_type in ['approved', 'rejected', 'pending', 'selected', 'all'] and recipients:
-                    student = next((s for s in recipients if s.email == email), None)
-                    if student:
-                        personalized_message = message.replace('{nom}', student.nom or '')
-                        personalized_message = personalized_message.replace('{prenom}', student.prenom or '')
-                        personalized_message = personalized_message.replace('{id}', str(student.id))
-                        if student.date_submitted:
-                            personalized_message = personalized_message.replace('{date}', student.date_submitted.strftime('%d/%m/%Y'))
+                student = students.get(request_id)
+                if student:
+                    personalized_message = message.replace('{nom}', student.nom or '')
+                    personalized_message = personalized_message.replace('{prenom}', student.prenom or '')
+                    personalized_message = personalized_message.replace('{id}', str(student.id))
+                    if student.date_submitted:
+                        personalized_message = personalized_message.replace('{date}', student.date_submitted.strftime('%d/%m/%Y'))
                 
-                # Envoyer en arrière-plan
-                thread = threading.Thread(
-                    target=send_email_async,
-                    args=(email, subject, personalized_message)
-                )
-                thread.daemon = True
-                thread.start()
-                sent_count += 1
-                
-                # Petite pause pour éviter le rate limiting
-                time.sleep(0.3)
+                # Envoyer en arrière-plan (espacement géré par la file, voir mailer.py)
+                if send_email_async(email, subject, personalized_message):
+                    sent_count += 1
                     
             except Exception as e:
                 print(f"Erreur pour {email}: {str(e)}")
@@ -547,7 +618,8 @@ def send_email():
             'success': True, 
             'message': f'Envoi lancé pour {sent_count} email(s).',
             'sent_count': sent_count,
-            'total_count': len(valid_emails)
+            'total_count': total_count,
+            'suppressed_count': skipped_count
         }
         
         return jsonify(response_data)
@@ -557,6 +629,7 @@ def send_email():
         return jsonify({'error': 'Erreur interne du serveur'}), 500
 
 @app.route('/admin/download_report')
+@read_only
 def download_report():
     """Générer un rapport PDF"""
     if not session.get('admin_logged_in'):
@@ -721,9 +794,11 @@ def email_compose():
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
     
-    return render_template('email_compose.html')
+    # Régions présentes dans les agrégats, pour le filtre des destinataires
+    return render_template('email_compose.html', regions=sorted(region_totals()))
 
 @app.route('/admin/api/students')
+@read_only
 def api_students():
     if not session.get('admin_logged_in'):
         return jsonify({'error': 'Non autorisé'}), 401
@@ -744,6 +819,7 @@ def api_students():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/api/stats')
+@read_only
 def api_stats():
     if not session.get('admin_logged_in'):
         return jsonify({'error': 'Non autorisé'}), 401
@@ -770,27 +846,12 @@ def delete_request(request_id):
         student_request = StudentRequest.query.get_or_404(request_id)
         
         # Supprimer les fichiers associés
-        files_to_delete = [
-            student_request.certificat_inscription,
-            student_request.certificat_residence,
-            student_request.demande_manuscrite,
-            student_request.carte_membre_reed,
-            student_request.copie_cni
-        ]
-        
-        for filename in files_to_delete:
-            if filename:
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                if os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                        print(f"✓ Fichier supprimé: {filename}")
-                    except Exception as e:
-                        print(f"✗ Erreur suppression fichier {filename}: {str(e)}")
+        delete_request_files(student_request)
         
         # Supprimer de la base de données
         db.session.delete(student_request)
         db.session.commit()
+        mark_primary_reads()
         
         return jsonify({
             'success': True,
@@ -827,19 +888,7 @@ def delete_requests():
                 student_request = StudentRequest.query.get(request_id)
                 if student_request:
                     # Supprimer les fichiers
-                    files_to_delete = [
-                        student_request.certificat_inscription,
-                        student_request.certificat_residence,
-                        student_request.demande_manuscrite,
-                        student_request.carte_membre_reed,
-                        student_request.copie_cni
-                    ]
-                    
-                    for filename in files_to_delete:
-                        if filename:
-                            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                            if os.path.exists(filepath):
-                                os.remove(filepath)
+                    delete_request_files(student_request)
                     
                     # Supprimer de la base
                     db.session.delete(student_request)
@@ -850,6 +899,7 @@ def delete_requests():
                 print(f"Erreur suppression demande {request_id}: {str(e)}")
         
         db.session.commit()
+        mark_primary_reads()
         
         return jsonify({
             'success': True,
@@ -882,19 +932,7 @@ def delete_all_requests():
         for student_request in all_requests:
             try:
                 # Supprimer les fichiers
-                files_to_delete = [
-                    student_request.certificat_inscription,
-                    student_request.certificat_residence,
-                    student_request.demande_manuscrite,
-                    student_request.carte_membre_reed,
-                    student_request.copie_cni
-                ]
-                
-                for filename in files_to_delete:
-                    if filename:
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
+                delete_request_files(student_request)
                 
                 # Supprimer de la base
                 db.session.delete(student_request)
@@ -904,6 +942,7 @@ def delete_all_requests():
                 print(f"Erreur suppression demande {student_request.id}: {str(e)}")
         
         db.session.commit()
+        mark_primary_reads()
         
         return jsonify({
             'success': True,
@@ -916,18 +955,6 @@ def delete_all_requests():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/debug')
-def debug():
-    """Route de débogage"""
-    info = {
-        'database_configured': 'OK' if db else 'ERROR',
-        'upload_folder_exists': os.path.exists(app.config['UPLOAD_FOLDER']),
-        'sendgrid_key_set': 'YES' if app.config['SENDGRID_API_KEY'] else 'NO',
-        'sender_email': app.config['MAIL_DEFAULT_SENDER'],
-        'database_url': app.config['SQLALCHEMY_DATABASE_URI'][:50] + '...' if len(app.config['SQLALCHEMY_DATABASE_URI']) > 50 else app.config['SQLALCHEMY_DATABASE_URI']
-    }
-    return jsonify(info)
-
 @app.route('/admin/logout')
 def admin_logout():
     session.pop('admin_logged_in', None)
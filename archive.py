@@ -0,0 +1,177 @@
+"""Archivage à froid des demandes traitées.
+
+Les demandes approuvées ou rejetées depuis plus de ARCHIVE_AFTER_DAYS sont
+déplacées, par lots, de student_request vers archived_request (même
+identifiant, promotion = année de soumission). Leurs documents restent dans
+le stockage et l'inventaire les rattache à l'archive. Les agrégats
+journaliers (rollups.py) ne comptent que les demandes actives : ils sont
+ajustés à l'archivage et à la restauration.
+
+- flask archive-requests [--older-than-days N] : lancer l'archivage
+- /admin/archives : recherche dans les archives et restauration à la demande
+"""
+from datetime import datetime, timedelta
+
+import click
+from flask import render_template, request, redirect, url_for, session, jsonify, flash
+
+from database import db, StudentRequest, ArchivedRequest, Document, PendingNotification
+from replica import mark_primary_reads
+from rollups import apply_rollup_deltas, rollup_key
+
+# Colonnes communes aux deux tables
+ARCHIVED_COLUMNS = [
+    'id', 'nom', 'prenom', 'adresse', 'telephone', 'email', 'region_universitaire',
+    'certificat_inscription', 'certificat_residence', 'demande_manuscrite',
+    'carte_membre_reed', 'copie_cni',
+    'status', 'date_submitted', 'date_processed', 'admin_notes'
+]
+
+ARCHIVES_PER_PAGE = 50
+
+
+def archive_processed_requests(older_than_days, batch_size=500):
+    """Archiver les demandes traitées avant la date limite ; retourne leur nombre."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+
+    while True:
+        batch = (StudentRequest.query
+                 .filter(StudentRequest.status.in_(['approved', 'rejected']),
+                         StudentRequest.date_processed < cutoff)
+                 .order_by(StudentRequest.id)
+                 .limit(batch_size).all())
+        if not batch:
+            break
+
+        ids = [r.id for r in batch]
+        rows = []
+        # Les suppressions groupées ne passent pas par les événements de session
+        deltas = {}
+        for r in batch:
+            key = rollup_key(r.date_submitted, r.region_universitaire, r.status)
+            deltas[key] = deltas.get(key, 0) - 1
+            row = {column: getattr(r, column) for column in ARCHIVED_COLUMNS}
+            row['cohort'] = r.date_submitted.year if r.date_submitted else None
+            row['archived_at'] = datetime.utcnow()
+            rows.append(row)
+
+        try:
+            db.session.execute(ArchivedRequest.__table__.insert(), rows)
+            Document.query.filter(Document.request_id.in_(ids)).update(
+                {'request_id': None, 'archived_request_id': Document.request_id},
+                synchronize_session=False
+            )
+            PendingNotification.query.filter(PendingNotification.request_id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            StudentRequest.query.filter(StudentRequest.id.in_(ids)).delete(synchronize_session=False)
+            apply_rollup_deltas(db.session, deltas)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        db.session.expunge_all()
+        total += len(ids)
+        print(f"✓ {total} demande(s) archivée(s)")
+
+    return total
+
+
+def restore_archived_request(archived_id):
+    """Remettre une demande archivée dans student_request."""
+    archived = db.session.get(ArchivedRequest, archived_id)
+    if archived is None:
+        return None
+
+    row = {column: getattr(archived, column) for column in ARCHIVED_COLUMNS}
+    db.session.execute(StudentRequest.__table__.insert(), [row])
+    apply_rollup_deltas(db.session, {
+        rollup_key(archived.date_submitted, archived.region_universitaire, archived.status): 1
+    })
+    Document.query.filter_by(archived_request_id=archived_id).update(
+        {'request_id': archived_id, 'archived_request_id': None},
+        synchronize_session=False
+    )
+    db.session.delete(archived)
+    db.session.commit()
+    return archived_id
+
+
+def search_archives(q='', cohort=None, status=None, page=1):
+    query = ArchivedRequest.query
+    if q:
+        pattern = f"%{q.lower()}%"
+        query = query.filter(db.or_(
+            db.func.lower(ArchivedRequest.nom).like(pattern),
+            db.func.lower(ArchivedRequest.prenom).like(pattern),
+            db.func.lower(ArchivedRequest.email).like(pattern),
+            ArchivedRequest.telephone.like(pattern)
+        ))
+    if cohort:
+        query = query.filter(ArchivedRequest.cohort == cohort)
+    if status in ('approved', 'rejected'):
+        query = query.filter(ArchivedRequest.status == status)
+    return query.order_by(ArchivedRequest.id.desc()).paginate(
+        page=page, per_page=ARCHIVES_PER_PAGE, error_out=False
+    )
+
+
+def init_archive(app):
+
+    @app.route('/admin/archives')
+    def admin_archives():
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+
+        q = request.args.get('q', '').strip()
+        cohort = request.args.get('cohort', type=int)
+        status = request.args.get('status', '')
+        page = request.args.get('page', 1, type=int)
+
+        try:
+            results = search_archives(q, cohort, status, page)
+            cohorts = [c for (c,) in db.session.query(ArchivedRequest.cohort)
+                       .distinct().order_by(ArchivedRequest.cohort.desc()).all() if c]
+        except Exception as e:
+            print(f"Erreur archives: {str(e)}")
+            flash('Erreur de chargement des archives', 'error')
+            return redirect(url_for('admin_dashboard'))
+
+        return render_template('admin_archives.html',
+                             results=results,
+                             cohorts=cohorts,
+                             q=q,
+                             cohort=cohort,
+                             status=status)
+
+    @app.route('/admin/archives/<int:archived_id>/restore', methods=['POST'])
+    def restore_archive(archived_id):
+        if not session.get('admin_logged_in'):
+            return jsonify({'error': 'Non autorisé'}), 401
+
+        try:
+            if restore_archived_request(archived_id) is None:
+                return jsonify({'error': 'Archive introuvable'}), 404
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+
+        mark_primary_reads()
+        return jsonify({
+            'success': True,
+            'message': f'Demande #{archived_id} restaurée',
+            'url': url_for('view_request', request_id=archived_id)
+        })
+
+    @app.cli.command('archive-requests')
+    @click.option('--older-than-days', type=int, default=None,
+                  help='Âge minimal du traitement (défaut : ARCHIVE_AFTER_DAYS)')
+    @click.option('--batch-size', default=500, show_default=True)
+    def archive_requests_command(older_than_days, batch_size):
+        """Archiver les demandes approuvées ou rejetées anciennes."""
+        days = older_than_days if older_than_days is not None else app.config['ARCHIVE_AFTER_DAYS']
+        total = archive_processed_requests(days, batch_size)
+        print(f"✓ Archivage terminé : {total} demande(s) de plus de {days} jour(s)")
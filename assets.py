@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Pipeline des fichiers statiques : minification, empreintes et précompression.
+
+Usage : python assets.py build
+
+Les fichiers générés sont écrits dans static/dist avec un nom contenant
+l'empreinte de leur contenu (style.3f2a9c1b0d.css), accompagnés de leurs
+versions .gz / .br et d'un manifest.json lu au démarrage de l'application.
+"""
+import os
+import re
+import sys
+import io
+import gzip
+import json
+import hashlib
+
+from flask import url_for, send_from_directory, request, abort
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : seules les versions .gz sont produites
+    brotli = None
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+
+# Fichiers traités par le pipeline (chemins relatifs à static/)
+TEXT_ASSETS = ['css/style.css', 'js/main.js', 'js/upload.js', 'js/offline-store.js', 'js/offline.js']
+IMAGE_ASSETS = ['logo.png', 'sociale.jpeg', 'acommpagnement.jpeg']
+IMAGE_VARIANTS = ['avif', 'webp']
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json'}
+
+# Cache d'un an : le nom change à chaque modification du contenu
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+
+
+def _split_strings(source):
+    """Découper le source en segments (texte, est_une_chaine)."""
+    parts = []
+    last = 0
+    for match in _STRING_RE.finditer(source):
+        parts.append((source[last:match.start()], False))
+        parts.append((match.group(0), True))
+        last = match.end()
+    parts.append((source[last:], False))
+    return parts
+
+
+def minify_css(source):
+    """Minifier une feuille de style sans toucher au contenu des chaînes."""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    output = []
+    for text, is_string in _split_strings(source):
+        if not is_string:
+            text = re.sub(r'\s+', ' ', text)
+            text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+            text = re.sub(r':\s+', ':', text)
+            text = text.replace(';}', '}')
+        output.append(text)
+    return ''.join(output).strip()
+
+
+def minify_js(source):
+    """Minification prudente du JavaScript : commentaires et indentation.
+
+    Aucune réécriture de tokens n'est faite, le code reste donc équivalent
+    même sans parseur JavaScript complet.
+    """
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines)
+
+
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _hashed_name(relative_path, data, extension=None):
+    root, ext = os.path.splitext(relative_path)
+    return f"{root}.{_fingerprint(data)}{extension or ext}"
+
+
+def _write(dist_dir, relative_path, data):
+    path = os.path.join(dist_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    # Versions précompressées pour les formats texte
+    if os.path.splitext(relative_path)[1] in COMPRESSIBLE_EXTENSIONS:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def _encode_image(image, fmt):
+    from PIL import features
+
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        if not features.check('webp'):
+            return None
+        image.save(buffer, 'WEBP', quality=80, method=6)
+    elif fmt == 'avif':
+        if not features.check('avif'):
+            return None
+        image.save(buffer, 'AVIF', quality=60)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def build_assets(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Construire static/dist et retourner le manifeste généré."""
+    from PIL import Image
+
+    manifest = {}
+
+    for relative_path in TEXT_ASSETS:
+        with open(os.path.join(static_dir, relative_path), encoding='utf-8') as f:
+            source = f.read()
+        minified = minify_css(source) if relative_path.endswith('.css') else minify_js(source)
+        data = minified.encode('utf-8')
+        hashed = _hashed_name(relative_path, data)
+        _write(dist_dir, hashed, data)
+        manifest[relative_path] = {'file': hashed, 'variants': {}}
+        print(f"✓ {relative_path} -> {hashed} ({len(source.encode('utf-8'))} -> {len(data)} octets)")
+
+    for relative_path in IMAGE_ASSETS:
+        source_path = os.path.join(static_dir, relative_path)
+        with Image.open(source_path) as image:
+            image.load()
+            fallback_format = 'png' if relative_path.lower().endswith('.png') else 'jpeg'
+            if fallback_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            data = _encode_image(image, fallback_format)
+            original_size = os.path.getsize(source_path)
+            if len(data) >= original_size:
+                with open(source_path, 'rb') as f:
+                    data = f.read()
+            hashed = _hashed_name(relative_path, data)
+            _write(dist_dir, hashed, data)
+            entry = {'file': hashed, 'variants': {}}
+
+            for fmt in IMAGE_VARIANTS:
+                variant = _encode_image(image, fmt)
+                if variant is None:
+                    print(f"✗ Format {fmt} non supporté par Pillow, ignoré pour {relative_path}")
+                    continue
+                variant_name = _hashed_name(relative_path, variant, '.' + fmt)
+                _write(dist_dir, variant_name, variant)
+                entry['variants'][fmt] = variant_name
+
+        manifest[relative_path] = entry
+        sizes = ', '.join(f"{fmt}: {os.path.getsize(os.path.join(dist_dir, name))}"
+                          for fmt, name in entry['variants'].items())
+        print(f"✓ {relative_path} -> {hashed} ({original_size} -> {len(data)} octets; {sizes})")
+
+    os.makedirs(dist_dir, exist_ok=True)
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(dist_dir=DIST_DIR):
+    """Charger le manifeste ; dictionnaire vide si le build n'a pas été lancé."""
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_assets(app, dist_dir=DIST_DIR):
+    """Enregistrer la route /assets et les helpers de templates."""
+    manifest = load_manifest(dist_dir)
+    app.extensions['asset_manifest'] = manifest
+
+    def asset_url(filename, variant=None):
+        """Équivalent de url_for('static', filename=...) utilisant le manifeste."""
+        entry = manifest.get(filename)
+        if entry is None:
+            if variant:
+                return None
+            return url_for('static', filename=filename)
+        if variant:
+            name = entry['variants'].get(variant)
+            return url_for('serve_asset', filename=name) if name else None
+        return url_for('serve_asset', filename=entry['file'])
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['image_variants'] = IMAGE_VARIANTS
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        """Servir un fichier empreinté, en version précompressée si possible."""
+        path = os.path.join(dist_dir, filename)
+        if not os.path.isfile(path):
+            abort(404)
+
+        encoding = None
+        accepted = request.headers.get('Accept-Encoding', '')
+        if os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS:
+            if 'br' in accepted and os.path.isfile(path + '.br'):
+                encoding = 'br'
+            elif 'gzip' in accepted and os.path.isfile(path + '.gz'):
+                encoding = 'gzip'
+
+        if encoding:
+            suffix = '.br' if encoding == 'br' else '.gz'
+            response = send_from_directory(dist_dir, filename + suffix)
+            response.mimetype = _guess_mimetype(filename)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Disposition', None)
+        else:
+            response = send_from_directory(dist_dir, filename)
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return manifest
+
+
+def _guess_mimetype(filename):
+    import mimetypes
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print(__doc__)
+        sys.exit(1)
+    build_assets()
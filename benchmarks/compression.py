@@ -0,0 +1,86 @@
+"""Mesure de la compression des réponses dynamiques.
+
+Compare, pour le tableau de bord et /admin/api/students, les octets envoyés
+et le temps CPU de compression par réponse selon l'encodage.
+
+    python benchmarks/compression.py [--requests 200] [--repeat 20]
+
+Utilise une base SQLite temporaire remplie de demandes fictives.
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fake_requests(count):
+    regions = ['Dakar', 'Thiès', 'Saint-Louis', 'Ziguinchor', 'Kaolack']
+    statuses = ['pending', 'approved', 'rejected']
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({
+            'nom': f'Nom{i}', 'prenom': f'Prénom{i}', 'adresse': f'{i} rue de la République, Dakar',
+            'telephone': f'77 {i:07d}', 'email': f'etudiant{i}@example.sn',
+            'region_universitaire': regions[i % len(regions)], 'status': statuses[i % len(statuses)]
+        }))
+    return io.StringIO('\n'.join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='Demandes fictives en base')
+    parser.add_argument('--repeat', type=int, default=20, help='Compressions mesurées par cas')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+    os.environ['PROFILER_ENABLED'] = '0'
+
+    from app import app, db
+    from bulk import import_requests
+    from compression import compress_body, brotli
+
+    with app.app_context():
+        db.create_all()
+        import_requests(fake_requests(args.requests))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+
+    cases = [('identity', None), ('gzip', {'COMPRESS_GZIP_LEVEL': 6}), ('gzip', {'COMPRESS_GZIP_LEVEL': 9})]
+    if brotli is not None:
+        cases += [('br', {'COMPRESS_BROTLI_QUALITY': 4}), ('br', {'COMPRESS_BROTLI_QUALITY': 11})]
+
+    print(f"{args.requests} demandes en base, {args.repeat} compressions par cas\n")
+    print(f"{'URL':<22} {'Encodage':<10} {'Niveau':>6} {'Octets':>10} {'Ratio':>7} {'CPU/réponse':>12}")
+    for url in ('/admin/dashboard', '/admin/api/students'):
+        body = client.get(url, headers={'Accept-Encoding': 'identity'}).get_data()
+        for encoding, settings in cases:
+            if encoding == 'identity':
+                size, cpu_ms, level = len(body), 0.0, '-'
+            else:
+                config = dict(app.config, **settings)
+                level = list(settings.values())[0]
+                # Brotli 11 (niveau des fichiers statiques) est très lent : une seule mesure
+                repeat = 1 if level == 11 else args.repeat
+                started = time.process_time()
+                for _ in range(repeat):
+                    compressed = compress_body(body, encoding, config)
+                cpu_ms = (time.process_time() - started) * 1000 / repeat
+                size = len(compressed)
+            print(f"{url:<22} {encoding:<10} {level:>6} {size:>10} {size / len(body):>7.1%} {cpu_ms:>9.2f} ms")
+
+        # Vérification de bout en bout de la négociation
+        response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+        print(f"{'':<22} -> servi en {response.headers.get('Content-Encoding', 'identity')}, "
+              f"{len(response.get_data())} octets\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Mesure des réglages du moteur de base de données (engine_profiles.py).
+
+Démarre gunicorn (gunicorn.conf.py) deux fois sur une base neuve, avec les
+anciens réglages (DB_ENGINE_PROFILES=0) puis avec les profils par base.
+Plusieurs workers, donc plusieurs processus qui écrivent dans la même base :
+c'est là que le journal SQLite et l'attente de verrou comptent. Pendant
+--duration secondes, des clients HTTP soumettent le formulaire pendant que
+d'autres lisent /admin/api/stats.
+
+Affiche le débit des soumissions, leur latence p95, les soumissions
+refusées (« database is locked » sous SQLite) et la latence p95 des lectures.
+
+    python benchmarks/engine_profiles.py [--workers 4] [--writers 16] [--readers 4]
+    python benchmarks/engine_profiles.py --database-url postgresql://...
+
+Sans --database-url, utilise une base SQLite temporaire par essai.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from worker_modes import ROOT, multipart_body, free_port, wait_ready  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def submit(port, index):
+    """Soumettre le formulaire ; (accepté, latence en ms)."""
+    boundary, body = multipart_body(index)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    started = time.perf_counter()
+    try:
+        conn.request('POST', '/formulaire', body=body,
+                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        response = conn.getresponse()
+        response.read()
+        # Une soumission refusée renvoie vers le formulaire
+        return '/information' in (response.getheader('Location') or ''), (time.perf_counter() - started) * 1000
+    except OSError:
+        return False, (time.perf_counter() - started) * 1000
+    finally:
+        conn.close()
+
+
+def login(port, password):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('POST', '/admin/login', body=f'username=admin&password={password}',
+                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        return response.getheader('Set-Cookie', '').split(';')[0]
+    finally:
+        conn.close()
+
+
+def read_stats(port, cookie):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    started = time.perf_counter()
+    try:
+        conn.request('GET', '/admin/api/stats', headers={'Cookie': cookie})
+        response = conn.getresponse()
+        response.read()
+        return response.status == 200, (time.perf_counter() - started) * 1000
+    finally:
+        conn.close()
+
+
+def run_setting(profiles, args):
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ,
+               PYTHONPATH=ROOT,
+               DATABASE_URL=args.database_url or 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+               DB_ENGINE_PROFILES=profiles,
+               WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_WORKER_CLASS='gthread',
+               GUNICORN_THREADS=str(args.threads),
+               ADMIN_PASSWORD='bench',
+               ADMISSION_ENABLED='0',
+               PROFILER_ENABLED='0',
+               OFFLINE_FORM_ENABLED='0',
+               NOTIFY_QUIET_SECONDS='0',
+               SENDGRID_API_KEY='')
+    # Base et UPLOAD_FOLDER dans le dossier temporaire (répertoire courant)
+    subprocess.run([sys.executable, '-c', 'from app import app, db\nwith app.app_context(): db.create_all()'],
+                   cwd=tmp, env=env, check=True, capture_output=True)
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port, process)
+        cookie = login(port, 'bench')
+        writes, reads = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def writer(index):
+            n = 0
+            while time.monotonic() < deadline:
+                result = submit(port, index * 100000 + n)
+                n += 1
+                with lock:
+                    writes.append(result)
+
+        def reader():
+            while time.monotonic() < deadline:
+                result = read_stats(port, cookie)
+                with lock:
+                    reads.append(result)
+
+        clients = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+        clients += [threading.Thread(target=reader) for _ in range(args.readers)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+
+        accepted = [ms for ok, ms in writes if ok]
+        label = 'profils' if profiles == '1' else 'anciens'
+        print(f"{label:<10} {len(accepted) / args.duration:>14.1f} {percentile(accepted, 0.95):>10.1f} ms "
+              f"{len(writes) - len(accepted):>7} {percentile([ms for ok, ms in reads if ok], 0.95):>9.1f} ms")
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='Workers gunicorn')
+    parser.add_argument('--threads', type=int, default=4, help='Threads par worker (gthread)')
+    parser.add_argument('--writers', type=int, default=16, help='Clients qui soumettent le formulaire')
+    parser.add_argument('--readers', type=int, default=4, help='Clients qui lisent les statistiques')
+    parser.add_argument('--duration', type=float, default=15.0, help='Durée de chaque essai (secondes)')
+    parser.add_argument('--database-url', help='Base à utiliser (SQLite temporaire par défaut)')
+    args = parser.parse_args()
+
+    print(f"{args.workers} worker(s) x {args.threads} thread(s), {args.writers} client(s) en écriture, "
+          f"{args.readers} en lecture, {args.duration:g} s par essai\n")
+    print(f"{'Réglages':<10} {'Soumissions/s':>14} {'p95 écriture':>13} {'Refus':>7} {'p95 lecture':>12}")
+    for profiles in ('0', '1'):
+        try:
+            run_setting(profiles, args)
+        except Exception as e:
+            print(f"{'profils' if profiles == '1' else 'anciens':<10} ✗ {str(e)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Comparaison des classes de worker gunicorn sous envois lents.
+
+Démarre gunicorn (gunicorn.conf.py) successivement en mode sync, gthread et
+gevent avec le même nombre de workers. Pendant --duration secondes, des
+clients envoient le formulaire en étalant leur corps multipart sur
+--upload-seconds (connexion mobile lente) pendant que d'autres chargent des
+pages ; SendGrid est remplacé par un serveur local qui répond en
+--mail-delay secondes.
+
+Affiche pour chaque mode le débit et la latence des pages, les soumissions
+abouties et la mémoire résidente totale (maître + workers).
+
+    python benchmarks/worker_modes.py [--workers 2] [--slow-clients 6] [--fast-clients 8]
+
+Le mode gevent nécessite gevent (requirements.txt).
+"""
+import os
+import io
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FILES = ['certificat_inscription', 'certificat_residence', 'demande_manuscrite',
+         'carte_membre_reed', 'copie_cni']
+PDF = b'%PDF-1.4\n1 0 obj<<>>endobj\ntrailer<<>>\n%%EOF\n' + b'0' * 20000
+
+MODES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '8'},
+    'gevent': {'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_WORKER_CONNECTIONS': '100'},
+}
+
+
+def fake_sendgrid(delay):
+    """Serveur local qui imite l'API SendGrid avec un temps de réponse fixe."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay)
+            self.send_response(202)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def multipart_body(index):
+    boundary = f'bench{index}'
+    fields = {
+        'nom': f'Nom{index}', 'prenom': 'Prénom', 'adresse': 'Dakar',
+        'telephone': f'77{index:07d}', 'email': f'e{index}@example.sn',
+        'region_universitaire': 'Dakar',
+    }
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name in FILES:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                   f'filename="{name}.pdf"\r\nContent-Type: application/pdf\r\n\r\n'.encode())
+        body.write(PDF + b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return boundary, body.getvalue()
+
+
+def slow_upload(port, index, seconds, chunks=20):
+    """Soumettre le formulaire en étalant l'envoi du corps ; True si accepté."""
+    boundary, body = multipart_body(index)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.putrequest('POST', '/formulaire')
+        conn.putheader('Content-Type', f'multipart/form-data; boundary={boundary}')
+        conn.putheader('Content-Length', str(len(body)))
+        conn.endheaders()
+        step = len(body) // chunks + 1
+        for offset in range(0, len(body), step):
+            conn.send(body[offset:offset + step])
+            time.sleep(seconds / chunks)
+        response = conn.getresponse()
+        response.read()
+        return '/information' in (response.getheader('Location') or '')
+    except OSError:
+        return False
+    finally:
+        conn.close()
+
+
+def fetch(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def resident_memory_mb(pid):
+    """Mémoire résidente d'un processus et de ses enfants (Linux)."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn s\'est arrêté au démarrage')
+        try:
+            if fetch(port, '/healthz') == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn ne répond pas')
+
+
+def run_mode(mode, args, mail_url):
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, **MODES[mode])
+    env.update(PYTHONPATH=ROOT,
+               DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'),
+               WEB_CONCURRENCY=str(args.workers),
+               ADMISSION_ENABLED='0',
+               PROFILER_ENABLED='0',
+               SENDGRID_API_KEY='bench',
+               SENDGRID_API_URL=mail_url,
+               MAIL_SEND_INTERVAL='0')
+    # Base et UPLOAD_FOLDER dans le dossier temporaire (répertoire courant)
+    subprocess.run([sys.executable, '-c', 'from app import app, db\nwith app.app_context(): db.create_all()'],
+                   cwd=tmp, env=env, check=True, capture_output=True)
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port, process)
+        latencies, uploads = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def slow_client(index):
+            n = 0
+            while time.monotonic() < deadline:
+                ok = slow_upload(port, index * 1000 + n, args.upload_seconds)
+                n += 1
+                with lock:
+                    uploads.append(ok)
+
+        def fast_client():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status = fetch(port, '/information')
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000 if status == 200 else None)
+
+        clients = [threading.Thread(target=slow_client, args=(i,)) for i in range(args.slow_clients)]
+        clients += [threading.Thread(target=fast_client) for _ in range(args.fast_clients)]
+        for client in clients:
+            client.start()
+        time.sleep(args.duration / 2)
+        memory = resident_memory_mb(process.pid)
+        for client in clients:
+            client.join()
+
+        ok = sorted(latency for latency in latencies if latency is not None)
+        p50 = ok[len(ok) // 2] if ok else 0.0
+        p95 = ok[min(len(ok) - 1, int(len(ok) * 0.95))] if ok else 0.0
+        print(f"{mode:<8} {len(ok) / args.duration:>9.1f} {p50:>8.1f} ms {p95:>8.1f} ms "
+              f"{len(latencies) - len(ok):>7} {sum(uploads):>6}/{len(uploads):<4} {memory:>8.0f} Mo")
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='Workers gunicorn')
+    parser.add_argument('--slow-clients', type=int, default=6, help='Clients qui envoient lentement')
+    parser.add_argument('--fast-clients', type=int, default=8, help='Clients qui chargent des pages')
+    parser.add_argument('--upload-seconds', type=float, default=3.0, help='Durée d\'un envoi lent')
+    parser.add_argument('--mail-delay', type=float, default=1.0, help='Temps de réponse de SendGrid')
+    parser.add_argument('--duration', type=float, default=15.0, help='Durée de chaque essai (secondes)')
+    parser.add_argument('--modes', default='sync,gthread,gevent', help='Modes à comparer')
+    args = parser.parse_args()
+
+    mail = fake_sendgrid(args.mail_delay)
+    mail_url = f'http://127.0.0.1:{mail.server_address[1]}/v3/mail/send'
+
+    print(f"{args.workers} worker(s), {args.slow_clients} envoi(s) lent(s) de {args.upload_seconds:g} s, "
+          f"{args.fast_clients} client(s) de pages, {args.duration:g} s par mode\n")
+    print(f"{'Mode':<8} {'Pages/s':>9} {'p50':>11} {'p95':>11} {'Échecs':>7} {'Soumissions':>11} {'Mémoire':>11}")
+    for mode in args.modes.split(','):
+        try:
+            run_mode(mode, args, mail_url)
+        except Exception as e:
+            print(f"{mode:<8} ✗ {str(e)}")
+
+
+if __name__ == '__main__':
+    main()
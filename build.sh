@@ -7,6 +7,9 @@ pip install -r requirements.txt
 mkdir -p static/uploads
 mkdir -p templates
 
+# Minifier, empreinter et précompresser les fichiers statiques
+python assets.py build
+
 # Initialiser la base de données
 python -c "
 from app import app, db
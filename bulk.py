@@ -0,0 +1,296 @@
+"""Import et export en masse des demandes au format JSONL.
+
+flask import-requests demandes.jsonl [--documents-dir DIR]
+    Une demande par ligne (mêmes champs que le formulaire, plus status,
+    date_submitted, date_processed et admin_notes facultatifs). Les lignes
+    invalides sont signalées et ignorées ; les autres sont insérées par lots
+    de --batch-size dans une transaction chacun (un lot refusé par la base
+    est signalé et l'import continue). Les champs de documents donnent un
+    chemin relatif à --documents-dir, sans en sortir, avec une extension de
+    ALLOWED_EXTENSIONS : le fichier est copié dans le stockage et inscrit
+    dans l'inventaire. L'identifiant éventuel de la
+    ligne est ignoré, la base en attribue un nouveau.
+
+flask export-requests demandes.jsonl [--documents-dir DIR] [--include-archived]
+    Écrit les demandes en flux, dans le format lu par import-requests ; avec
+    --documents-dir, les documents y sont copiés.
+
+Utiliser '-' pour lire l'entrée standard ou écrire sur la sortie standard.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from sqlalchemy import bindparam
+from werkzeug.security import safe_join
+
+from database import db, StudentRequest, ArchivedRequest, Document, DOCUMENT_FIELDS
+from storage import get_storage
+from inventory import HashingReader, sniff_mime_type
+from rollups import apply_rollup_deltas
+
+REQUIRED_FIELDS = ['nom', 'prenom', 'adresse', 'telephone', 'email', 'region_universitaire']
+EXPORT_COLUMNS = ['id'] + REQUIRED_FIELDS + DOCUMENT_FIELDS + [
+    'status', 'date_submitted', 'date_processed', 'admin_notes'
+]
+STATUSES = ('pending', 'approved', 'rejected')
+
+# Erreurs de validation affichées avant de se contenter de les compter
+MAX_REPORTED_ERRORS = 50
+
+
+def _parse_datetime(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{field} n'est pas une date ISO 8601")
+    # Les dates sont stockées en UTC sans fuseau
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def validate_record(record):
+    """Transformer une ligne JSON en colonnes de student_request, ou lever ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError("la ligne n'est pas un objet JSON")
+
+    row = {}
+    for field in REQUIRED_FIELDS:
+        value = str(record.get(field) or '').strip()
+        if not value:
+            raise ValueError(f"champ {field} manquant")
+        row[field] = value
+
+    # Mêmes règles que le formulaire
+    row['email'] = row['email'].lower()
+    if '@' not in row['email'] or '.' not in row['email']:
+        raise ValueError("format d'email invalide")
+    if not row['telephone'].replace(' ', '').replace('+', '').isdigit():
+        raise ValueError("numéro de téléphone invalide")
+    for field, limit in (('nom', 100), ('prenom', 100), ('telephone', 20), ('email', 120),
+                         ('region_universitaire', 100)):
+        if len(row[field]) > limit:
+            raise ValueError(f"{field} dépasse {limit} caractères")
+
+    row['status'] = record.get('status') or 'pending'
+    if row['status'] not in STATUSES:
+        raise ValueError(f"statut inconnu: {row['status']}")
+
+    row['date_submitted'] = _parse_datetime(record.get('date_submitted'), 'date_submitted') or datetime.utcnow()
+    row['date_processed'] = _parse_datetime(record.get('date_processed'), 'date_processed')
+    row['admin_notes'] = record.get('admin_notes') or None
+    if row['admin_notes'] is not None and not isinstance(row['admin_notes'], str):
+        raise ValueError("admin_notes doit être une chaîne")
+
+    documents = {field: record[field] for field in DOCUMENT_FIELDS if record.get(field)}
+    for field, path in documents.items():
+        if not isinstance(path, str):
+            raise ValueError(f"{field} doit être un chemin de fichier")
+    return row, documents
+
+
+def _attach_documents(storage, documents_dir, request_id, documents):
+    """Copier les documents d'une demande importée ; retourne {champ: nom, ...} et les lignes d'inventaire."""
+    names = {}
+    inventory = []
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    for field, relative_path in documents.items():
+        # Pas de chemin absolu ni de ../ : seuls les fichiers de --documents-dir sont copiés
+        source = safe_join(documents_dir, relative_path)
+        if source is None:
+            print(f"✗ Demande {request_id}: chemin de document refusé {relative_path}")
+            continue
+        ext = relative_path.rsplit('.', 1)[-1].lower() if '.' in relative_path else ''
+        if ext not in allowed:
+            print(f"✗ Demande {request_id}: type de document refusé {relative_path}")
+            continue
+        if not os.path.isfile(source):
+            print(f"✗ Demande {request_id}: document introuvable {source}")
+            continue
+        name = f"{request_id}_{field}.{ext}"
+        with open(source, 'rb') as f:
+            reader = HashingReader(f)
+            storage.save(reader, name)
+        names[field] = name
+        inventory.append({
+            'filename': name, 'request_id': request_id, 'field': field,
+            'size': reader.size, 'sha256': reader.sha256,
+            'mime_type': sniff_mime_type(reader.head, name), 'created_at': datetime.utcnow()
+        })
+    return names, inventory
+
+
+def _insert_batch(batch, documents_dir, dry_run):
+    if dry_run:
+        return
+    table = StudentRequest.__table__
+    rows = [row for row, _ in batch]
+    result = db.session.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+    )
+    ids = [request_id for (request_id,) in result]
+
+    # Les insertions groupées ne passent pas par les événements de session
+    deltas = {}
+    for row in rows:
+        key = (row['date_submitted'].date(), row['region_universitaire'], row['status'])
+        deltas[key] = deltas.get(key, 0) + 1
+    apply_rollup_deltas(db.session, deltas)
+
+    if documents_dir:
+        storage = get_storage()
+        updates = {field: [] for field in DOCUMENT_FIELDS}
+        inventory = []
+        for request_id, (_, documents) in zip(ids, batch):
+            names, documents_rows = _attach_documents(storage, documents_dir, request_id, documents)
+            inventory.extend(documents_rows)
+            for field, name in names.items():
+                updates[field].append({'_id': request_id, 'value': name})
+        for field, params in updates.items():
+            if params:
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('_id')).values({field: bindparam('value')}),
+                    params
+                )
+        if inventory:
+            db.session.execute(Document.__table__.insert(), inventory)
+
+    db.session.commit()
+
+
+def _import_batch(batch, documents_dir, dry_run, first_line, last_line):
+    """Insérer un lot ; retourne le nombre de demandes importées (0 si le lot est refusé)."""
+    try:
+        _insert_batch(batch, documents_dir, dry_run)
+        return len(batch)
+    except Exception as e:
+        # Les documents déjà copiés restent orphelins : flask reconcile-uploads les supprime
+        db.session.rollback()
+        print(f"✗ Lignes {first_line} à {last_line}: lot de {len(batch)} demande(s) refusé ({str(e)})",
+              file=sys.stderr)
+        return 0
+
+
+def import_requests(stream, documents_dir=None, batch_size=1000, dry_run=False):
+    """Importer un flux JSONL ; retourne (importées, rejetées)."""
+    started = time.perf_counter()
+    imported = rejected = 0
+    batch = []
+    batch_start = None
+    warned_documents = False
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row, documents = validate_record(json.loads(line))
+        except ValueError as e:  # json.JSONDecodeError en hérite
+            rejected += 1
+            if rejected <= MAX_REPORTED_ERRORS:
+                print(f"✗ Ligne {line_number}: {str(e)}", file=sys.stderr)
+            continue
+
+        if documents and not documents_dir and not warned_documents:
+            print("✗ Documents ignorés : utilisez --documents-dir pour les importer", file=sys.stderr)
+            warned_documents = True
+
+        if not batch:
+            batch_start = line_number
+        batch.append((row, documents))
+        if len(batch) >= batch_size:
+            inserted = _import_batch(batch, documents_dir, dry_run, batch_start, line_number)
+            imported += inserted
+            rejected += len(batch) - inserted
+            batch = []
+            elapsed = time.perf_counter() - started
+            print(f"✓ {imported} demande(s) importée(s) ({imported / elapsed:.0f}/s)", file=sys.stderr)
+
+    if batch:
+        inserted = _import_batch(batch, documents_dir, dry_run, batch_start, line_number)
+        imported += inserted
+        rejected += len(batch) - inserted
+
+    return imported, rejected
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_requests(out, documents_dir=None, status=None, include_archived=False, batch_size=1000):
+    """Écrire les demandes en JSONL ; retourne le nombre de lignes écrites."""
+    storage = get_storage() if documents_dir else None
+    if documents_dir:
+        os.makedirs(documents_dir, exist_ok=True)
+
+    models = [StudentRequest, ArchivedRequest] if include_archived else [StudentRequest]
+    count = 0
+    for model in models:
+        table = model.__table__
+        query = db.select(*[table.c[column] for column in EXPORT_COLUMNS]).order_by(table.c.id)
+        if status:
+            query = query.where(table.c.status == status)
+
+        # Lecture en flux : les lignes ne sont jamais toutes en mémoire
+        result = db.session.execute(query.execution_options(yield_per=batch_size))
+        for row in result.mappings():
+            record = {column: _json_value(row[column]) for column in EXPORT_COLUMNS}
+            if model is ArchivedRequest:
+                record['archived'] = True
+
+            if storage is not None:
+                for field in DOCUMENT_FIELDS:
+                    name = record[field]
+                    if not name:
+                        continue
+                    try:
+                        with storage.open(name) as src, open(os.path.join(documents_dir, name), 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                    except Exception as e:
+                        print(f"✗ Document {name} non exporté: {str(e)}", file=sys.stderr)
+
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+            if count % batch_size == 0:
+                print(f"✓ {count} demande(s) exportée(s)", file=sys.stderr)
+    return count
+
+
+def init_bulk(app):
+
+    @app.cli.command('import-requests')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--documents-dir', type=click.Path(exists=True, file_okay=False),
+                  help='Dossier contenant les documents référencés')
+    @click.option('--batch-size', default=1000, show_default=True, help='Demandes par transaction')
+    @click.option('--dry-run', is_flag=True, help='Valider sans rien écrire')
+    def import_requests_command(source, documents_dir, batch_size, dry_run):
+        """Importer des demandes depuis un fichier JSONL."""
+        started = time.perf_counter()
+        imported, rejected = import_requests(source, documents_dir, batch_size, dry_run)
+        elapsed = time.perf_counter() - started
+        verb = 'validée(s)' if dry_run else 'importée(s)'
+        print(f"✓ {imported} demande(s) {verb}, {rejected} ligne(s) rejetée(s) en {elapsed:.1f}s",
+              file=sys.stderr)
+
+    @app.cli.command('export-requests')
+    @click.argument('destination', type=click.File('w', encoding='utf-8'))
+    @click.option('--documents-dir', type=click.Path(file_okay=False),
+                  help='Copier aussi les documents dans ce dossier')
+    @click.option('--status', type=click.Choice(STATUSES), help='Exporter un seul statut')
+    @click.option('--include-archived', is_flag=True, help='Inclure les demandes archivées')
+    @click.option('--batch-size', default=1000, show_default=True)
+    def export_requests_command(destination, documents_dir, status, include_archived, batch_size):
+        """Exporter les demandes au format JSONL."""
+        started = time.perf_counter()
+        count = export_requests(destination, documents_dir, status, include_archived, batch_size)
+        print(f"✓ {count} demande(s) exportée(s) en {time.perf_counter() - started:.1f}s", file=sys.stderr)
@@ -0,0 +1,117 @@
+"""Compression gzip / brotli des réponses dynamiques (HTML, JSON...).
+
+L'encodage est négocié avec Accept-Encoding (brotli de préférence s'il est
+installé). Ne sont compressées que les réponses 200 dont le type figure dans
+COMPRESS_MIMETYPES et dont le corps dépasse COMPRESS_MIN_SIZE. Les réponses
+déjà encodées (fichiers précompressés de assets.py), les fichiers envoyés
+directement et les réponses marquées no-transform sont laissés tels quels.
+Les réponses en flux sont compressées morceau par morceau, chaque morceau
+étant vidé aussitôt vers le client.
+
+Mesure : python benchmarks/compression.py
+"""
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : gzip seulement
+    brotli = None
+
+
+class GzipStream:
+    def __init__(self, level):
+        # wbits 31 : en-tête et somme de contrôle gzip
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def compress_body(data, encoding, config):
+    """Compresser un corps complet."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    stream = GzipStream(config['COMPRESS_GZIP_LEVEL'])
+    return stream.compress(data) + stream.finish()
+
+
+def _compress_iter(chunks, stream):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            yield stream.compress(chunk) + stream.flush()
+    yield stream.finish()
+
+
+def negotiate_encoding():
+    """Meilleur encodage accepté par le client, ou None."""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _should_compress(response, config):
+    if response.status_code != 200 or request.method == 'HEAD':
+        return False
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return response.mimetype in config['COMPRESS_MIMETYPES']
+
+
+def init_compression(app):
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not _should_compress(response, config):
+            return response
+
+        # La réponse dépend d'Accept-Encoding, même non compressée
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            stream = BrotliStream(config['COMPRESS_BROTLI_QUALITY']) if encoding == 'br' \
+                else GzipStream(config['COMPRESS_GZIP_LEVEL'])
+            response.response = _compress_iter(response.response, stream)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compress_body(data, encoding, config))
+
+        response.headers['Content-Encoding'] = encoding
+        # Un ETag fort désigne les octets : il change avec l'encodage
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
@@ -19,20 +19,121 @@ class Config:
         basedir = os.path.abspath(os.path.dirname(__file__))
         SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'instance', 'amicale.db')
     
+    # Réplica en lecture seule pour les pages admin (optionnel, voir replica.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith('postgres://'):
+        DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace('postgres://', 'postgresql://', 1)
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_HEALTH_CHECK_INTERVAL = float(os.environ.get('REPLICA_HEALTH_CHECK_INTERVAL', 10))
+    REPLICA_READ_YOUR_WRITES_SECONDS = float(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 10))
+    
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_recycle': 300,
-        'pool_pre_ping': True,
-    }
+    
+    # Réglages du moteur par type de base (voir engine_profiles.py)
+    DB_ENGINE_PROFILES = os.environ.get('DB_ENGINE_PROFILES', '1') == '1'
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 20))  # pour l'ensemble des workers
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # secondes
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))  # 0 = sans limite
+    DB_APPLICATION_NAME = os.environ.get('DB_APPLICATION_NAME', 'reed-amicale')
+    DB_SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT_MS', 5000))
+    DB_SQLITE_MMAP_SIZE = int(os.environ.get('DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
     
     # Upload configuration - IMPORTANT: Chemin ABSOLU pour Render
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'static/uploads')  # Chemin absolu
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
+    # Formulaire hors ligne : service worker, brouillon et file d'envoi (voir offline.py)
+    OFFLINE_FORM_ENABLED = os.environ.get('OFFLINE_FORM_ENABLED', '1') == '1'
+    
+    # Stockage des documents : 'local' (UPLOAD_FOLDER) ou 's3' (voir storage.py)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.environ.get('S3_BUCKET', '')
+    S3_PREFIX = os.environ.get('S3_PREFIX', 'uploads')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # MinIO ou autre service compatible
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_PRESIGNED_URL_EXPIRES = int(os.environ.get('S3_PRESIGNED_URL_EXPIRES', 300))  # secondes
+    
+    # Dossiers PDF fusionnés par demande, construits en arrière-plan (voir dossier.py)
+    DOSSIER_CACHE_FOLDER = os.environ.get('DOSSIER_CACHE_FOLDER', os.path.join(os.getcwd(), 'instance/dossiers'))
+    DOSSIER_WORKERS = int(os.environ.get('DOSSIER_WORKERS', 2))  # threads de construction par processus
+    DOSSIER_WAIT_SECONDS = float(os.environ.get('DOSSIER_WAIT_SECONDS', 15))  # attente avant la page "en cours"
+    DOSSIER_CACHE_MAX_SIZE = int(os.environ.get('DOSSIER_CACHE_MAX_MB', 500)) * 1024 * 1024
+    # Dossiers par archive ZIP : avec des workers sync, l'archive doit être envoyée
+    # avant le timeout de gunicorn (gunicorn.conf.py), quelques secondes par dossier
+    DOSSIER_BUNDLE_MAX = int(os.environ.get('DOSSIER_BUNDLE_MAX', 20))
+    
+    # Délai avant qu'un fichier sans demande soit considéré orphelin (voir inventory.py)
+    ORPHAN_GRACE_SECONDS = int(os.environ.get('ORPHAN_GRACE_SECONDS', 3600))
+    
+    # Âge (en jours depuis le traitement) des demandes archivées (voir archive.py)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    
+    # Envois fragmentés reprenables (voir uploads.py)
+    MAX_UPLOAD_SIZE = 16 * 1024 * 1024  # 16MB par document
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB par requête PATCH
+    UPLOAD_SESSION_TTL = timedelta(hours=24)
+    
+    # Réduction des photos dans le navigateur avant l'envoi
+    IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2000))  # pixels
+    IMAGE_JPEG_QUALITY = float(os.environ.get('IMAGE_JPEG_QUALITY', 0.8))
+    
+    # Compression des réponses HTML/JSON (voir compression.py)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # octets
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # 11 est trop lent à la volée
+    COMPRESS_MIMETYPES = {
+        'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+        'application/javascript', 'application/json', 'application/xml', 'image/svg+xml'
+    }
+    
+    # Contrôle d'admission des soumissions (voir admission.py)
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+    ADMISSION_PER_IP_RATE = float(os.environ.get('ADMISSION_PER_IP_RATE', 20))  # par minute
+    ADMISSION_PER_IP_BURST = int(os.environ.get('ADMISSION_PER_IP_BURST', 20))
+    ADMISSION_GLOBAL_RATE = float(os.environ.get('ADMISSION_GLOBAL_RATE', 300))  # par minute
+    ADMISSION_GLOBAL_BURST = int(os.environ.get('ADMISSION_GLOBAL_BURST', 60))
+    # Requêtes traitées en parallèle ; 0 = déduit de gunicorn (threads ou connexions gevent par worker)
+    ADMISSION_CAPACITY = int(os.environ.get('ADMISSION_CAPACITY', 0))
+    ADMISSION_ADMIN_RESERVED_SHARE = float(os.environ.get('ADMISSION_ADMIN_RESERVED_SHARE', 0.5))
+    ADMISSION_MAX_INFLIGHT_UPLOADS = int(os.environ.get('ADMISSION_MAX_INFLIGHT_UPLOADS', 8))
+    ADMISSION_REDIS_URL = os.environ.get('ADMISSION_REDIS_URL')  # état partagé entre workers
+    # X-Forwarded-For n'est lu que derrière un proxy de confiance (Render, nginx...) :
+    # l'IP retenue est celle ajoutée par le ADMISSION_PROXY_HOPS-ième proxy en partant de la fin
+    ADMISSION_TRUST_PROXY = os.environ.get('ADMISSION_TRUST_PROXY', '0') == '1'
+    ADMISSION_PROXY_HOPS = int(os.environ.get('ADMISSION_PROXY_HOPS', 1))
+    
     # SendGrid configuration
     SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY', '')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'commissionsociale.reed@gmail.com')
+    # Jeton attendu sur /webhooks/sendgrid?token=... (voir email_events.py)
+    SENDGRID_WEBHOOK_TOKEN = os.environ.get('SENDGRID_WEBHOOK_TOKEN', '')
+    SENDGRID_API_URL = os.environ.get('SENDGRID_API_URL', 'https://api.sendgrid.com/v3/mail/send')
+    
+    # File d'envoi des emails (voir mailer.py)
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS', 2))  # threads d'envoi par processus
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE', 1000))
+    MAIL_SEND_INTERVAL = float(os.environ.get('MAIL_SEND_INTERVAL', 0.3))  # secondes entre deux envois d'un thread
+    MAIL_TIMEOUT = float(os.environ.get('MAIL_TIMEOUT', 30))  # secondes
+    
+    # Segments de destinataires résolus avant l'envoi (voir segments.py)
+    SEGMENT_TOKEN_TTL = timedelta(minutes=int(os.environ.get('SEGMENT_TOKEN_TTL_MINUTES', 30)))
+    SEGMENT_PREVIEW_SIZE = int(os.environ.get('SEGMENT_PREVIEW_SIZE', 5))
+    
+    # Regroupement des emails de statut (voir notifications.py)
+    NOTIFY_QUIET_SECONDS = int(os.environ.get('NOTIFY_QUIET_SECONDS', 300))  # 0 = envoi immédiat
+    NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', 20))
+    NOTIFY_FLUSH_INTERVAL = int(os.environ.get('NOTIFY_FLUSH_INTERVAL', 30))  # secondes
+    NOTIFY_RETRY_SECONDS = int(os.environ.get('NOTIFY_RETRY_SECONDS', 300))  # délai après un échec d'envoi
+    NOTIFY_MAX_AGE_HOURS = int(os.environ.get('NOTIFY_MAX_AGE_HOURS', 24))  # abandon des envois en échec
+    
+    # Profilage à la demande des pages admin, ?_profile=1 (voir profiler.py)
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '1') == '1'
+    PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', 5))  # période d'échantillonnage
+    PROFILER_KEEP = int(os.environ.get('PROFILER_KEEP', 50))  # profils conservés
     
     # Admin credentials
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
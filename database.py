@@ -1,10 +1,53 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from replica import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Colonnes de StudentRequest contenant les documents envoyés
+DOCUMENT_FIELDS = [
+    'certificat_inscription',
+    'certificat_residence',
+    'demande_manuscrite',
+    'carte_membre_reed',
+    'copie_cni'
+]
+
+def insert_ignore_many(model, index_elements, rows):
+    """INSERT ... ON CONFLICT DO NOTHING de plusieurs lignes ; retourne le nombre inséré.
+
+    Deux requêtes concurrentes qui insèrent la même clé ne lèvent pas
+    d'IntegrityError : la seconde ne fait rien (PostgreSQL et SQLite).
+    """
+    if not rows:
+        return 0
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        db.session.execute(model.__table__.insert(), rows)
+        return len(rows)
+    statement = insert(model).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+    return db.session.execute(statement).rowcount
+
+
+def insert_ignore(model, index_elements, **values):
+    """INSERT ... ON CONFLICT DO NOTHING d'une ligne ; retourne True si elle a été insérée."""
+    return insert_ignore_many(model, index_elements, [values]) > 0
 
 class StudentRequest(db.Model):
     __tablename__ = 'student_request'
+    __table_args__ = (
+        # File de revue : demandes en attente dans l'ordre de soumission
+        db.Index('ix_student_request_queue', 'status', 'date_submitted', 'id'),
+        # Segments de destinataires par région (voir segments.py)
+        db.Index('ix_student_request_region', 'region_universitaire', 'status', 'date_submitted'),
+        # SQLite : ne jamais redonner l'identifiant d'une demande archivée (voir migrate.py)
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), nullable=False)
@@ -34,4 +77,206 @@ class StudentRequest(db.Model):
     admin_notes = db.Column(db.Text)
     
     def __repr__(self):
-        return f'<StudentRequest {self.nom} {self.prenom}>'
\ No newline at end of file
+        return f'<StudentRequest {self.nom} {self.prenom}>'
+
+class UploadSession(db.Model):
+    """Envoi fragmenté et reprenable d'un document (protocole type tus)"""
+    __tablename__ = 'upload_session'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    field = db.Column(db.String(50), nullable=False)
+    filename = db.Column(db.String(300), nullable=False)
+    total_size = db.Column(db.Integer, nullable=False)
+    offset = db.Column(db.Integer, nullable=False, default=0)
+    # Secret remis au navigateur qui a créé l'envoi (en-tête Upload-Token)
+    owner_token = db.Column(db.String(64))
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def is_complete(self):
+        return self.offset >= self.total_size
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.field} {self.offset}/{self.total_size}>'
+
+
+class FormSubmission(db.Model):
+    """Identifiant d'envoi du formulaire généré par le navigateur (voir offline.py)
+
+    Un envoi rejoué après une réponse perdue porte le même identifiant :
+    la contrainte d'unicité empêche d'enregistrer la demande deux fois.
+    """
+    __tablename__ = 'form_submission'
+    
+    id = db.Column(db.String(64), primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('student_request.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<FormSubmission {self.id} -> {self.request_id}>'
+
+
+class PendingNotification(db.Model):
+    """Email de statut en attente, regroupé pendant la fenêtre de calme"""
+    __tablename__ = 'pending_notification'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    request_id = db.Column(db.Integer, db.ForeignKey('student_request.id', ondelete='CASCADE'),
+                           unique=True, nullable=False)
+    
+    # Statut connu de l'étudiant avant la première modification
+    original_status = db.Column(db.String(20))
+    status = db.Column(db.String(20), nullable=False)
+    notes = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    due_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<PendingNotification {self.request_id} {self.original_status}->{self.status}>'
+
+
+class EmailEvent(db.Model):
+    """Événement de distribution reçu du webhook SendGrid"""
+    __tablename__ = 'email_event'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sg_event_id = db.Column(db.String(100), unique=True)
+    email = db.Column(db.String(120), nullable=False, index=True)
+    
+    # delivered, bounce, dropped, deferred, spamreport, unsubscribe
+    event = db.Column(db.String(20), nullable=False)
+    reason = db.Column(db.Text)
+    
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<EmailEvent {self.email} {self.event}>'
+
+
+class SuppressedEmail(db.Model):
+    """Adresse à laquelle on n'envoie plus d'emails (rebond, plainte...)"""
+    __tablename__ = 'suppressed_email'
+    
+    email = db.Column(db.String(120), primary_key=True)
+    event = db.Column(db.String(20), nullable=False)
+    reason = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SuppressedEmail {self.email} {self.event}>'
+
+
+class EmailSegment(db.Model):
+    """Destinataires résolus d'un envoi groupé, réutilisés à l'envoi (voir segments.py)"""
+    __tablename__ = 'email_segment'
+    
+    token = db.Column(db.String(32), primary_key=True)
+    # JSON : critères normalisés (statuts, régions, dates, ids, adresses)
+    criteria = db.Column(db.Text, nullable=False)
+    # JSON : [[id de la demande ou null, email], ...]
+    recipients = db.Column(db.Text, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    # Adresses écartées : format invalide, doublon, liste de suppression
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<EmailSegment {self.token} ({self.count})>'
+
+
+class Document(db.Model):
+    """Inventaire des documents présents dans le stockage"""
+    __tablename__ = 'document'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(300), unique=True, nullable=False)
+    
+    # Demande propriétaire, active ou archivée (aucune des deux : fichier orphelin)
+    request_id = db.Column(db.Integer, db.ForeignKey('student_request.id', ondelete='SET NULL'), index=True)
+    archived_request_id = db.Column(db.Integer, db.ForeignKey('archived_request.id', ondelete='SET NULL'), index=True)
+    field = db.Column(db.String(50))
+    
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), index=True)
+    mime_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Document {self.filename} {self.size}>'
+
+
+class ArchivedRequest(db.Model):
+    """Demande traitée déplacée hors de student_request (voir archive.py)"""
+    __tablename__ = 'archived_request'
+    
+    # Même identifiant que dans student_request, pour pouvoir la restaurer
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    nom = db.Column(db.String(100), nullable=False, index=True)
+    prenom = db.Column(db.String(100), nullable=False)
+    adresse = db.Column(db.Text, nullable=False)
+    telephone = db.Column(db.String(20), nullable=False)
+    email = db.Column(db.String(120), nullable=False, index=True)
+    region_universitaire = db.Column(db.String(100), nullable=False, default='Dakar')
+    
+    certificat_inscription = db.Column(db.String(300))
+    certificat_residence = db.Column(db.String(300))
+    demande_manuscrite = db.Column(db.String(300))
+    carte_membre_reed = db.Column(db.String(300))
+    copie_cni = db.Column(db.String(300))
+    
+    status = db.Column(db.String(20))
+    date_submitted = db.Column(db.DateTime)
+    date_processed = db.Column(db.DateTime)
+    admin_notes = db.Column(db.Text)
+    
+    # Promotion : année de soumission
+    cohort = db.Column(db.Integer, index=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedRequest {self.nom} {self.prenom} ({self.cohort})>'
+
+
+class DailyRollup(db.Model):
+    """Nombre de demandes par jour de soumission, région et statut (voir rollups.py)"""
+    __tablename__ = 'daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'region', 'status', name='uq_daily_rollup'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    region = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyRollup {self.day} {self.region} {self.status}: {self.count}>'
+
+
+class RequestProfile(db.Model):
+    """Profil d'une requête admin demandé avec ?_profile=1 (voir profiler.py)"""
+    __tablename__ = 'request_profile'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    status_code = db.Column(db.Integer)
+    
+    duration_ms = db.Column(db.Float, nullable=False)
+    sql_count = db.Column(db.Integer, nullable=False, default=0)
+    sql_ms = db.Column(db.Float, nullable=False, default=0)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    
+    # JSON : [{"statement", "duration_ms"}, ...]
+    queries = db.Column(db.Text)
+    # Piles repliées "racine;...;feuille N" (format flamegraph.pl / speedscope)
+    stacks = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<RequestProfile {self.method} {self.path} {self.duration_ms:.0f}ms>'
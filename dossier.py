@@ -0,0 +1,394 @@
+"""Dossier complet d'une demande : ses documents fusionnés en un seul PDF.
+
+Les pièces (PDF ou photos, converties en pages A4) sont réunies dans l'ordre
+de DOCUMENT_FIELDS, avec un signet par pièce, puis enregistrées en PDF
+linéarisé : le navigateur affiche la première page avant la fin du
+téléchargement (requêtes Range).
+
+Le dossier est construit à la première consultation de la demande, par un
+pool de DOSSIER_WORKERS threads, et gardé dans DOSSIER_CACHE_FOLDER. Sous
+gevent (threading patché), ce sont de vrais threads du système
+(gevent.threadpool) : la fusion, surtout du code C de pikepdf, bloquerait
+sinon la boucle du worker et toutes ses requêtes. Son nom
+contient une empreinte des documents (nom et sha256 de l'inventaire) : un
+document remplacé donne un nouveau dossier, l'ancien est supprimé.
+
+- /admin/dossier/<id> : dossier d'une demande
+- /admin/dossiers.zip?ids=1,2,3 : archive ZIP de plusieurs dossiers, envoyée
+  au fil de leur construction. Avec des workers sync, gunicorn arrête un
+  worker dont la réponse dépasse son timeout (gunicorn.conf.py) : l'archive
+  entière doit être envoyée avant, d'où DOSSIER_BUNDLE_MAX (20 par défaut).
+"""
+import io
+import os
+import time
+import hashlib
+import zipfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import request, redirect, url_for, session, flash, send_file, current_app, Response
+from werkzeug.utils import secure_filename
+
+from database import db, StudentRequest, Document, DOCUMENT_FIELDS
+from review import DOCUMENT_LABELS, IMAGE_EXTENSIONS
+
+try:
+    import pikepdf
+except ImportError:  # pikepdf n'est requis que pour les dossiers fusionnés
+    pikepdf = None
+
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+except ImportError:  # gevent n'est utilisé qu'avec GUNICORN_WORKER_CLASS=gevent
+    gevent_monkey = None
+
+# Page A4 en pouces
+PAGE_WIDTH = 8.27
+PAGE_HEIGHT = 11.69
+
+
+def _image_pdf(data):
+    """Photo d'un document convertie en PDF d'une page A4."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        # La résolution fixe la taille de la page : l'image tient dans une page A4
+        resolution = max(72.0, image.width / PAGE_WIDTH, image.height / PAGE_HEIGHT)
+        output = io.BytesIO()
+        image.save(output, 'PDF', resolution=resolution)
+    return output.getvalue()
+
+
+def _missing_pdf(label):
+    """Page signalant une pièce illisible, pour qu'elle ne disparaisse pas du dossier."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+
+    output = io.BytesIO()
+    page = canvas.Canvas(output, pagesize=A4)
+    page.setFont('Helvetica-Bold', 16)
+    page.drawString(72, A4[1] - 100, label)
+    page.setFont('Helvetica', 12)
+    page.drawString(72, A4[1] - 130, 'Document illisible : consulter le fichier original.')
+    page.save()
+    return output.getvalue()
+
+
+def build_dossier_pdf(storage, documents, output, title=''):
+    """Fusionner les documents [(libellé, nom de fichier)] dans le fichier output."""
+    dossier = pikepdf.Pdf.new()
+    sources = []
+    try:
+        with dossier.open_outline() as outline:
+            for label, filename in documents:
+                with storage.open(filename) as stream:
+                    data = stream.read()
+                try:
+                    if filename.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS:
+                        data = _image_pdf(data)
+                    source = pikepdf.open(io.BytesIO(data))
+                except Exception as e:
+                    print(f"✗ Document illisible dans le dossier ({filename}): {str(e)}")
+                    source = pikepdf.open(io.BytesIO(_missing_pdf(label)))
+                # Les pages copiées restent liées à leur source jusqu'à l'enregistrement
+                sources.append(source)
+                outline.root.append(pikepdf.OutlineItem(label, len(dossier.pages)))
+                dossier.pages.extend(source.pages)
+
+        dossier.Root.PageMode = pikepdf.Name.UseOutlines
+        if title:
+            dossier.docinfo['/Title'] = title
+        dossier.save(output, linearize=True)
+    finally:
+        for source in sources:
+            source.close()
+        dossier.close()
+
+
+def dossier_documents(student):
+    """Documents fournis par la demande : [(libellé, nom de fichier)]."""
+    return [(DOCUMENT_LABELS[field], getattr(student, field))
+            for field in DOCUMENT_FIELDS if getattr(student, field)]
+
+
+def dossier_version(student, documents):
+    """Empreinte des documents : change dès qu'un document est remplacé."""
+    hashes = dict(db.session.query(Document.filename, Document.sha256)
+                  .filter(Document.request_id == student.id).all())
+    digest = hashlib.sha256()
+    for _, filename in documents:
+        digest.update(f"{filename}:{hashes.get(filename) or ''}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class DossierCache:
+    """Dossiers construits en arrière-plan et gardés sur le disque local"""
+
+    def __init__(self, config, storage):
+        self.folder = config['DOSSIER_CACHE_FOLDER']
+        self.workers = max(1, config['DOSSIER_WORKERS'])
+        self.max_size = config['DOSSIER_CACHE_MAX_SIZE']
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._pending = {}
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, request_id, version):
+        return os.path.join(self.folder, f'dossier-{request_id}-{version}.pdf')
+
+    def _executor(self):
+        # Après un fork, les threads du pool du processus parent n'existent plus
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+                # Threads patchés = greenlets : construire dans de vrais threads
+                self._pool = NativeThreadPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dossier')
+            self._pending = {}
+        return self._pool
+
+    def prepare(self, request_id, version, documents, title=''):
+        """Lancer la construction si le dossier n'est pas en cache ; retourne la tâche ou None."""
+        path = self.path(request_id, version)
+        if os.path.isfile(path):
+            return None
+        with self._lock:
+            pool = self._executor()
+            future = self._pending.get(path)
+            if future is None:
+                future = pool.submit(self._build, request_id, version, documents, title)
+                self._pending[path] = future
+                future.add_done_callback(lambda _, path=path: self._pending.pop(path, None))
+            return future
+
+    def get(self, request_id, version, documents, title='', timeout=None):
+        """Chemin du dossier, construit au besoin ; None s'il n'est pas prêt après timeout."""
+        future = self.prepare(request_id, version, documents, title)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeout:
+                return None
+        path = self.path(request_id, version)
+        try:
+            # Date d'accès pour l'éviction des dossiers les moins consultés
+            os.utime(path)
+        except FileNotFoundError:
+            # Évincé entre-temps : reconstruit à la prochaine demande
+            return None
+        return path
+
+    def _build(self, request_id, version, documents, title):
+        start = time.perf_counter()
+        path = self.path(request_id, version)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            build_dossier_pdf(self.storage, documents, temporary, title)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self.discard(request_id, keep=path)
+        self._evict()
+        print(f"✓ Dossier {request_id} construit en {time.perf_counter() - start:.2f}s")
+        return path
+
+    def _entries(self):
+        with os.scandir(self.folder) as entries:
+            return [entry for entry in entries
+                    if entry.is_file() and entry.name.startswith('dossier-') and entry.name.endswith('.pdf')]
+
+    def discard(self, request_id, keep=None):
+        """Supprimer les dossiers en cache d'une demande (sauf keep)."""
+        prefix = f'dossier-{request_id}-'
+        for entry in self._entries():
+            if entry.name.startswith(prefix) and entry.path != keep:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self):
+        # Au-delà de DOSSIER_CACHE_MAX_SIZE, supprimer les plus anciennement consultés
+        files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._entries())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files[:-1]:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class _ZipStream:
+    """Flux d'écriture non positionnable : ZipFile y écrit, la réponse en lit les octets."""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def stream_dossier_bundle(cache, dossiers, chunk_size=1024 * 1024):
+    """Générer une archive ZIP des dossiers [(nom dans l'archive, id, empreinte, documents, titre)].
+
+    Les dossiers, déjà lancés ensemble dans le pool, sont ajoutés à l'archive
+    dans l'ordre dès qu'ils sont prêts : le téléchargement commence sans
+    attendre la construction des suivants.
+    """
+    stream = _ZipStream()
+    failures = []
+    # Les PDF sont déjà compressés : les stocker tels quels
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, request_id, version, documents, title in dossiers:
+            try:
+                # Un dossier évincé du cache entre-temps est reconstruit
+                path = (cache.get(request_id, version, documents, title)
+                        or cache.get(request_id, version, documents, title))
+                with open(path, 'rb') as source, archive.open(name, 'w', force_zip64=True) as target:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        yield stream.drain()
+            except Exception as e:
+                print(f"✗ Dossier absent de l'archive ({name}): {str(e)}")
+                failures.append(name)
+            yield stream.drain()
+
+        if failures:
+            archive.writestr('ERREURS.txt', 'Dossiers non construits :\n' + '\n'.join(failures) + '\n')
+    yield stream.drain()
+
+
+def get_dossiers():
+    return current_app.extensions['dossiers']
+
+
+def dossier_title(student):
+    return f'Dossier {student.id} - {student.prenom} {student.nom}'
+
+
+def prepare_dossier(student):
+    """Lancer la construction du dossier d'une demande ; False sans document ni pikepdf."""
+    documents = dossier_documents(student)
+    if pikepdf is None or not documents:
+        return False
+    try:
+        get_dossiers().prepare(student.id, dossier_version(student, documents), documents,
+                               dossier_title(student))
+    except Exception as e:
+        print(f"✗ Préparation du dossier {student.id} impossible: {str(e)}")
+    return True
+
+
+def discard_dossier(request_id):
+    """Supprimer le dossier en cache d'une demande supprimée."""
+    get_dossiers().discard(request_id)
+
+
+def init_dossier(app):
+    app.extensions['dossiers'] = DossierCache(app.config, app.extensions['storage'])
+
+    @app.route('/admin/dossier/<int:request_id>')
+    def request_dossier(request_id):
+        """Dossier complet d'une demande (PDF linéarisé)"""
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+        if pikepdf is None:
+            return "Dossier indisponible (pikepdf non installé)", 503
+
+        student = StudentRequest.query.get_or_404(request_id)
+        documents = dossier_documents(student)
+        if not documents:
+            flash('Aucun document fourni pour cette demande', 'error')
+            return redirect(url_for('view_request', request_id=request_id))
+
+        version = dossier_version(student, documents)
+        if request.if_none_match.contains(version):
+            return '', 304
+
+        try:
+            path = get_dossiers().get(request_id, version, documents, dossier_title(student),
+                                      timeout=app.config['DOSSIER_WAIT_SECONDS'])
+        except Exception as e:
+            print(f"✗ Dossier {request_id} impossible: {str(e)}")
+            return "Erreur de construction du dossier", 500
+
+        if path is None:
+            # Construction encore en cours : la page se recharge d'elle-même
+            response = Response(
+                '<meta http-equiv="refresh" content="3">'
+                '<p>Préparation du dossier en cours...</p>',
+                status=202, mimetype='text/html'
+            )
+            response.headers['Retry-After'] = '3'
+            return response
+
+        response = send_file(path, mimetype='application/pdf', conditional=True,
+                             download_name=f'dossier-{request_id}.pdf', etag=version)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @app.route('/admin/dossiers.zip')
+    def dossier_bundle():
+        """Archive ZIP des dossiers des demandes choisies (?ids=1,2,3)"""
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+        if pikepdf is None:
+            return "Dossiers indisponibles (pikepdf non installé)", 503
+
+        try:
+            ids = sorted({int(i) for i in request.args.get('ids', '').split(',') if i.strip()})
+        except ValueError:
+            return "Identifiants de demandes invalides", 400
+        if not ids:
+            return "Aucune demande choisie", 400
+        if len(ids) > app.config['DOSSIER_BUNDLE_MAX']:
+            return f"Au plus {app.config['DOSSIER_BUNDLE_MAX']} dossiers par archive", 400
+
+        # Tout ce qui lit la base est fait avant l'envoi du flux
+        cache = get_dossiers()
+        dossiers = []
+        for student in StudentRequest.query.filter(StudentRequest.id.in_(ids)).order_by(StudentRequest.id):
+            documents = dossier_documents(student)
+            if not documents:
+                continue
+            version = dossier_version(student, documents)
+            title = dossier_title(student)
+            cache.prepare(student.id, version, documents, title)
+            name = secure_filename(f'{student.id}-{student.nom}-{student.prenom}.pdf') or f'{student.id}.pdf'
+            dossiers.append((name, student.id, version, documents, title))
+
+        if not dossiers:
+            return "Aucun document pour les demandes choisies", 404
+
+        response = Response(stream_dossier_bundle(cache, dossiers), mimetype='application/zip')
+        response.headers['Content-Disposition'] = (
+            f"attachment; filename=dossiers-{datetime.now().strftime('%Y%m%d-%H%M')}.zip"
+        )
+        # Ne pas retenir le flux dans un proxy (nginx)
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
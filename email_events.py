@@ -0,0 +1,162 @@
+"""Suivi de distribution des emails et liste de suppression.
+
+SendGrid envoie ses événements (delivered, bounce, dropped...) par lots sur
+POST /webhooks/sendgrid?token=<SENDGRID_WEBHOOK_TOKEN>. Ils sont insérés en
+une seule requête groupée (ON CONFLICT DO NOTHING : un lot reçu deux fois,
+même en parallèle, n'est compté qu'une fois) ; les rebonds définitifs,
+rejets, plaintes et désinscriptions ajoutent l'adresse à la table
+suppressed_email, consultée avant chaque envoi.
+
+Un événement mal formé est ignoré et compté, et le lot est tout de même
+acquitté (2xx) : SendGrid renverrait sinon indéfiniment le même lot.
+
+Pour tester en local : flask replay-email-events events.json
+"""
+import hmac
+import json
+from datetime import datetime
+
+import click
+from flask import request, jsonify, current_app
+
+from database import db, EmailEvent, SuppressedEmail, insert_ignore_many
+
+# Événements conservés (open/click/processed ne sont pas utiles ici)
+STORED_EVENTS = {'delivered', 'bounce', 'dropped', 'deferred', 'spamreport', 'unsubscribe'}
+SUPPRESSING_EVENTS = {'bounce', 'dropped', 'spamreport', 'unsubscribe'}
+
+
+def _normalize(email):
+    return (email or '').strip().lower()
+
+
+def is_suppressed(email):
+    """Vérifier si une adresse est dans la liste de suppression."""
+    return db.session.get(SuppressedEmail, _normalize(email)) is not None
+
+
+def filter_suppressed(emails):
+    """Retirer d'une liste les adresses supprimées (une seule requête)."""
+    normalized = {_normalize(e) for e in emails}
+    if not normalized:
+        return []
+    suppressed = {
+        row.email for row in
+        SuppressedEmail.query.with_entities(SuppressedEmail.email)
+        .filter(SuppressedEmail.email.in_(normalized)).all()
+    }
+    return [e for e in emails if _normalize(e) not in suppressed]
+
+
+def _text(value):
+    return None if value is None or value == '' else str(value)
+
+
+def record_email_events(events):
+    """Enregistrer un lot d'événements SendGrid ; retourne (insérés, supprimés, mal formés)."""
+    rows = []
+    suppressions = {}
+    malformed = 0
+    for event in events:
+        if not isinstance(event, dict):
+            malformed += 1
+            continue
+        name = event.get('event')
+        email = event.get('email')
+        if not isinstance(name, str) or not isinstance(email, str):
+            malformed += 1
+            continue
+        email = _normalize(email)
+        if name not in STORED_EVENTS or not email:
+            continue
+
+        try:
+            timestamp = datetime.utcfromtimestamp(int(event.get('timestamp')))
+        except (TypeError, ValueError, OverflowError, OSError):
+            timestamp = datetime.utcnow()
+
+        reason = _text(event.get('reason') or event.get('response') or event.get('type'))
+        rows.append({
+            'sg_event_id': _text(event.get('sg_event_id')),
+            'email': email,
+            'event': name,
+            'reason': reason,
+            'timestamp': timestamp
+        })
+
+        # Un rebond "blocked" est temporaire : l'adresse reste utilisable
+        if name in SUPPRESSING_EVENTS and not (name == 'bounce' and event.get('type') == 'blocked'):
+            suppressions[email] = (name, reason)
+
+    if not rows:
+        return 0, 0, malformed
+
+    # SendGrid peut renvoyer un lot déjà reçu, éventuellement en parallèle :
+    # les événements connus sont ignorés par la base (sg_event_id unique)
+    inserted = insert_ignore_many(EmailEvent, ['sg_event_id'], rows)
+
+    suppressed = insert_ignore_many(SuppressedEmail, ['email'], [
+        {'email': email, 'event': name, 'reason': reason, 'created_at': datetime.utcnow()}
+        for email, (name, reason) in suppressions.items()
+    ])
+
+    db.session.commit()
+    return inserted, suppressed, malformed
+
+
+def delivery_status(email, limit=5):
+    """Derniers événements et état de suppression d'une adresse."""
+    email = _normalize(email)
+    events = (EmailEvent.query.filter_by(email=email)
+              .order_by(EmailEvent.timestamp.desc()).limit(limit).all())
+    return {
+        'suppressed': db.session.get(SuppressedEmail, email),
+        'events': events
+    }
+
+
+def init_email_events(app):
+
+    @app.route('/webhooks/sendgrid', methods=['POST'])
+    def sendgrid_events_webhook():
+        """Recevoir les événements de distribution SendGrid"""
+        expected = app.config['SENDGRID_WEBHOOK_TOKEN']
+        if not expected or not hmac.compare_digest(request.args.get('token', ''), expected):
+            return jsonify({'error': 'Non autorisé'}), 401
+
+        events = request.get_json(silent=True)
+        if not isinstance(events, list):
+            # Acquitter quand même : renvoyé, ce corps serait refusé à nouveau
+            print("✗ Webhook SendGrid: corps JSON qui n'est pas une liste d'événements")
+            return jsonify({'success': True, 'inserted': 0, 'suppressed': 0, 'malformed': 1})
+
+        try:
+            inserted, suppressed, malformed = record_email_events(events)
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Erreur webhook SendGrid: {str(e)}")
+            # 5xx : SendGrid renverra le lot plus tard
+            return jsonify({'error': 'Erreur interne du serveur'}), 500
+
+        if malformed:
+            print(f"✗ Webhook SendGrid: {malformed} événement(s) mal formé(s) ignoré(s)")
+        return jsonify({'success': True, 'inserted': inserted, 'suppressed': suppressed, 'malformed': malformed})
+
+    @app.cli.command('replay-email-events')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def replay_email_events_command(path):
+        """Rejouer un fichier d'événements SendGrid (JSON ou JSONL) sur le webhook."""
+        with open(path, encoding='utf-8') as f:
+            content = f.read().strip()
+        if content.startswith('['):
+            events = json.loads(content)
+        else:
+            events = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+        client = current_app.test_client()
+        response = client.post(
+            '/webhooks/sendgrid',
+            query_string={'token': app.config['SENDGRID_WEBHOOK_TOKEN']},
+            json=events
+        )
+        print(f"{response.status_code} {response.get_data(as_text=True).strip()}")
@@ -0,0 +1,125 @@
+"""Réglages du moteur SQLAlchemy selon la base utilisée.
+
+SQLite (développement, petites installations) : journal WAL (les lectures ne
+bloquent plus les écritures), synchronous=NORMAL (un fsync par point de
+contrôle au lieu d'un par transaction), mmap et attente de verrou
+DB_SQLITE_BUSY_TIMEOUT_MS au lieu d'une erreur « database is locked ».
+
+PostgreSQL : le pool de chaque worker est dimensionné pour que
+workers x (pool_size + max_overflow) reste sous DB_MAX_CONNECTIONS ;
+chaque connexion porte un statement_timeout (une requête bloquée ne peut pas
+immobiliser un worker jusqu'au timeout de gunicorn) et un application_name
+visible dans pg_stat_activity.
+
+DB_ENGINE_PROFILES=0 revient aux anciens réglages communs. Les PRAGMA sont
+attachés aux moteurs de l'application (apply_engine_profiles), pas à tous les
+moteurs du processus.
+
+Mesure sous gunicorn : python benchmarks/engine_profiles.py. Sur une machine
+à un seul cœur, le débit est limité par le CPU et reste le même avec ou sans
+profils ; seuls les refus « database is locked » disparaissent.
+"""
+import os
+import sqlite3
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Anciens réglages, identiques pour toutes les bases
+LEGACY_ENGINE_OPTIONS = {
+    'pool_recycle': 300,
+    'pool_pre_ping': True,
+}
+
+
+def server_concurrency():
+    """Workers et requêtes simultanées par worker (exportés par gunicorn.conf.py)."""
+    workers = int(os.environ.get('WEB_CONCURRENCY', 0) or 1)
+    if os.environ.get('GUNICORN_WORKER_CLASS') == 'gevent':
+        # Le pool plafonne la concurrence : les greenlets attendent une connexion
+        return workers, int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 0) or 1)
+    threads = int(os.environ.get('GUNICORN_THREADS', 0) or 1)
+    return workers, threads
+
+
+def postgresql_pool_size(config):
+    """(pool_size, max_overflow) d'un worker, dans la limite de DB_MAX_CONNECTIONS."""
+    workers, threads = server_concurrency()
+    budget = max(1, config['DB_MAX_CONNECTIONS'] // workers)
+    # Une connexion par thread de requête, plus une pour les threads de fond
+    pool_size = min(threads + 1, budget)
+    return pool_size, max(0, budget - pool_size)
+
+
+def engine_options(url, config):
+    """Options de create_engine adaptées à la base désignée par url."""
+    if not config.get('DB_ENGINE_PROFILES', True):
+        return dict(LEGACY_ENGINE_OPTIONS)
+
+    backend = make_url(url).get_backend_name()
+
+    if backend == 'sqlite':
+        return {
+            'connect_args': {'timeout': config['DB_SQLITE_BUSY_TIMEOUT_MS'] / 1000},
+        }
+
+    if backend == 'postgresql':
+        pool_size, max_overflow = postgresql_pool_size(config)
+        options = []
+        if config['DB_STATEMENT_TIMEOUT_MS'] > 0:
+            options.append(f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}")
+        return {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': 300,
+            'pool_pre_ping': True,
+            'connect_args': {
+                'application_name': config['DB_APPLICATION_NAME'],
+                'options': ' '.join(options),
+            },
+        }
+
+    return dict(LEGACY_ENGINE_OPTIONS)
+
+
+def sqlite_pragmas(config):
+    """PRAGMA appliqués à chaque connexion SQLite."""
+    if not config['DB_ENGINE_PROFILES']:
+        return {}
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': config['DB_SQLITE_BUSY_TIMEOUT_MS'],
+        'mmap_size': config['DB_SQLITE_MMAP_SIZE'],
+    }
+
+
+def _set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def init_engine_profiles(app):
+    """À appeler avant db.init_app : les options sont lues à la création du moteur."""
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'], config)
+    return config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+def apply_engine_profiles(app, db):
+    """À appeler après db.init_app : PRAGMA sur les moteurs SQLite de cette application."""
+    pragmas = sqlite_pragmas(app.config)
+    if not pragmas:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', partial(_set_sqlite_pragmas, pragmas))
@@ -1,11 +1,69 @@
 # gunicorn.conf.py
+import os
 import multiprocessing
 
-# Nombre de workers
-workers = 2
-worker_class = 'sync'
+
+def _memory_limit_mb():
+    """Mémoire disponible pour le conteneur (limite cgroup, sinon mémoire physique)"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value.isdigit() and int(value) < 1 << 60:
+                return int(value) // (1024 * 1024)
+        except OSError:
+            pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _default_workers():
+    # 2 x CPU + 1, limité par la mémoire (WORKER_MEMORY_MB par worker)
+    by_cpu = multiprocessing.cpu_count() * 2 + 1
+    memory = _memory_limit_mb()
+    if memory is None:
+        return by_cpu
+    by_memory = memory // int(os.environ.get('WORKER_MEMORY_MB', 150))
+    return max(1, min(by_cpu, by_memory))
+
+
+# Nombre de workers (WEB_CONCURRENCY pour forcer une valeur)
+workers = int(os.environ.get('WEB_CONCURRENCY', 0)) or _default_workers()
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Classe de worker (GUNICORN_WORKER_CLASS) :
+# - sync : une requête à la fois par worker
+# - gthread : GUNICORN_THREADS requêtes par worker (ex. 4)
+# - gevent : GUNICORN_WORKER_CONNECTIONS requêtes coopératives par worker
+#   (pip install gevent)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or ('gthread' if threads > 1 else 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+if worker_class == 'gevent':
+    # Avant tout import de l'application (preload_app) : sockets, threads,
+    # verrous et files de l'application deviennent coopératifs
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:  # psycogreen est optionnel (attente PostgreSQL coopérative)
+        pass
+
+# Lus par engine_profiles.py pour dimensionner le pool de connexions
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(threads)
+os.environ['GUNICORN_WORKER_CLASS'] = worker_class
+os.environ['GUNICORN_WORKER_CONNECTIONS'] = str(worker_connections)
+
+# Application chargée une fois dans le maître puis partagée par fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ['true', 'on', '1']
 
 # Timeout augmenté
+# Avec des workers sync, il borne aussi la durée d'une réponse envoyée en flux
+# (archive ZIP des dossiers, voir DOSSIER_BUNDLE_MAX dans config.py)
 timeout = 120  # 2 minutes au lieu de 30 secondes par défaut
 keepalive = 5
 
@@ -15,4 +73,38 @@ errorlog = '-'
 loglevel = 'info'
 
 # Worker temp directory (pour éviter les problèmes de droits)
-worker_tmp_dir = '/dev/shm'
\ No newline at end of file
+worker_tmp_dir = '/dev/shm'
+
+
+def when_ready(server):
+    # Une fois par démarrage, avant les workers : tables, colonnes et index
+    # ajoutés depuis la création de la base (voir migrate.py)
+    from migrate import migrate
+    migrate()
+
+    # Avec preload_app, les gabarits compilés ici sont hérités par les workers
+    if preload_app:
+        from app import app
+        from warmup import precompile_templates
+        count = precompile_templates(app)
+        server.log.info(f"✓ {count} gabarit(s) compilé(s), {workers} worker(s) {worker_class}")
+
+
+def post_fork(server, worker):
+    from app import app
+    from warmup import reset_after_fork, precompile_templates, warm_pool
+
+    reset_after_fork(app)
+    if not preload_app:
+        precompile_templates(app)
+    # Une connexion par thread avant d'accepter des requêtes
+    opened = warm_pool(app, threads)
+    server.log.info(f"✓ Worker {worker.pid} prêt ({opened} connexion(s) ouverte(s))")
+
+
+def worker_exit(server, worker):
+    # Envoyer les emails encore en file avant l'arrêt du worker
+    from app import app
+    pending = app.extensions['mailer'].stop(timeout=10)
+    if pending:
+        server.log.info(f"✓ Worker {worker.pid}: {pending} email(s) envoyé(s) avant arrêt")
@@ -0,0 +1,212 @@
+"""Inventaire des documents en base et ramasse-miettes des fichiers orphelins.
+
+Chaque document enregistré par le formulaire est inscrit dans la table
+document (taille, SHA-256, type MIME, demande propriétaire) : les rapports
+de stockage deviennent une requête indexée au lieu d'un parcours du dossier.
+
+flask reconcile-uploads parcourt le stockage par lots (os.scandir en local) :
+- un fichier référencé par une demande mais absent de l'inventaire y est ajouté
+- un fichier sans demande (active ou archivée), plus vieux que ORPHAN_GRACE_SECONDS, est supprimé
+  (au plus --max-delete par passage)
+- une ligne d'inventaire dont le fichier a disparu est retirée
+"""
+import time
+import hashlib
+import mimetypes
+from datetime import datetime
+
+import click
+
+from database import db, Document, StudentRequest, ArchivedRequest, DOCUMENT_FIELDS
+from storage import get_storage
+
+# Signatures des formats acceptés par le formulaire
+_MAGIC_NUMBERS = [
+    (b'%PDF', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+]
+
+
+def sniff_mime_type(head, filename):
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime_type
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+class HashingReader:
+    """Flux qui calcule taille, SHA-256 et signature pendant sa lecture."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        if data:
+            self._sha256.update(data)
+            self.size += len(data)
+            if len(self.head) < 16:
+                self.head += data[:16 - len(self.head)]
+        return data
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    reader = HashingReader(stream)
+    while reader.read(chunk_size):
+        pass
+    return reader
+
+
+def register_document(filename, request_id, field, reader):
+    """Inscrire (ou mettre à jour) un document dans l'inventaire."""
+    document = Document.query.filter_by(filename=filename).first()
+    if document is None:
+        document = Document(filename=filename)
+        db.session.add(document)
+    document.request_id = request_id
+    document.field = field
+    document.size = reader.size
+    document.sha256 = reader.sha256
+    document.mime_type = sniff_mime_type(reader.head, filename)
+    return document
+
+
+def forget_documents(request_id):
+    """Retirer de l'inventaire les documents d'une demande supprimée."""
+    Document.query.filter_by(request_id=request_id).delete(synchronize_session=False)
+
+
+def storage_report():
+    """Totaux du stockage calculés sur l'inventaire."""
+    total, total_size, orphans = db.session.query(
+        db.func.count(Document.id),
+        db.func.coalesce(db.func.sum(Document.size), 0),
+        db.func.count(Document.id).filter(Document.request_id.is_(None),
+                                          Document.archived_request_id.is_(None))
+    ).one()
+    return {'total': total, 'total_size': int(total_size), 'orphans': orphans}
+
+
+def _owner_from_filename(name):
+    """Les documents sont nommés <id demande>_<champ>.<ext>."""
+    prefix, _, rest = name.partition('_')
+    field = rest.rsplit('.', 1)[0]
+    if prefix.isdigit() and field in DOCUMENT_FIELDS:
+        return int(prefix), field
+    return None, None
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reconcile_uploads(batch_size=500, max_delete=100, grace_seconds=3600, dry_run=False):
+    """Rapprocher stockage et inventaire ; retourne les compteurs du passage."""
+    storage = get_storage()
+    stats = {'scanned': 0, 'indexed': 0, 'deleted': 0, 'missing': 0}
+    now = time.time()
+    started_at = datetime.utcnow()
+    seen = set()
+
+    for batch in _batches(storage.list(), batch_size):
+        stats['scanned'] += len(batch)
+        names = [name for name, _, _ in batch]
+        seen.update(names)
+
+        known = {
+            row.filename: row for row in
+            Document.query.filter(Document.filename.in_(names)).all()
+        }
+
+        # Demandes qui référencent encore ces fichiers
+        owners = {name: _owner_from_filename(name) for name in names if name not in known}
+        request_ids = {owner[0] for owner in owners.values() if owner[0] is not None}
+        referenced = set()
+        if request_ids:
+            for model in (StudentRequest, ArchivedRequest):
+                for student in model.query.filter(model.id.in_(request_ids)).all():
+                    for field in DOCUMENT_FIELDS:
+                        if getattr(student, field):
+                            referenced.add(getattr(student, field))
+
+        for name, size, modified in batch:
+            document = known.get(name)
+            orphan = (document is not None and document.request_id is None
+                      and document.archived_request_id is None) or \
+                     (document is None and name not in referenced)
+
+            if document is None and not orphan:
+                if not dry_run:
+                    with storage.open(name) as stream:
+                        reader = hash_stream(stream)
+                    request_id, field = owners[name]
+                    register_document(name, request_id, field, reader)
+                stats['indexed'] += 1
+                continue
+
+            # Délai de grâce : le formulaire écrit le fichier avant de valider la demande
+            if orphan and now - modified > grace_seconds and stats['deleted'] < max_delete:
+                if not dry_run:
+                    try:
+                        storage.delete(name)
+                        if document is not None:
+                            db.session.delete(document)
+                    except Exception as e:
+                        print(f"✗ Erreur suppression orphelin {name}: {str(e)}")
+                        continue
+                stats['deleted'] += 1
+                print(f"✓ Orphelin {'à supprimer' if dry_run else 'supprimé'}: {name} ({size} octets)")
+
+        if not dry_run:
+            db.session.commit()
+
+    # Lignes d'inventaire dont le fichier n'existe plus (les documents
+    # inscrits pendant le parcours ne sont pas concernés)
+    last_id = 0
+    while True:
+        rows = (Document.query.with_entities(Document.id, Document.filename)
+                .filter(Document.id > last_id, Document.created_at < started_at)
+                .order_by(Document.id).limit(batch_size).all())
+        if not rows:
+            break
+        missing = [row.id for row in rows if row.filename not in seen]
+        stats['missing'] += len(missing)
+        if missing and not dry_run:
+            Document.query.filter(Document.id.in_(missing)).delete(synchronize_session=False)
+            db.session.commit()
+        last_id = rows[-1].id
+
+    return stats
+
+
+def init_inventory(app):
+
+    @app.cli.command('reconcile-uploads')
+    @click.option('--batch-size', default=500, show_default=True, help='Fichiers traités par lot')
+    @click.option('--max-delete', default=100, show_default=True, help='Suppressions maximales par passage')
+    @click.option('--dry-run', is_flag=True, help='Afficher sans rien modifier')
+    def reconcile_uploads_command(batch_size, max_delete, dry_run):
+        """Indexer les documents existants et supprimer les fichiers orphelins."""
+        stats = reconcile_uploads(
+            batch_size=batch_size,
+            max_delete=max_delete,
+            grace_seconds=app.config['ORPHAN_GRACE_SECONDS'],
+            dry_run=dry_run
+        )
+        print(f"✓ {stats['scanned']} fichier(s) parcouru(s), {stats['indexed']} indexé(s), "
+              f"{stats['deleted']} orphelin(s) supprimé(s), {stats['missing']} fichier(s) manquant(s)")
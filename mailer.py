@@ -0,0 +1,151 @@
+"""Envoi des emails SendGrid hors du chemin des requêtes.
+
+Les vues ne font que déposer le message dans une file bornée
+(MAIL_QUEUE_SIZE) : MAIL_WORKERS threads d'envoi par processus la vident en
+réutilisant une session HTTP (connexions keep-alive vers l'API SendGrid) et
+espacent leurs appels de MAIL_SEND_INTERVAL secondes, au lieu d'un thread et
+d'une pause par email dans la vue.
+
+Sous gunicorn avec un worker gevent, threading et queue sont remplacés par
+leurs équivalents coopératifs (gunicorn.conf.py) : les threads d'envoi
+deviennent des greenlets et l'attente de SendGrid ne bloque plus le worker.
+"""
+import os
+import time
+import queue
+import threading
+
+import requests
+from flask import current_app
+
+
+class Mailer:
+    """File d'emails et threads d'envoi du processus"""
+
+    def __init__(self, config):
+        self.config = config
+        self._queue = queue.Queue(maxsize=config['MAIL_QUEUE_SIZE'])
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._http = None
+
+    def deliver(self, to_email, subject, body, from_email=None):
+        """Envoyer un email via SendGrid API v3 (appel bloquant)."""
+        try:
+            api_key = self.config['SENDGRID_API_KEY']
+            if not api_key:
+                print("✗ SendGrid API Key non configurée")
+                return False
+
+            if from_email is None:
+                from_email = self.config['MAIL_DEFAULT_SENDER']
+                if not from_email:
+                    print("✗ Expéditeur non configuré")
+                    return False
+
+            data = {
+                "personalizations": [
+                    {
+                        "to": [{"email": to_email}],
+                        "subject": subject
+                    }
+                ],
+                "from": {"email": from_email},
+                "content": [
+                    {
+                        "type": "text/plain",
+                        "value": body
+                    }
+                ]
+            }
+            response = self._session().post(
+                self.config['SENDGRID_API_URL'],
+                headers={"Authorization": f"Bearer {api_key}"},
+                json=data,
+                timeout=self.config['MAIL_TIMEOUT']
+            )
+
+            if response.status_code in [200, 202]:
+                print(f"✓ Email envoyé à {to_email}")
+                return True
+            print(f"✗ Erreur SendGrid ({response.status_code}): {response.text[:200]}")
+            return False
+
+        except requests.exceptions.Timeout:
+            print(f"✗ Timeout SendGrid pour {to_email}")
+            return False
+        except Exception as e:
+            print(f"✗ Exception SendGrid pour {to_email}: {str(e)}")
+            return False
+
+    def send(self, to_email, subject, body, from_email=None):
+        """Mettre un email en file ; retourne False si la file est pleine."""
+        self.ensure_started()
+        try:
+            self._queue.put_nowait((to_email, subject, body, from_email))
+            return True
+        except queue.Full:
+            print(f"✗ File d'emails pleine, email non envoyé: {to_email}")
+            return False
+
+    def ensure_started(self):
+        # Après un fork, les threads du processus parent n'existent plus
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._http = None
+            self._threads = []
+            for index in range(max(1, self.config['MAIL_WORKERS'])):
+                thread = threading.Thread(target=self._run, name=f'mailer-{index}')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _session(self):
+        # Une session (et ses connexions) par processus
+        if self._http is None:
+            self._http = requests.Session()
+        return self._http
+
+    def _run(self):
+        interval = self.config['MAIL_SEND_INTERVAL']
+        while True:
+            message = self._queue.get()
+            try:
+                if message is None:
+                    return
+                self.deliver(*message)
+            finally:
+                self._queue.task_done()
+            # Éviter les limites de débit de SendGrid
+            time.sleep(interval)
+
+    def stop(self, timeout=10):
+        """Envoyer les emails en file puis arrêter les threads (fin de worker)."""
+        if self._pid != os.getpid():
+            return 0
+        pending = self._queue.qsize()
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._pid = None
+        return pending
+
+
+def get_mailer():
+    return current_app.extensions['mailer']
+
+
+def init_mailer(app):
+    mailer = Mailer(app.config)
+    app.extensions['mailer'] = mailer
+    return mailer
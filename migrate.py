@@ -2,55 +2,145 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import inspect, text, MetaData
+from sqlalchemy.schema import CreateTable
+
 from app import app, db
 from database import StudentRequest
+from rollups import ensure_rollups
 
-def migrate():
+def add_region_column():
     """Ajouter la colonne region_universitaire à la table existante"""
+    # Pour PostgreSQL, nous devons utiliser ALTER TABLE
+    # SQLAlchemy n'a pas de méthode native pour modifier les tables
+
+    # Vérifier si la colonne existe déjà
+    inspector = inspect(db.engine)
+    columns = [col['name'] for col in inspector.get_columns('student_request')]
+
+    if 'region_universitaire' in columns:
+        print("La colonne region_universitaire existe déjà")
+        return
+
+    print("Migration des données...")
+
+    # Migration simple: ajouter la colonne avec une valeur par défaut
+    with db.engine.connect() as conn:
+        # Pour SQLite
+        if 'sqlite' in str(db.engine.url):
+            conn.execute(text('''
+                ALTER TABLE student_request
+                ADD COLUMN region_universitaire VARCHAR(100) DEFAULT 'Dakar' NOT NULL
+            '''))
+        # Pour PostgreSQL
+        elif 'postgresql' in str(db.engine.url):
+            conn.execute(text('''
+                ALTER TABLE student_request
+                ADD COLUMN region_universitaire VARCHAR(100) NOT NULL DEFAULT 'Dakar'
+            '''))
+
+        conn.commit()
+
+    print("✓ Colonne region_universitaire ajoutée")
+
+def add_upload_owner_column():
+    """Ajouter upload_session.owner_token (jeton du navigateur qui a créé l'envoi)"""
+    columns = [col['name'] for col in inspect(db.engine).get_columns('upload_session')]
+    if 'owner_token' in columns:
+        return
+
+    with db.engine.connect() as conn:
+        conn.execute(text('ALTER TABLE upload_session ADD COLUMN owner_token VARCHAR(64)'))
+        conn.commit()
+
+    # Les envois en cours sans jeton ne sont plus utilisables : ils expirent
+    print("✓ Colonne owner_token ajoutée")
+
+def use_sqlite_autoincrement():
+    """SQLite : ne plus réutiliser les identifiants de student_request
+
+    Sans AUTOINCREMENT, SQLite redonne le plus grand identifiant libéré : une
+    nouvelle demande reprendrait celui d'une demande archivée (archive.py),
+    écraserait ses documents <id>_<champ>.<ext> et empêcherait sa
+    restauration. La table est reconstruite avec AUTOINCREMENT, et la
+    séquence placée au-delà des identifiants archivés. PostgreSQL (séquence)
+    n'est pas concerné.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    with db.engine.connect() as conn:
+        ddl = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name='student_request'"
+        )).scalar() or ''
+
+        if 'AUTOINCREMENT' not in ddl.upper():
+            print("Reconstruction de student_request avec AUTOINCREMENT...")
+            existing = {col['name'] for col in inspect(conn).get_columns('student_request')}
+            columns = ', '.join(c.name for c in StudentRequest.__table__.columns if c.name in existing)
+
+            # Procédure SQLite : nouvelle table, copie, suppression, renommage
+            # (les clés étrangères des autres tables désignent toujours student_request)
+            conn.execute(text('DROP TABLE IF EXISTS student_request_new'))
+            new_table = StudentRequest.__table__.to_metadata(MetaData(), name='student_request_new')
+            conn.execute(CreateTable(new_table))
+            conn.execute(text(f'INSERT INTO student_request_new ({columns}) '
+                              f'SELECT {columns} FROM student_request'))
+            conn.execute(text('DROP TABLE student_request'))
+            conn.execute(text('ALTER TABLE student_request_new RENAME TO student_request'))
+            print("✓ student_request reconstruite (index recréés ci-dessous)")
+
+        # Séquence au-delà des demandes actives et archivées
+        top = conn.execute(text(
+            'SELECT MAX(id) FROM (SELECT id FROM student_request UNION ALL SELECT id FROM archived_request)'
+        )).scalar() or 0
+        current = conn.execute(text(
+            "SELECT seq FROM sqlite_sequence WHERE name='student_request'"
+        )).scalar()
+        if current is None and top:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('student_request', :top)"),
+                         {'top': top})
+        elif current is not None and current < top:
+            conn.execute(text("UPDATE sqlite_sequence SET seq = :top WHERE name='student_request'"),
+                         {'top': top})
+        conn.commit()
+
+def create_missing_indexes():
+    """Créer les index déclarés sur des tables qui existaient déjà
+
+    db.create_all() ignore une table existante, index compris : la file de
+    revue (ix_student_request_queue) et les segments par région
+    (ix_student_request_region) n'existeraient que sur une base neuve.
+    """
+    created = 0
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine, checkfirst=True)
+                print(f"✓ Index {index.name} créé")
+                created += 1
+    if not created:
+        print("Les index existent déjà")
+
+def migrate():
+    """Mettre à jour une base existante : tables, colonnes et index manquants"""
     with app.app_context():
         try:
-            # Pour PostgreSQL, nous devons utiliser ALTER TABLE
-            # SQLAlchemy n'a pas de méthode native pour modifier les tables
-            # Nous allons créer une nouvelle table et migrer les données
-            
-            print("Création d'une table temporaire...")
-            
-            # Créer une table temporaire avec la nouvelle structure
-            temp_table_name = 'student_request_temp'
-            
-            # Vérifier si la colonne existe déjà
-            from sqlalchemy import inspect, text
-            inspector = inspect(db.engine)
-            columns = [col['name'] for col in inspector.get_columns('student_request')]
-            
-            if 'region_universitaire' in columns:
-                print("La colonne region_universitaire existe déjà")
-                return
-            
-            print("Migration des données...")
-            
-            # Migration simple: ajouter la colonne avec une valeur par défaut
-            with db.engine.connect() as conn:
-                # Pour SQLite
-                if 'sqlite' in str(db.engine.url):
-                    conn.execute(text('''
-                        ALTER TABLE student_request 
-                        ADD COLUMN region_universitaire VARCHAR(100) DEFAULT 'Dakar' NOT NULL
-                    '''))
-                # Pour PostgreSQL
-                elif 'postgresql' in str(db.engine.url):
-                    conn.execute(text('''
-                        ALTER TABLE student_request 
-                        ADD COLUMN region_universitaire VARCHAR(100) NOT NULL DEFAULT 'Dakar'
-                    '''))
-                
-                conn.commit()
-            
+            # Nouvelles tables (et leurs index)
+            db.create_all()
+            add_region_column()
+            add_upload_owner_column()
+            use_sqlite_autoincrement()
+            create_missing_indexes()
+            # Agrégats journaliers d'une base antérieure à daily_rollup
+            ensure_rollups()
             print("✓ Migration réussie")
-            
+
         except Exception as e:
             print(f"✗ Erreur migration: {str(e)}")
             db.session.rollback()
 
 if __name__ == '__main__':
-    migrate()
\ No newline at end of file
+    migrate()
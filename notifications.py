@@ -0,0 +1,217 @@
+"""Regroupement des emails de changement de statut.
+
+Un changement de statut n'envoie plus d'email immédiatement : il est mis en
+attente pendant NOTIFY_QUIET_SECONDS. Chaque nouveau changement sur la même
+demande repousse l'échéance et remplace le statut en attente. À l'échéance,
+seul l'état final est envoyé, ou rien si la demande est revenue à son statut
+d'origine. Un thread par processus vide la file par lots de NOTIFY_BATCH_SIZE.
+
+Une notification n'est supprimée qu'une fois l'email accepté par SendGrid
+(envoi bloquant depuis ce thread, hors transaction) : un redémarrage ne perd
+rien, et un échec est retenté après NOTIFY_RETRY_SECONDS, pendant au plus
+NOTIFY_MAX_AGE_HOURS.
+
+Avec NOTIFY_QUIET_SECONDS = 0, les emails partent immédiatement comme avant.
+"""
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from database import db, StudentRequest, PendingNotification, insert_ignore
+
+
+def queue_status_notification(student, old_status, status, notes):
+    """Mettre en attente (ou remplacer) l'email de statut d'une demande."""
+    window = current_app.config['NOTIFY_QUIET_SECONDS']
+    notifier = current_app.extensions['notifications']
+
+    if window <= 0:
+        if old_status != status:
+            notifier.send_now(student, status, notes)
+        return
+
+    due_at = datetime.utcnow() + timedelta(seconds=window)
+    pending = PendingNotification.query.filter_by(request_id=student.id).first()
+    if pending is None:
+        # Comme avant : une simple modification des notes n'envoie rien
+        if old_status == status:
+            return
+        # Deux premiers changements simultanés : un seul insère, l'autre met à jour
+        if insert_ignore(PendingNotification, ['request_id'], request_id=student.id,
+                         original_status=old_status, status=status, notes=notes, due_at=due_at):
+            db.session.commit()
+            notifier.ensure_started()
+            return
+        pending = PendingNotification.query.filter_by(request_id=student.id).first()
+
+    pending.status = status
+    pending.notes = notes
+    pending.due_at = due_at
+    db.session.commit()
+
+    notifier.ensure_started()
+
+
+def _finish(statement):
+    """Exécuter une mise à jour de la file dans sa propre transaction ; nombre de lignes."""
+    try:
+        count = db.session.execute(statement).rowcount
+        db.session.commit()
+        return count
+    except Exception as e:
+        db.session.rollback()
+        print(f"✗ Erreur mise à jour des notifications: {str(e)}")
+        return 0
+
+
+def flush_due_notifications(deliver, limit=None, force=False):
+    """Envoyer un lot de notifications arrivées à échéance.
+
+    deliver(student, status, notes, wait=True) retourne False en cas d'échec.
+    Retourne le nombre de notifications traitées. Avec force=True, elles
+    sont envoyées sans attendre la fin de la fenêtre de calme.
+
+    Le lot est d'abord réservé (échéance repoussée) dans une transaction
+    courte ; les envois se font hors transaction, sans bloquer les écritures
+    des étudiants et des admins. Une notification modifiée pendant l'envoi
+    (nouveau statut) n'est pas supprimée : elle part à sa nouvelle échéance.
+    """
+    config = current_app.config
+    limit = limit or config['NOTIFY_BATCH_SIZE']
+    now = datetime.utcnow()
+    query = PendingNotification.query
+    if not force:
+        query = query.filter(PendingNotification.due_at <= now)
+
+    # SKIP LOCKED : deux workers ne prennent jamais la même notification
+    due = query.order_by(PendingNotification.due_at).limit(limit).with_for_update(skip_locked=True).all()
+    if not due:
+        db.session.rollback()
+        return 0
+
+    # Réservation pour la durée des envois : un processus arrêté en cours de
+    # lot laisse ses notifications reprises à la fin de la réservation
+    lease = now + timedelta(seconds=len(due) * (config['MAIL_TIMEOUT'] + config['MAIL_SEND_INTERVAL'])
+                            + config['NOTIFY_RETRY_SECONDS'])
+    claimed = []
+    for pending in due:
+        pending.due_at = lease
+        student = db.session.get(StudentRequest, pending.request_id)
+        if student is not None:
+            # Lisible après le commit sans nouvelle requête
+            db.session.expunge(student)
+        claimed.append((pending.id, student, pending.original_status, pending.status,
+                        pending.notes, pending.created_at))
+    db.session.commit()
+
+    table = PendingNotification.__table__
+    sent = skipped = failed = 0
+    for pending_id, student, original_status, status, notes, created_at in claimed:
+        # Ligne inchangée depuis la réservation
+        unchanged = (table.c.id == pending_id) & (table.c.due_at == lease)
+
+        if student is None or not student.email or status == original_status:
+            _finish(table.delete().where(unchanged))
+            skipped += 1
+            continue
+
+        try:
+            delivered = deliver(student, status, notes, wait=True)
+        except Exception as e:
+            print(f"✗ Erreur envoi notification demande {student.id}: {str(e)}")
+            delivered = False
+
+        if delivered:
+            if not _finish(table.delete().where(unchanged)):
+                # Statut modifié pendant l'envoi : l'étudiant connaît maintenant celui-ci
+                _finish(table.update().where(table.c.id == pending_id).values(original_status=status))
+            sent += 1
+            # Éviter les limites de débit de SendGrid
+            time.sleep(config['MAIL_SEND_INTERVAL'])
+        elif now - created_at > timedelta(hours=config['NOTIFY_MAX_AGE_HOURS']):
+            print(f"✗ Notification abandonnée pour la demande {student.id} après plusieurs échecs")
+            _finish(table.delete().where(unchanged))
+            failed += 1
+        else:
+            # La ligne reste en base : nouvel essai plus tard
+            _finish(table.update().where(unchanged)
+                    .values(due_at=datetime.utcnow() + timedelta(seconds=config['NOTIFY_RETRY_SECONDS'])))
+            failed += 1
+
+    if skipped:
+        print(f"✓ {skipped} notification(s) annulée(s) (statut inchangé)")
+    if failed:
+        print(f"✗ {failed} notification(s) non envoyée(s)")
+    return len(claimed)
+
+class StatusNotifier:
+    """Thread de vidage de la file, démarré à la demande dans chaque processus"""
+
+    def __init__(self, app, deliver):
+        self.app = app
+        self.deliver = deliver
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def send_now(self, student, status, notes):
+        # deliver ne fait que mettre l'email en file (voir mailer.py)
+        self.deliver(student, status, notes)
+
+    def ensure_started(self):
+        # Après un fork, le thread du processus parent n'existe plus
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='status-notifier')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        interval = self.app.config['NOTIFY_FLUSH_INTERVAL']
+        while True:
+            time.sleep(interval)
+            with self.app.app_context():
+                try:
+                    # Vider tous les lots échus avant de se rendormir
+                    while flush_due_notifications(self.deliver) >= self.app.config['NOTIFY_BATCH_SIZE']:
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"✗ Erreur vidage des notifications: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+def init_notifications(app, deliver):
+    """deliver(student, status, notes) met l'email de statut dans la file d'envoi."""
+    notifier = StatusNotifier(app, deliver)
+    app.extensions['notifications'] = notifier
+
+    # Reprendre les notifications laissées par un worker redémarré
+    if app.config['NOTIFY_QUIET_SECONDS'] > 0:
+        app.before_request(notifier.ensure_started)
+
+    @app.cli.command('flush-notifications')
+    def flush_notifications_command():
+        """Envoyer immédiatement toutes les notifications en attente."""
+        total = 0
+        # Les échecs sont reportés de NOTIFY_RETRY_SECONDS : un seul passage
+        # sur ce qui est en attente maintenant
+        remaining = PendingNotification.query.count()
+        while remaining > 0:
+            processed = flush_due_notifications(deliver, limit=min(remaining, app.config['NOTIFY_BATCH_SIZE']),
+                                                force=True)
+            if not processed:
+                break
+            total += processed
+            remaining -= processed
+        print(f"✓ {total} notification(s) traitée(s)")
+
+    return notifier
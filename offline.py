@@ -0,0 +1,94 @@
+"""Formulaire de demande utilisable hors ligne (service worker).
+
+GET /sw.js sert le service worker (gabarit templates/sw.js) à la racine du
+site. Il met en cache la page du formulaire et les fichiers statiques :
+une visite suivante s'affiche depuis le cache puis la page est rafraîchie en
+arrière-plan.
+
+Côté page (static/js/offline.js), les champs saisis et les documents
+choisis sont conservés dans IndexedDB ; une soumission impossible (hors
+ligne, coupure, serveur saturé) est mise en file et renvoyée par la
+synchronisation en arrière-plan (Background Sync), ou au retour du réseau
+dans les navigateurs qui ne la gèrent pas. Les documents déjà envoyés par
+fragments (uploads.py) ne sont pas renvoyés : seul leur identifiant part.
+
+Chaque envoi porte un identifiant généré par la page (champ submission_id,
+table form_submission) : une soumission rejouée alors que le serveur l'avait
+déjà enregistrée (réponse perdue, 5xx après le commit) reçoit la même
+redirection, sans créer de seconde demande.
+
+Soumise par fetch (en-tête X-Offline-Submit), la vue répond
+{"redirect": url} au lieu de rediriger : la page ou le service worker sait
+si la demande est acceptée, et les messages flash restent pour la page
+d'arrivée.
+
+Seule une page du formulaire sans message flash est mise en cache (en-tête
+X-Offline-Shell), pour ne pas réafficher un message d'une visite à l'autre.
+OFFLINE_FORM_ENABLED=0 sert un service worker qui se désinstalle.
+"""
+import json
+import hashlib
+
+from flask import render_template, request, session, g, url_for, make_response, jsonify
+
+# Fichiers statiques nécessaires à l'affichage du formulaire hors ligne
+SHELL_ASSETS = ['css/style.css', 'js/main.js', 'js/upload.js', 'js/offline-store.js', 'js/offline.js']
+
+# Feuilles et scripts chargés depuis un CDN par base.html
+SHELL_CDN = [
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/js/bootstrap.bundle.min.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+]
+
+
+def shell_urls(app):
+    """URL mises en cache à l'installation du service worker."""
+    asset_url = app.jinja_env.globals['asset_url']
+    return [asset_url(name) for name in SHELL_ASSETS] + SHELL_CDN
+
+
+def init_offline(app):
+
+    @app.route('/sw.js')
+    def service_worker():
+        """Service worker à la racine pour contrôler /formulaire"""
+        if app.config['OFFLINE_FORM_ENABLED']:
+            precache = shell_urls(app)
+            # Nouveau cache à chaque changement des fichiers empreintés
+            version = hashlib.sha256(json.dumps(precache).encode('utf-8')).hexdigest()[:10]
+            body = render_template('sw.js',
+                                   version=version,
+                                   form_url=url_for('formulaire'),
+                                   precache=precache,
+                                   store_url=app.jinja_env.globals['asset_url']('js/offline-store.js'))
+        else:
+            body = render_template('sw.js', disabled=True)
+
+        response = make_response(body)
+        response.mimetype = 'application/javascript'
+        # Le navigateur vérifie les mises à jour du service worker à chaque visite
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @app.before_request
+    def remember_pending_flashes():
+        if request.endpoint == 'formulaire' and request.method == 'GET':
+            g.offline_shell = not session.get('_flashes')
+
+    @app.after_request
+    def mark_offline_shell(response):
+        if g.get('offline_shell') and response.status_code == 200:
+            response.headers['X-Offline-Shell'] = '1'
+        return response
+
+    @app.after_request
+    def offline_submit_reply(response):
+        # Soumission par fetch (offline.js) : indiquer la page d'arrivée sans
+        # rediriger, pour que ses messages flash restent en session
+        if (request.endpoint == 'formulaire' and request.method == 'POST'
+                and request.headers.get('X-Offline-Submit') == '1' and response.status_code in (302, 303)):
+            reply = jsonify(redirect=response.location)
+            reply.headers['Cache-Control'] = 'no-store'
+            return reply
+        return response
@@ -0,0 +1,225 @@
+"""Profilage à la demande d'une requête admin.
+
+Un admin connecté ajoute ?_profile=1 à l'URL (ou l'en-tête X-Profile: 1) :
+la requête est échantillonnée toutes les PROFILER_INTERVAL_MS par un thread
+qui relève la pile du thread de la requête, et chaque requête SQL est
+chronométrée. Le profil est enregistré dans request_profile (les
+PROFILER_KEEP plus récents sont conservés) et consultable sur /admin/profiles,
+avec export des piles repliées pour flamegraph.pl ou speedscope.app.
+
+Les autres requêtes ne paient qu'un test sur l'URL et, pour chaque requête
+SQL, la lecture d'une variable locale au thread.
+"""
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import request, session, g, render_template, redirect, url_for, flash, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database import db, RequestProfile
+
+try:
+    from gevent import monkey
+except ImportError:  # gevent n'est utilisé qu'avec le worker gevent de gunicorn
+    monkey = None
+
+# Requêtes SQL conservées par profil
+MAX_QUERIES = 200
+MAX_STATEMENT_LENGTH = 1000
+
+_local = threading.local()
+
+
+class StackSampler(threading.Thread):
+    """Relève périodiquement la pile d'un thread"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class RequestProfiler:
+    """Échantillons et requêtes SQL d'une requête profilée"""
+
+    def __init__(self, interval):
+        self.queries = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.sampler.start()
+
+    def record_query(self, statement, duration_ms):
+        self.sql_count += 1
+        self.sql_ms += duration_ms
+        if len(self.queries) < MAX_QUERIES:
+            self.queries.append({
+                'statement': statement[:MAX_STATEMENT_LENGTH],
+                'duration_ms': round(duration_ms, 3)
+            })
+
+    def finish(self):
+        stacks = self.sampler.stop()
+        return {
+            'duration_ms': (time.perf_counter() - self.started) * 1000,
+            'sql_count': self.sql_count,
+            'sql_ms': self.sql_ms,
+            'samples': sum(stacks.values()),
+            'queries': json.dumps(self.queries),
+            'stacks': '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'profiler', None) is not None:
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is not None and conn.info.get('profiler_started'):
+        started = conn.info['profiler_started'].pop()
+        profiler.record_query(statement, (time.perf_counter() - started) * 1000)
+
+
+def _wants_profile():
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+def save_profile(data, keep):
+    """Enregistrer un profil (connexion séparée de la session de la vue)."""
+    table = RequestProfile.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(table.insert().values(created_at=datetime.utcnow(), **data))
+        profile_id = result.inserted_primary_key[0]
+        # Ne garder que les profils les plus récents
+        cutoff = conn.execute(
+            db.select(table.c.id).order_by(table.c.id.desc()).offset(keep).limit(1)
+        ).scalar()
+        if cutoff is not None:
+            conn.execute(table.delete().where(table.c.id <= cutoff))
+    return profile_id
+
+
+def _init_hooks(app):
+    if monkey is not None and monkey.is_module_patched('threading'):
+        # Les greenlets partagent un seul thread : pas de pile à échantillonner
+        print("✗ Profileur désactivé avec le worker gevent")
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_profiling():
+        if not _wants_profile() or not session.get('admin_logged_in'):
+            return
+        g.profiler = _local.profiler = RequestProfiler(app.config['PROFILER_INTERVAL_MS'] / 1000)
+
+    @app.after_request
+    def stop_profiling(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        _local.profiler = None
+
+        data = profiler.finish()
+        data.update(method=request.method, path=request.full_path.rstrip('?')[:500],
+                    status_code=response.status_code)
+        try:
+            profile_id = save_profile(data, app.config['PROFILER_KEEP'])
+            response.headers['X-Profile-Id'] = str(profile_id)
+            print(f"✓ Profil #{profile_id}: {data['method']} {data['path']} "
+                  f"{data['duration_ms']:.0f}ms, {data['sql_count']} requête(s) SQL")
+        except Exception as e:
+            print(f"✗ Erreur enregistrement du profil: {str(e)}")
+        return response
+
+    @app.teardown_request
+    def clear_profiling(exc):
+        # Requête interrompue par une exception : arrêter l'échantillonnage
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            _local.profiler = None
+            profiler.sampler.stop()
+
+
+def init_profiler(app):
+    # Les pages de consultation restent disponibles, même sans profilage
+    if app.config['PROFILER_ENABLED']:
+        _init_hooks(app)
+
+    @app.route('/admin/profiles')
+    def admin_profiles():
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+
+        profiles = (RequestProfile.query
+                    .with_entities(RequestProfile.id, RequestProfile.created_at, RequestProfile.method,
+                                   RequestProfile.path, RequestProfile.status_code,
+                                   RequestProfile.duration_ms, RequestProfile.sql_count,
+                                   RequestProfile.sql_ms, RequestProfile.samples)
+                    .order_by(RequestProfile.id.desc()).all())
+        return render_template('admin_profiles.html', profiles=profiles, profile=None)
+
+    @app.route('/admin/profiles/<int:profile_id>')
+    def admin_profile(profile_id):
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+
+        profile = RequestProfile.query.get_or_404(profile_id)
+        queries = sorted(json.loads(profile.queries or '[]'), key=lambda q: q['duration_ms'], reverse=True)
+
+        # Fonctions les plus présentes dans les échantillons (temps inclusif)
+        functions = Counter()
+        for line in (profile.stacks or '').splitlines():
+            stack, _, count = line.rpartition(' ')
+            for name in set(stack.split(';')):
+                functions[name] += int(count)
+
+        return render_template('admin_profiles.html',
+                             profiles=None,
+                             profile=profile,
+                             queries=queries,
+                             functions=functions.most_common(30))
+
+    @app.route('/admin/profiles/<int:profile_id>/flamegraph')
+    def admin_profile_flamegraph(profile_id):
+        if not session.get('admin_logged_in'):
+            return redirect(url_for('admin_login'))
+
+        profile = RequestProfile.query.get_or_404(profile_id)
+        return Response(
+            (profile.stacks or '') + '\n',
+            mimetype='text/plain',
+            headers={'Content-Disposition': f'attachment; filename=profile_{profile_id}.folded'}
+        )
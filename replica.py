@@ -0,0 +1,122 @@
+"""Routage des lectures admin vers un réplica en lecture seule (optionnel).
+
+Si DATABASE_REPLICA_URL est défini, les vues décorées par @read_only lisent
+sur le réplica tant qu'il répond et que son retard reste sous
+REPLICA_MAX_LAG_SECONDS ; sinon elles retombent sur la base principale.
+Les écritures (flush) partent toujours vers la base principale.
+
+Après une modification faite par un admin, mark_primary_reads() force ses
+lectures sur la base principale quelques secondes, pour qu'il voie
+immédiatement ses propres changements.
+"""
+import time
+import threading
+from functools import wraps
+
+from flask import current_app, g, session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+
+from engine_profiles import engine_options
+
+
+class ReplicaRouter:
+    """Moteur du réplica et état de santé mis en cache"""
+
+    def __init__(self, url, engine_options=None, max_lag=5, check_interval=10):
+        self.engine = create_engine(url, **(engine_options or {}))
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = 0.0
+
+    def _probe(self):
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name != 'postgresql':
+                conn.execute(text('SELECT 1'))
+                return True
+            # NULL sur une base qui n'est pas un réplica en réplication
+            caught_up, lag = conn.execute(text(
+                'SELECT pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(), '
+                'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+            )).one()
+            if caught_up:
+                # Tout le WAL reçu est rejoué : à jour, même si la base
+                # principale n'a rien écrit depuis longtemps
+                lag = 0
+            return lag is None or lag <= self.max_lag
+
+    def is_healthy(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._healthy
+
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                try:
+                    healthy = self._probe()
+                except Exception as e:
+                    print(f"✗ Réplica indisponible: {str(e)}")
+                    healthy = False
+                if healthy != self._healthy:
+                    print(f"{'✓' if healthy else '✗'} Réplica {'actif' if healthy else 'désactivé'}")
+                self._healthy = healthy
+                self._checked_at = time.monotonic()
+        return self._healthy
+
+
+def _replica_engine():
+    """Moteur à utiliser pour la lecture en cours, ou None pour la base principale."""
+    if not has_request_context() or not g.get('read_replica'):
+        return None
+
+    router = current_app.extensions.get('replica')
+    if router is None:
+        return None
+
+    if session.get('read_primary_until', 0) > time.time():
+        return None
+
+    return router.engine if router.is_healthy() else None
+
+
+class RoutingSession(Session):
+    """Session Flask-SQLAlchemy qui envoie les lectures read_only au réplica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing:
+            engine = _replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Autoriser une vue à lire sur le réplica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def mark_primary_reads():
+    """Lire sur la base principale pendant REPLICA_READ_YOUR_WRITES_SECONDS."""
+    if current_app.extensions.get('replica') is not None:
+        session['read_primary_until'] = time.time() + current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+
+
+def init_replica(app):
+    url = app.config.get('DATABASE_REPLICA_URL')
+    if not url:
+        return None
+
+    router = ReplicaRouter(
+        url,
+        engine_options=engine_options(url, app.config),
+        max_lag=app.config['REPLICA_MAX_LAG_SECONDS'],
+        check_interval=app.config['REPLICA_HEALTH_CHECK_INTERVAL']
+    )
+    app.extensions['replica'] = router
+    return router
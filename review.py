@@ -0,0 +1,233 @@
+"""File de revue des demandes en attente.
+
+/admin/review parcourt les demandes en attente de la plus ancienne à la plus
+récente. La page affiche une demande à la fois ; pendant la lecture, le
+navigateur précharge la suivante (/admin/api/review/<id>) et les miniatures
+de ses documents. La décision est envoyée à /admin/review/<id>/decision, qui
+renvoie l'identifiant suivant : la demande préchargée s'affiche sans
+recharger la page ni le tableau de bord.
+"""
+import io
+from datetime import datetime
+from functools import lru_cache
+
+from flask import render_template, request, redirect, url_for, session, jsonify, flash, send_file, abort
+
+from database import db, StudentRequest, Document, DOCUMENT_FIELDS
+from storage import get_storage
+from replica import mark_primary_reads
+from notifications import queue_status_notification
+from rollups import apply_rollup_deltas, rollup_key
+
+DOCUMENT_LABELS = {
+    'certificat_inscription': "Certificat d'inscription",
+    'certificat_residence': 'Certificat de résidence',
+    'demande_manuscrite': 'Demande manuscrite',
+    'carte_membre_reed': 'Carte de membre REED',
+    'copie_cni': 'CNI'
+}
+IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg')
+THUMBNAIL_SIZE = (480, 480)
+
+
+def record_decision(student, status, notes):
+    """Enregistrer le statut d'une demande et programmer l'email de l'étudiant."""
+    old_status = student.status
+    student.status = status
+    student.admin_notes = notes
+    student.date_processed = datetime.utcnow()
+    db.session.commit()
+    mark_primary_reads()
+
+    # Email à l'étudiant regroupé pendant la fenêtre de calme
+    queue_status_notification(student, old_status, status, notes)
+
+
+def claim_decision(student, status, notes):
+    """Décider une demande encore en attente ; False si un autre admin l'a déjà traitée.
+
+    Le changement de statut est une seule mise à jour conditionnelle
+    (WHERE status = 'pending') : de deux décisions simultanées, une seule
+    aboutit et un seul email est programmé.
+    """
+    table = StudentRequest.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.id == student.id, table.c.status == 'pending')
+        .values(status=status, admin_notes=notes, date_processed=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        db.session.rollback()
+        return False
+
+    # La mise à jour directe ne passe pas par les événements de session
+    apply_rollup_deltas(db.session, {
+        rollup_key(student.date_submitted, student.region_universitaire, 'pending'): -1,
+        rollup_key(student.date_submitted, student.region_universitaire, status): 1
+    })
+    db.session.commit()
+    mark_primary_reads()
+
+    queue_status_notification(student, 'pending', status, notes)
+    return True
+
+
+def _pending_query():
+    return StudentRequest.query.filter(StudentRequest.status == 'pending')
+
+
+def _neighbour_id(student, direction):
+    """Demande en attente suivante (1) ou précédente (-1) dans l'ordre de soumission."""
+    key = (StudentRequest.date_submitted, StudentRequest.id)
+    if direction > 0:
+        condition = db.tuple_(*key) > db.tuple_(student.date_submitted, student.id)
+        order = [StudentRequest.date_submitted, StudentRequest.id]
+    else:
+        condition = db.tuple_(*key) < db.tuple_(student.date_submitted, student.id)
+        order = [StudentRequest.date_submitted.desc(), StudentRequest.id.desc()]
+    row = (_pending_query().with_entities(StudentRequest.id)
+           .filter(condition).order_by(*order).first())
+    return row.id if row else None
+
+
+def first_pending_id():
+    row = (_pending_query().with_entities(StudentRequest.id)
+           .order_by(StudentRequest.date_submitted, StudentRequest.id).first())
+    return row.id if row else None
+
+
+def review_payload(student):
+    """Données d'une demande pour la page de revue (affichage ou préchargement)."""
+    documents = []
+    for field in DOCUMENT_FIELDS:
+        filename = getattr(student, field)
+        is_image = bool(filename) and filename.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+        documents.append({
+            'field': field,
+            'label': DOCUMENT_LABELS[field],
+            'url': url_for('serve_uploaded_file', filename=filename) if filename else None,
+            'thumbnail': url_for('review_thumbnail', filename=filename) if is_image else None
+        })
+
+    return {
+        'id': student.id,
+        'nom': student.nom,
+        'prenom': student.prenom,
+        'adresse': student.adresse,
+        'telephone': student.telephone,
+        'email': student.email,
+        'region_universitaire': student.region_universitaire,
+        'status': student.status,
+        'date_submitted': student.date_submitted.strftime('%d/%m/%Y %H:%M') if student.date_submitted else '',
+        'documents': documents,
+        'previous_id': _neighbour_id(student, -1),
+        'next_id': _neighbour_id(student, 1),
+        'remaining': _pending_query().count()
+    }
+
+
+@lru_cache(maxsize=256)
+def _render_thumbnail(filename, version):
+    from PIL import Image
+
+    with get_storage().open(filename) as stream:
+        data = stream.read()
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = io.BytesIO()
+        image.convert('RGB').save(output, 'JPEG', quality=75, optimize=True)
+    return output.getvalue()
+
+
+def init_review(app):
+
+    @app.route('/admin/review')
+    def review_queue():
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+
+        request_id = first_pending_id()
+        if request_id is None:
+            flash('Aucune demande en attente', 'success')
+            return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('review_request', request_id=request_id))
+
+    @app.route('/admin/review/<int:request_id>')
+    def review_request(request_id):
+        if not session.get('admin_logged_in'):
+            flash('Veuillez vous connecter', 'error')
+            return redirect(url_for('admin_login'))
+
+        student = StudentRequest.query.get_or_404(request_id)
+        return render_template('review.html', current=review_payload(student))
+
+    @app.route('/admin/api/review/<int:request_id>')
+    def api_review_request(request_id):
+        """Demande suivante à précharger"""
+        if not session.get('admin_logged_in'):
+            return jsonify({'error': 'Non autorisé'}), 401
+
+        student = db.session.get(StudentRequest, request_id)
+        if student is None:
+            return jsonify({'error': 'Demande introuvable'}), 404
+        return jsonify(review_payload(student))
+
+    @app.route('/admin/review/<int:request_id>/decision', methods=['POST'])
+    def review_decision(request_id):
+        if not session.get('admin_logged_in'):
+            return jsonify({'error': 'Non autorisé'}), 401
+
+        data = request.get_json(silent=True) or {}
+        status = data.get('status')
+        if status not in ('approved', 'rejected'):
+            return jsonify({'error': 'Statut invalide'}), 400
+
+        try:
+            student = db.session.get(StudentRequest, request_id)
+            if student is None:
+                return jsonify({'error': 'Demande introuvable'}), 404
+
+            next_id = _neighbour_id(student, 1)
+            claimed = claim_decision(student, status, data.get('notes', ''))
+            if not claimed:
+                # Un autre admin a déjà traité cette demande
+                student = db.session.get(StudentRequest, request_id)
+                return jsonify({
+                    'error': 'Demande déjà traitée',
+                    'status': student.status if student else None,
+                    'next_id': next_id or first_pending_id()
+                }), 409
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+
+        return jsonify({'success': True, 'next_id': next_id or first_pending_id()})
+
+    @app.route('/admin/review/thumbnails/<path:filename>')
+    def review_thumbnail(filename):
+        if not session.get('admin_logged_in'):
+            abort(401)
+
+        document = Document.query.filter_by(filename=filename).first()
+        version = document.sha256 if document is not None else None
+        if version and request.if_none_match.contains(version):
+            return '', 304
+
+        try:
+            if version:
+                thumbnail = _render_thumbnail(filename, version)
+            else:
+                # Sans empreinte dans l'inventaire, rien ne signale un fichier remplacé : pas de cache
+                thumbnail = _render_thumbnail.__wrapped__(filename, version)
+        except FileNotFoundError:
+            abort(404)
+        except Exception as e:
+            print(f"✗ Miniature impossible pour {filename}: {str(e)}")
+            abort(404)
+
+        response = send_file(io.BytesIO(thumbnail), mimetype='image/jpeg')
+        response.headers['Cache-Control'] = 'private, max-age=3600'
+        if version:
+            response.set_etag(version)
+        return response
@@ -0,0 +1,239 @@
+"""Agrégats journaliers des demandes (jour de soumission × région × statut).
+
+La table daily_rollup est tenue à jour à chaque écriture sur student_request
+(création, changement de statut ou de région, suppression), dans la même
+transaction. Elle compte les demandes actives, comme les compteurs du tableau
+de bord : l'archivage (archive.py) retire ses demandes des agrégats et la
+restauration les y remet. Les graphiques et les statistiques par région du
+tableau de bord lisent uniquement cette table.
+
+La table est construite une fois par migrate.py (au démarrage de gunicorn)
+si elle est vide alors que des demandes existent, ou reconstruite à la main
+avec flask backfill-rollups ; jamais depuis une requête (les vues read_only
+peuvent lire sur le réplica).
+"""
+from datetime import date, datetime, timedelta
+
+from flask import request, jsonify, session
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db, StudentRequest, DailyRollup
+from replica import read_only
+
+ROLLUP_MAX_DAYS = 730
+
+# Colonnes de student_request qui déterminent l'agrégat d'une demande
+ROLLUP_ATTRIBUTES = ('date_submitted', 'region_universitaire', 'status')
+
+
+def _upsert_statement(dialect_name, rows):
+    """INSERT ... ON CONFLICT qui ajoute les écarts aux compteurs existants."""
+    module = postgresql if dialect_name == 'postgresql' else sqlite
+    stmt = module.insert(DailyRollup.__table__).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=['day', 'region', 'status'],
+        set_={'count': DailyRollup.__table__.c.count + stmt.excluded.count}
+    )
+
+
+def apply_rollup_deltas(session, deltas):
+    """Appliquer des écarts {(jour, région, statut): n} à daily_rollup."""
+    deltas = {key: n for key, n in deltas.items() if n}
+    if not deltas:
+        return
+
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name in ('postgresql', 'sqlite'):
+        rows = [{'day': day, 'region': region, 'status': status, 'count': n}
+                for (day, region, status), n in deltas.items()]
+        session.execute(_upsert_statement(dialect_name, rows))
+        return
+
+    # Autres bases : mise à jour puis insertion si la ligne n'existe pas
+    table = DailyRollup.__table__
+    for (day, region, status), n in deltas.items():
+        result = session.execute(
+            table.update()
+            .where(table.c.day == day, table.c.region == region, table.c.status == status)
+            .values(count=table.c.count + n)
+        )
+        if result.rowcount == 0:
+            session.execute(table.insert().values(day=day, region=region, status=status, count=n))
+
+
+def rollup_key(submitted, region, status):
+    submitted = submitted or datetime.utcnow()
+    return (submitted.date(), region or 'Dakar', status or 'pending')
+
+
+def _history_values(state, attr):
+    """(ancienne valeur, nouvelle valeur) d'un attribut pendant le flush."""
+    history = state.attrs[attr].history
+    current = history.added[0] if history.added else (history.unchanged[0] if history.unchanged else None)
+    if history.deleted:
+        return history.deleted[0], current
+    return current, current
+
+
+def _load_deleted(session, flush_context, instances):
+    # Après le DELETE, les colonnes expirées ne pourraient plus être chargées
+    for obj in session.deleted:
+        if isinstance(obj, StudentRequest):
+            for attr in ROLLUP_ATTRIBUTES:
+                getattr(obj, attr)
+
+
+def _track_rollups(session, flush_context):
+    deltas = {}
+
+    def bump(key, n):
+        deltas[key] = deltas.get(key, 0) + n
+
+    for obj in session.new:
+        if isinstance(obj, StudentRequest):
+            bump(rollup_key(obj.date_submitted, obj.region_universitaire, obj.status), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, StudentRequest):
+            state = inspect(obj)
+            old = [_history_values(state, attr)[0] for attr in ROLLUP_ATTRIBUTES]
+            bump(rollup_key(*old), -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, StudentRequest) and obj not in session.deleted:
+            state = inspect(obj)
+            values = [_history_values(state, attr) for attr in ROLLUP_ATTRIBUTES]
+            old_key = rollup_key(*[old for old, _ in values])
+            new_key = rollup_key(*[new for _, new in values])
+            if old_key != new_key:
+                bump(old_key, -1)
+                bump(new_key, 1)
+
+    apply_rollup_deltas(session, deltas)
+
+
+def backfill_rollups():
+    """Recalculer daily_rollup depuis les demandes actives."""
+    totals = {}
+    day = db.func.date(StudentRequest.date_submitted)
+    rows = (db.session.query(day, StudentRequest.region_universitaire, StudentRequest.status,
+                             db.func.count(StudentRequest.id))
+            .group_by(day, StudentRequest.region_universitaire, StudentRequest.status).all())
+    for day_value, region, status, count in rows:
+        if day_value is None:
+            continue
+        if isinstance(day_value, str):  # SQLite renvoie 'AAAA-MM-JJ'
+            day_value = date.fromisoformat(day_value)
+        key = (day_value, region or 'Dakar', status or 'pending')
+        totals[key] = totals.get(key, 0) + count
+
+    DailyRollup.query.delete(synchronize_session=False)
+    if totals:
+        db.session.execute(DailyRollup.__table__.insert(), [
+            {'day': day_value, 'region': region, 'status': status, 'count': count}
+            for (day_value, region, status), count in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+
+def ensure_rollups():
+    """Construire daily_rollup si elle est vide alors que des demandes existent (migrate.py)."""
+    if db.session.query(DailyRollup.id).first() is not None:
+        return False
+    if db.session.query(StudentRequest.id).first() is None:
+        return False
+    try:
+        count = backfill_rollups()
+        print(f"✓ Agrégats journaliers construits ({count})")
+        return True
+    except Exception as e:
+        # Une autre instance a pu construire la table en même temps
+        db.session.rollback()
+        print(f"✗ Construction des agrégats impossible: {str(e)}")
+        return False
+
+
+def region_totals():
+    """Nombre total de demandes par région, sans parcourir student_request."""
+    rows = (db.session.query(DailyRollup.region, db.func.sum(DailyRollup.count))
+            .group_by(DailyRollup.region).all())
+    return {region: int(count) for region, count in rows if count}
+
+
+def rollup_series(start, end, group_by='status', region=None, status=None):
+    """Séries journalières complétées par des zéros, groupées par statut ou région."""
+    column = DailyRollup.region if group_by == 'region' else DailyRollup.status
+    query = (db.session.query(DailyRollup.day, column, db.func.sum(DailyRollup.count))
+             .filter(DailyRollup.day >= start, DailyRollup.day <= end))
+    if region:
+        query = query.filter(DailyRollup.region == region)
+    if status:
+        query = query.filter(DailyRollup.status == status)
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    index = {d: i for i, d in enumerate(days)}
+    series = {}
+    for day_value, name, count in query.group_by(DailyRollup.day, column).all():
+        if isinstance(day_value, str):
+            day_value = date.fromisoformat(day_value)
+        series.setdefault(name, [0] * len(days))[index[day_value]] += int(count)
+
+    return {
+        'dates': [d.isoformat() for d in days],
+        'series': series,
+        'totals': {name: sum(values) for name, values in series.items()}
+    }
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def init_rollups(app):
+    if not event.contains(db.session, 'after_flush', _track_rollups):
+        event.listen(db.session, 'before_flush', _load_deleted)
+        event.listen(db.session, 'after_flush', _track_rollups)
+
+        # Charger l'ancienne valeur avant modification, même si l'objet a
+        # été expiré par un commit : sinon l'historique ne la connaît pas
+        for attr in ROLLUP_ATTRIBUTES:
+            event.listen(getattr(StudentRequest, attr), 'set', _load_previous_value,
+                         active_history=True, retval=True)
+
+    @app.route('/admin/api/rollups')
+    @read_only
+    def api_rollups():
+        """Séries journalières pour les graphiques du tableau de bord"""
+        if not session.get('admin_logged_in'):
+            return jsonify({'error': 'Non autorisé'}), 401
+
+        try:
+            end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+            if request.args.get('start'):
+                start = date.fromisoformat(request.args['start'])
+            else:
+                start = end - timedelta(days=request.args.get('days', 30, type=int) - 1)
+        except ValueError:
+            return jsonify({'error': 'Dates invalides (format AAAA-MM-JJ)'}), 400
+
+        if start > end or (end - start).days >= ROLLUP_MAX_DAYS:
+            return jsonify({'error': f'Période invalide (au plus {ROLLUP_MAX_DAYS} jours)'}), 400
+
+        group_by = request.args.get('group_by', 'status')
+        if group_by not in ('status', 'region'):
+            return jsonify({'error': 'group_by doit valoir status ou region'}), 400
+
+        try:
+            return jsonify(rollup_series(start, end, group_by,
+                                         region=request.args.get('region') or None,
+                                         status=request.args.get('status') or None))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.cli.command('backfill-rollups')
+    def backfill_rollups_command():
+        """Reconstruire les agrégats journaliers depuis les demandes."""
+        count = backfill_rollups()
+        print(f"✓ {count} agrégat(s) journalier(s) recalculé(s)")
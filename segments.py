@@ -0,0 +1,236 @@
+"""Segments de destinataires des emails groupés, résolus côté serveur.
+
+Le composeur d'emails envoie ses critères à POST /admin/api/segments :
+statuts, régions, période de soumission, demandes choisies (ids) ou liste
+d'adresses personnalisée. La réponse donne le nombre de destinataires, les
+adresses écartées (format invalide, doublon, liste de suppression) et un
+court aperçu ; seules les colonnes id et email sont lues, sur les index
+(status, date_submitted) et (region_universitaire, status, date_submitted),
+créés sur une base existante par migrate.py (au démarrage de gunicorn).
+
+Avec "preview": true (comptage pendant la saisie des critères), rien n'est
+enregistré. Sans, les destinataires résolus sont enregistrés sous un jeton
+valable SEGMENT_TOKEN_TTL : le composeur le demande au moment d'envoyer,
+/admin/send_email le reçoit dans segment_token et envoie à ce même ensemble
+sans refaire la sélection.
+"""
+import json
+import secrets
+from datetime import datetime, date, time, timedelta
+
+from flask import request, jsonify, session, current_app
+
+from database import db, StudentRequest, EmailSegment
+from email_events import filter_suppressed
+
+STATUSES = ['pending', 'approved', 'rejected']
+
+
+def _as_list(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, (str, int)):
+        return [value]
+    return list(value)
+
+
+def _clean_emails(value):
+    if isinstance(value, str):
+        value = value.replace(',', '\n').splitlines()
+    return [str(e).strip() for e in _as_list(value) if e and str(e).strip()]
+
+
+def _parse_day(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f'Date invalide ({name}), format attendu AAAA-MM-JJ')
+
+
+def parse_criteria(data):
+    """Normaliser les critères d'un segment ; ValueError si invalides."""
+    if data.get('emails'):
+        # Liste personnalisée : les autres critères ne s'appliquent pas
+        return {'emails': _clean_emails(data['emails'])}
+
+    statuses = [str(s) for s in _as_list(data.get('status'))]
+    unknown = [s for s in statuses if s not in STATUSES]
+    if unknown:
+        raise ValueError(f"Statut inconnu: {', '.join(unknown)}")
+
+    date_from = _parse_day(data.get('date_from'), 'date_from')
+    date_to = _parse_day(data.get('date_to'), 'date_to')
+    if date_from and date_to and date_from > date_to:
+        raise ValueError('La date de début est postérieure à la date de fin')
+
+    criteria = {
+        'status': sorted(set(statuses)),
+        'region': sorted({str(r) for r in _as_list(data.get('region')) if r}),
+        'date_from': date_from.isoformat() if date_from else None,
+        'date_to': date_to.isoformat() if date_to else None,
+    }
+    if data.get('ids') is not None:
+        # Demandes choisies une à une (une liste vide ne désigne personne)
+        try:
+            criteria['ids'] = sorted({int(i) for i in _as_list(data['ids'])})
+        except (TypeError, ValueError):
+            raise ValueError('Identifiants de demandes invalides')
+    return criteria
+
+
+def criteria_from_recipient_type(recipient_type, selected_ids=None, custom_emails=None):
+    """Critères équivalents aux types de destinataires de /admin/send_email."""
+    if recipient_type in STATUSES:
+        return parse_criteria({'status': recipient_type})
+    if recipient_type == 'selected':
+        return parse_criteria({'ids': selected_ids or []})
+    if recipient_type == 'custom':
+        return {'emails': _clean_emails(custom_emails)}
+    return parse_criteria({})
+
+
+def segment_query(criteria):
+    """Demandes correspondant aux critères (hors liste personnalisée)."""
+    query = StudentRequest.query
+    if criteria['status']:
+        query = query.filter(StudentRequest.status.in_(criteria['status']))
+    if criteria['region']:
+        query = query.filter(StudentRequest.region_universitaire.in_(criteria['region']))
+    if criteria['date_from']:
+        start = datetime.combine(date.fromisoformat(criteria['date_from']), time.min)
+        query = query.filter(StudentRequest.date_submitted >= start)
+    if criteria['date_to']:
+        end = datetime.combine(date.fromisoformat(criteria['date_to']) + timedelta(days=1), time.min)
+        query = query.filter(StudentRequest.date_submitted < end)
+    if 'ids' in criteria:
+        query = query.filter(StudentRequest.id.in_(criteria['ids']))
+    return query
+
+
+def resolve_segment(criteria):
+    """Destinataires [(id de la demande ou None, email)] et nombre d'adresses écartées."""
+    if 'emails' in criteria:
+        candidates = [(None, email) for email in criteria['emails']]
+    else:
+        candidates = (segment_query(criteria)
+                      .with_entities(StudentRequest.id, StudentRequest.email)
+                      .order_by(StudentRequest.id).all())
+
+    valid = []
+    seen = set()
+    for request_id, email in candidates:
+        email = (email or '').strip()
+        key = email.lower()
+        if not email or '@' not in email or '.' not in email or key in seen:
+            continue
+        seen.add(key)
+        valid.append((request_id, email))
+
+    # Ne pas écrire aux adresses en rebond ou désinscrites
+    deliverable = set(filter_suppressed([email for _, email in valid]))
+    recipients = [(request_id, email) for request_id, email in valid if email in deliverable]
+    return recipients, len(candidates) - len(recipients)
+
+
+def segment_sample(recipients, size):
+    """Aperçu des premiers destinataires (nom et statut pour les demandes)."""
+    sample = recipients[:size]
+    ids = [request_id for request_id, _ in sample if request_id is not None]
+    students = {}
+    if ids:
+        students = {
+            row.id: row for row in
+            StudentRequest.query.with_entities(StudentRequest.id, StudentRequest.nom, StudentRequest.prenom,
+                                               StudentRequest.status, StudentRequest.region_universitaire)
+            .filter(StudentRequest.id.in_(ids)).all()
+        }
+
+    preview = []
+    for request_id, email in sample:
+        student = students.get(request_id)
+        preview.append({
+            'id': request_id,
+            'email': email,
+            'nom': student.nom if student else None,
+            'prenom': student.prenom if student else None,
+            'status': student.status if student else None,
+            'region': student.region_universitaire if student else None,
+        })
+    return preview
+
+
+def purge_expired_segments():
+    limit = datetime.utcnow() - current_app.config['SEGMENT_TOKEN_TTL']
+    EmailSegment.query.filter(EmailSegment.created_at < limit).delete(synchronize_session=False)
+
+
+def create_segment(criteria):
+    """Résoudre les critères et enregistrer les destinataires sous un jeton."""
+    purge_expired_segments()
+    recipients, skipped = resolve_segment(criteria)
+    segment = EmailSegment(
+        token=secrets.token_hex(16),
+        criteria=json.dumps(criteria),
+        recipients=json.dumps(recipients),
+        count=len(recipients),
+        skipped=skipped
+    )
+    db.session.add(segment)
+    db.session.commit()
+    return segment, recipients
+
+
+def load_segment(token):
+    """Segment encore valide désigné par le jeton, ou None."""
+    segment = db.session.get(EmailSegment, token) if token else None
+    if segment is None:
+        return None
+    if segment.created_at < datetime.utcnow() - current_app.config['SEGMENT_TOKEN_TTL']:
+        return None
+    return segment
+
+
+def segment_recipients(segment):
+    return [(request_id, email) for request_id, email in json.loads(segment.recipients)]
+
+
+def init_segments(app):
+
+    @app.route('/admin/api/segments', methods=['POST'])
+    def create_email_segment():
+        """Compter et prévisualiser des destinataires, ou réserver un jeton d'envoi"""
+        if not session.get('admin_logged_in'):
+            return jsonify({'error': 'Non autorisé'}), 401
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Critères JSON requis (objet)'}), 400
+        try:
+            criteria = parse_criteria(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            if data.get('preview'):
+                # Simple comptage : pas de jeton, rien d'enregistré
+                recipients, skipped = resolve_segment(criteria)
+                return jsonify({
+                    'count': len(recipients),
+                    'skipped_count': skipped,
+                    'sample': segment_sample(recipients, app.config['SEGMENT_PREVIEW_SIZE'])
+                })
+
+            segment, recipients = create_segment(criteria)
+            return jsonify({
+                'token': segment.token,
+                'count': segment.count,
+                'skipped_count': segment.skipped,
+                'sample': segment_sample(recipients, app.config['SEGMENT_PREVIEW_SIZE']),
+                'expires_in': int(app.config['SEGMENT_TOKEN_TTL'].total_seconds())
+            })
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Erreur résolution du segment: {str(e)}")
+            return jsonify({'error': 'Erreur base de données'}), 500
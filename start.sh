@@ -13,4 +13,4 @@ with app.app_context():
 "
 
 # Démarrer l'application
-exec gunicorn --bind 0.0.0.0:$PORT --timeout 120 --workers 2 app:app
\ No newline at end of file
+exec gunicorn --config gunicorn.conf.py --bind 0.0.0.0:$PORT app:app
\ No newline at end of file
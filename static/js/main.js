@@ -69,6 +69,96 @@ if (navbarToggler) {
         });
     });
     
+    // Réduction des photos avant l'envoi (JPG/PNG)
+    function loadImage(file) {
+        if (window.createImageBitmap) {
+            return createImageBitmap(file, { imageOrientation: 'from-image' });
+        }
+        return new Promise((resolve, reject) => {
+            const url = URL.createObjectURL(file);
+            const img = new Image();
+            img.onload = () => { URL.revokeObjectURL(url); resolve(img); };
+            img.onerror = reject;
+            img.src = url;
+        });
+    }
+
+    async function compressImage(file, maxDimension, quality) {
+        const image = await loadImage(file);
+        const scale = Math.min(1, maxDimension / Math.max(image.width, image.height));
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(image.width * scale);
+        canvas.height = Math.round(image.height * scale);
+
+        const context = canvas.getContext('2d');
+        // Fond blanc : le JPEG ne gère pas la transparence des PNG
+        context.fillStyle = '#ffffff';
+        context.fillRect(0, 0, canvas.width, canvas.height);
+        context.drawImage(image, 0, 0, canvas.width, canvas.height);
+
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', quality));
+        if (!blob || blob.size >= file.size) {
+            return null;
+        }
+        const name = file.name.replace(/\.(png|jpe?g)$/i, '') + '.jpg';
+        return new File([blob], name, { type: 'image/jpeg', lastModified: file.lastModified });
+    }
+
+    function formatSize(bytes) {
+        return bytes >= 1024 * 1024
+            ? (bytes / (1024 * 1024)).toFixed(1) + ' Mo'
+            : Math.round(bytes / 1024) + ' Ko';
+    }
+
+    const compressInputs = document.querySelectorAll('input[type="file"][data-compress="image"]');
+    compressInputs.forEach(input => {
+        input.addEventListener('change', function() {
+            // Événement redéclenché après compression : rien à refaire
+            if (this.dataset.compressed === '1') {
+                delete this.dataset.compressed;
+                return;
+            }
+
+            const file = this.files && this.files[0];
+            if (!file || !['image/jpeg', 'image/png'].includes(file.type) || !window.DataTransfer) {
+                return;
+            }
+
+            const form = this.form;
+            const maxDimension = parseInt(form && form.dataset.imageMaxDimension, 10) || 2000;
+            const quality = parseFloat(form && form.dataset.imageQuality) || 0.8;
+            let info = this.parentElement.querySelector('.compress-info');
+            if (!info) {
+                info = document.createElement('small');
+                info.className = 'compress-info d-block mt-1 text-muted';
+                this.parentElement.appendChild(info);
+            }
+
+            this.dataset.compressing = '1';
+            info.textContent = 'Réduction de la photo...';
+
+            compressImage(file, maxDimension, quality).then(compressed => {
+                if (compressed) {
+                    const transfer = new DataTransfer();
+                    transfer.items.add(compressed);
+                    this.files = transfer.files;
+                    const saved = Math.round((1 - compressed.size / file.size) * 100);
+                    info.textContent = `Photo réduite : ${formatSize(file.size)} → ${formatSize(compressed.size)} (-${saved}%)`;
+                } else {
+                    info.textContent = '';
+                }
+            }).catch(error => {
+                console.log('Erreur compression image:', error);
+                info.textContent = '';
+            }).finally(() => {
+                delete this.dataset.compressing;
+                this.dataset.compressed = '1';
+                // Prévenir les autres gestionnaires (aperçu, envoi fragmenté)
+                this.dispatchEvent(new Event('change'));
+            });
+        });
+    });
+    
     // Validation des formulaires
     const forms = document.querySelectorAll('form');
     forms.forEach(form => {
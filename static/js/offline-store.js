@@ -0,0 +1,142 @@
+// static/js/offline-store.js - Brouillon et file d'envoi du formulaire dans IndexedDB
+// Chargé par la page (offline.js) et par le service worker (importScripts).
+(function(scope) {
+    const DB_NAME = 'reed-offline';
+    const DRAFT_KEY = 'formulaire';
+    const SYNC_TAG = 'reed-formulaire';
+
+    function openDatabase() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, 1);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                db.createObjectStore('drafts');
+                db.createObjectStore('outbox', { autoIncrement: true });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async function transaction(storeName, mode, action) {
+        const db = await openDatabase();
+        try {
+            return await new Promise((resolve, reject) => {
+                const tx = db.transaction(storeName, mode);
+                const request = action(tx.objectStore(storeName));
+                tx.oncomplete = () => resolve(request ? request.result : undefined);
+                tx.onerror = () => reject(tx.error);
+                tx.onabort = () => reject(tx.error);
+            });
+        } finally {
+            db.close();
+        }
+    }
+
+    function loadDraft() {
+        return transaction('drafts', 'readonly', store => store.get(DRAFT_KEY));
+    }
+
+    function saveDraft(draft) {
+        return transaction('drafts', 'readwrite', store => store.put(draft, DRAFT_KEY));
+    }
+
+    function clearDraft() {
+        return transaction('drafts', 'readwrite', store => store.delete(DRAFT_KEY));
+    }
+
+    function queueSubmission(entry) {
+        return transaction('outbox', 'readwrite', store => store.add(entry));
+    }
+
+    async function pendingSubmissions() {
+        const keys = await transaction('outbox', 'readonly', store => store.getAllKeys());
+        const values = await transaction('outbox', 'readonly', store => store.getAll());
+        return keys.map((key, index) => ({ key: key, entry: values[index] }));
+    }
+
+    function removeSubmission(key) {
+        return transaction('outbox', 'readwrite', store => store.delete(key));
+    }
+
+    function uploadId(entry, field) {
+        const found = entry.fields.find(([name]) => name === `${field}_upload_id`);
+        return found ? found[1] : '';
+    }
+
+    // Soumettre le formulaire ; outcome : 'accepted', 'rejected' (refusée) ou 'retry'
+    async function sendForm(formUrl, data) {
+        let response;
+        try {
+            response = await fetch(formUrl, {
+                method: 'POST',
+                body: data,
+                credentials: 'same-origin',
+                headers: { 'X-Offline-Submit': '1' }
+            });
+        } catch (error) {
+            return { outcome: 'retry' };
+        }
+        if (response.status === 429 || response.status >= 500) {
+            return { outcome: 'retry' };
+        }
+        // Le serveur indique la page d'arrivée au lieu de rediriger (voir offline.py)
+        const reply = await response.json().catch(() => ({}));
+        const redirect = reply.redirect || formUrl;
+        const accepted = new URL(redirect, self.location.href).pathname !== new URL(formUrl, self.location.href).pathname;
+        return { outcome: accepted ? 'accepted' : 'rejected', redirect: redirect };
+    }
+
+    function entryData(entry, withUploads) {
+        const data = new FormData();
+        entry.fields.forEach(([name, value]) => {
+            if (!withUploads && (name.endsWith('_upload_id') || name.endsWith('_upload_token'))) {
+                return;
+            }
+            data.append(name, value);
+        });
+        Object.entries(entry.files).forEach(([field, file]) => {
+            // Document déjà envoyé par fragments : seul son identifiant part
+            if (withUploads && uploadId(entry, field)) {
+                return;
+            }
+            data.append(field, file, file.name);
+        });
+        return data;
+    }
+
+    // Envoyer les soumissions en file ; lève une erreur si le réseau manque encore
+    async function flushOutbox(formUrl) {
+        const result = { accepted: 0, rejected: 0, redirect: null };
+        for (const { key, entry } of await pendingSubmissions()) {
+            let reply = await sendForm(formUrl, entryData(entry, true));
+            if (reply.outcome === 'rejected' && Object.keys(entry.files).some(field => uploadId(entry, field))) {
+                // Envoi fragmenté expiré entre-temps : renvoyer les fichiers
+                reply = await sendForm(formUrl, entryData(entry, false));
+            }
+            if (reply.outcome === 'retry') {
+                throw new Error('Réseau indisponible, nouvel essai plus tard');
+            }
+            await removeSubmission(key);
+            result.redirect = reply.redirect;
+            if (reply.outcome === 'accepted') {
+                result.accepted += 1;
+                await clearDraft();
+            } else {
+                result.rejected += 1;
+            }
+        }
+        return result;
+    }
+
+    scope.ReedOffline = {
+        SYNC_TAG: SYNC_TAG,
+        loadDraft: loadDraft,
+        saveDraft: saveDraft,
+        clearDraft: clearDraft,
+        queueSubmission: queueSubmission,
+        pendingSubmissions: pendingSubmissions,
+        sendForm: sendForm,
+        flushOutbox: flushOutbox
+    };
+})(self);
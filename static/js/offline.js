@@ -0,0 +1,215 @@
+// static/js/offline.js - Formulaire utilisable sur un réseau instable
+// Les champs et les documents choisis sont gardés dans IndexedDB (offline-store.js).
+// Une soumission impossible est mise en file puis renvoyée par le service worker
+// (synchronisation en arrière-plan) ou par la page au retour du réseau.
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('demandeForm');
+    if (!form || form.dataset.offline !== '1' || !window.indexedDB || !window.ReedOffline) {
+        return;
+    }
+
+    const formUrl = form.getAttribute('action');
+    const submitBtn = document.getElementById('submit-btn');
+    let saveTimer = null;
+
+    // Identifiant de cet envoi : une soumission rejouée après une réponse perdue
+    // porte le même, et le serveur ne l'enregistre pas deux fois
+    const submissionId = document.createElement('input');
+    submissionId.type = 'hidden';
+    submissionId.name = 'submission_id';
+    submissionId.value = newSubmissionId();
+    form.appendChild(submissionId);
+
+    function newSubmissionId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        const bytes = new Uint8Array(16);
+        crypto.getRandomValues(bytes);
+        return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    function notice(message, category) {
+        let box = document.getElementById('offline-notice');
+        if (!box) {
+            box = document.createElement('div');
+            box.id = 'offline-notice';
+            box.setAttribute('role', 'status');
+            form.parentElement.insertBefore(box, form);
+        }
+        box.className = `alert alert-${category} py-2`;
+        box.textContent = message;
+    }
+
+    function textFields() {
+        return Array.from(form.elements).filter(el => el.name && el.type !== 'file' && el.type !== 'submit');
+    }
+
+    function fileInputs() {
+        return Array.from(form.querySelectorAll('input[type="file"]'));
+    }
+
+    // Brouillon : champs saisis et documents choisis
+    function saveDraft() {
+        clearTimeout(saveTimer);
+        saveTimer = setTimeout(() => {
+            const draft = { fields: {}, files: {} };
+            textFields().forEach(el => {
+                if (!el.name.endsWith('_upload_id') && !el.name.endsWith('_upload_token') && el !== submissionId) {
+                    draft.fields[el.name] = el.value;
+                }
+            });
+            fileInputs().forEach(input => {
+                if (input.files && input.files[0]) {
+                    draft.files[input.name] = input.files[0];
+                }
+            });
+            ReedOffline.saveDraft(draft).catch(error => console.log('Brouillon non enregistré:', error));
+        }, 300);
+    }
+
+    async function restoreDraft() {
+        const draft = await ReedOffline.loadDraft();
+        if (!draft) {
+            return;
+        }
+        Object.entries(draft.fields).forEach(([name, value]) => {
+            const el = form.elements[name];
+            if (el && !el.value) {
+                el.value = value;
+            }
+        });
+        if (!window.DataTransfer) {
+            return;
+        }
+        Object.entries(draft.files).forEach(([name, file]) => {
+            const input = form.elements[name];
+            if (!input || (input.files && input.files.length)) {
+                return;
+            }
+            const transfer = new DataTransfer();
+            transfer.items.add(file);
+            input.files = transfer.files;
+            // Fichier déjà réduit avant son enregistrement (voir main.js)
+            input.dataset.compressed = '1';
+            // Même nom, taille et date : upload.js reprend l'envoi fragmenté là où il s'était arrêté
+            input.dispatchEvent(new Event('change', { bubbles: true }));
+        });
+        notice('Votre saisie précédente a été restaurée.', 'info');
+    }
+
+    function snapshot() {
+        const entry = { fields: [], files: {}, createdAt: Date.now() };
+        textFields().forEach(el => {
+            if (!el.disabled) {
+                entry.fields.push([el.name, el.value]);
+            }
+        });
+        fileInputs().forEach(input => {
+            if (input.files && input.files[0]) {
+                entry.files[input.name] = input.files[0];
+            }
+        });
+        return entry;
+    }
+
+    async function requestSync() {
+        const registration = navigator.serviceWorker && await navigator.serviceWorker.getRegistration();
+        if (registration && registration.sync) {
+            await registration.sync.register(ReedOffline.SYNC_TAG);
+        } else if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage({ type: 'reed-flush' });
+        }
+    }
+
+    async function flushFromPage() {
+        // Sans service worker actif, la page envoie elle-même la file
+        if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage({ type: 'reed-flush' });
+            return;
+        }
+        try {
+            showOutboxResult(await ReedOffline.flushOutbox(formUrl));
+        } catch (error) {
+            console.log('Envoi différé:', error.message);
+        }
+    }
+
+    function showReply(redirect, accepted) {
+        // Avec une requête, le service worker ne sert pas la page en cache :
+        // le message d'erreur du serveur s'affiche
+        window.location.href = accepted ? redirect : `${formUrl}?retour=1`;
+    }
+
+    function showOutboxResult(result) {
+        if (result.accepted || result.rejected) {
+            showReply(result.redirect, result.accepted > 0);
+        }
+    }
+
+    async function queueSubmission() {
+        await ReedOffline.queueSubmission(snapshot());
+        await requestSync().catch(error => console.log('Synchronisation indisponible:', error));
+        submitBtn.disabled = false;
+        submitBtn.innerHTML = '<i class="fas fa-paper-plane me-1"></i>Soumettre la demande';
+        ['progress-container', 'progress-text'].forEach(id => {
+            const el = document.getElementById(id);
+            if (el) {
+                el.classList.add('d-none');
+            }
+        });
+        notice('Connexion indisponible : votre demande est enregistrée et sera envoyée automatiquement dès le retour du réseau.', 'warning');
+    }
+
+    // Soumission par fetch : une coupure met la demande en file au lieu de la perdre.
+    // Écouteur sur document : il passe après la validation et l'attente des envois fragmentés.
+    document.addEventListener('submit', async function(e) {
+        if (e.target !== form || e.defaultPrevented) {
+            return;
+        }
+        e.preventDefault();
+
+        if (!navigator.onLine) {
+            await queueSubmission();
+            return;
+        }
+        const reply = await ReedOffline.sendForm(formUrl, new FormData(form));
+        if (reply.outcome === 'retry') {
+            await queueSubmission();
+            return;
+        }
+        if (reply.outcome === 'accepted') {
+            await ReedOffline.clearDraft();
+        }
+        // Page d'arrivée, avec les messages flash du serveur
+        showReply(reply.redirect, reply.outcome === 'accepted');
+    });
+
+    form.addEventListener('input', saveDraft);
+    form.addEventListener('change', saveDraft);
+    form.addEventListener('reset', () => {
+        ReedOffline.clearDraft();
+    });
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register(form.dataset.serviceWorker).catch(error => {
+            console.log('Service worker non installé:', error);
+        });
+        navigator.serviceWorker.addEventListener('message', event => {
+            if (event.data && event.data.type === 'reed-outbox') {
+                showOutboxResult(event.data);
+            }
+        });
+    }
+
+    window.addEventListener('online', flushFromPage);
+    ReedOffline.pendingSubmissions().then(pending => {
+        if (pending.length) {
+            notice('Une demande est en attente d\'envoi.', 'warning');
+            if (navigator.onLine) {
+                flushFromPage();
+            }
+        }
+    });
+    restoreDraft().catch(error => console.log('Brouillon illisible:', error));
+});
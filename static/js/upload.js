@@ -0,0 +1,224 @@
+// static/js/upload.js - Envoi fragmenté et reprenable des documents
+// Chaque document est envoyé dès sa sélection, par fragments, vers /upload-sessions.
+// En cas de coupure, l'envoi reprend à l'octet confirmé par le serveur.
+// Le jeton remis à la création (Upload-Token) prouve que l'envoi est le nôtre.
+// Si l'envoi fragmenté échoue, le fichier part avec le formulaire comme avant.
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('demandeForm');
+    if (!form || !window.fetch || !window.Blob || !Blob.prototype.slice) {
+        return;
+    }
+
+    const MAX_RETRIES = 8;
+    const uploads = {};
+
+    function storageKey(field, file) {
+        return `reed-upload:${field}:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function statusElement(input) {
+        let status = input.parentElement.querySelector('.upload-status');
+        if (!status) {
+            status = document.createElement('small');
+            status.className = 'upload-status d-block mt-1';
+            input.parentElement.appendChild(status);
+        }
+        return status;
+    }
+
+    function hiddenInput(name) {
+        let hidden = form.querySelector(`input[name="${name}"]`);
+        if (!hidden) {
+            hidden = document.createElement('input');
+            hidden.type = 'hidden';
+            hidden.name = name;
+            form.appendChild(hidden);
+        }
+        return hidden;
+    }
+
+    // Envoi en cours gardé pour une reprise après rechargement : { id, token }
+    function savedUpload(key) {
+        try {
+            const saved = JSON.parse(localStorage.getItem(key));
+            return saved && saved.id && saved.token ? saved : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async function createSession(field, file) {
+        const response = await fetch('/upload-sessions', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ field: field, filename: file.name, size: file.size })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Erreur de création de l\'envoi');
+        }
+        return data;
+    }
+
+    async function currentOffset(upload) {
+        const response = await fetch(`/upload-sessions/${upload.id}`, {
+            method: 'HEAD',
+            cache: 'no-store',
+            headers: { 'Upload-Token': upload.token }
+        });
+        if (response.status === 404) {
+            return null;
+        }
+        if (!response.ok) {
+            throw new Error('Statut d\'envoi indisponible');
+        }
+        return parseInt(response.headers.get('Upload-Offset'), 10);
+    }
+
+    async function uploadFile(input, file, state) {
+        const field = input.name;
+        const status = statusElement(input);
+        const key = storageKey(field, file);
+        let chunkSize = 1024 * 1024;
+        let upload = savedUpload(key);
+        let offset = null;
+
+        if (upload) {
+            offset = await currentOffset(upload);
+        }
+        if (offset === null) {
+            const created = await createSession(field, file);
+            upload = { id: created.id, token: created.token };
+            chunkSize = created.chunk_size || chunkSize;
+            offset = 0;
+            localStorage.setItem(key, JSON.stringify(upload));
+        }
+        state.id = upload.id;
+
+        let retries = 0;
+        while (offset < file.size) {
+            if (state.cancelled) {
+                return;
+            }
+            const chunk = file.slice(offset, offset + chunkSize);
+            try {
+                const response = await fetch(`/upload-sessions/${upload.id}`, {
+                    method: 'PATCH',
+                    headers: {
+                        'Content-Type': 'application/offset+octet-stream',
+                        'Upload-Offset': String(offset),
+                        'Upload-Token': upload.token,
+                        'Tus-Resumable': '1.0.0'
+                    },
+                    body: chunk
+                });
+                if (response.status === 204 || response.status === 409) {
+                    // 409 : le serveur indique l'offset à partir duquel reprendre
+                    offset = parseInt(response.headers.get('Upload-Offset'), 10);
+                    retries = 0;
+                } else if (response.status === 429) {
+                    // Serveur chargé : patienter le délai indiqué puis reprendre
+                    const wait = parseInt(response.headers.get('Retry-After'), 10) || 5;
+                    status.textContent = `Serveur occupé, reprise dans ${wait} s...`;
+                    await sleep(wait * 1000);
+                    continue;
+                } else {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+            } catch (error) {
+                retries += 1;
+                if (retries > MAX_RETRIES) {
+                    throw error;
+                }
+                status.textContent = `Connexion interrompue, reprise (${retries}/${MAX_RETRIES})...`;
+                await sleep(Math.min(1000 * 2 ** retries, 30000));
+                const resumed = await currentOffset(upload).catch(() => offset);
+                if (resumed === null) {
+                    throw new Error('Envoi expiré');
+                }
+                offset = resumed;
+                continue;
+            }
+            status.textContent = `Envoi : ${Math.round(offset * 100 / file.size)}%`;
+        }
+
+        hiddenInput(`${field}_upload_id`).value = upload.id;
+        hiddenInput(`${field}_upload_token`).value = upload.token;
+        localStorage.removeItem(key);
+        status.className = 'upload-status d-block mt-1 text-success';
+        status.textContent = '✓ Document envoyé';
+    }
+
+    function startUpload(input) {
+        const field = input.name;
+        if (uploads[field]) {
+            uploads[field].cancelled = true;
+        }
+        hiddenInput(`${field}_upload_id`).value = '';
+        hiddenInput(`${field}_upload_token`).value = '';
+        const file = input.files && input.files[0];
+        if (!file) {
+            delete uploads[field];
+            return;
+        }
+
+        const state = { cancelled: false, failed: false };
+        state.promise = uploadFile(input, file, state).catch(error => {
+            state.failed = true;
+            const status = statusElement(input);
+            status.className = 'upload-status d-block mt-1 text-warning';
+            status.textContent = 'Envoi anticipé impossible, le fichier partira avec le formulaire';
+            console.log('Erreur envoi fragmenté:', error);
+        });
+        uploads[field] = state;
+    }
+
+    form.querySelectorAll('input[type="file"]').forEach(input => {
+        input.addEventListener('change', function() {
+            // Laisser les autres gestionnaires (compression, aperçu) agir d'abord ;
+            // la compression redéclenche 'change' avec le fichier réduit
+            setTimeout(() => {
+                if (this.dataset.compressing !== '1') {
+                    startUpload(this);
+                }
+            }, 0);
+        });
+    });
+
+    form.addEventListener('submit', function(e) {
+        if (form.dataset.uploadsReady === '1') {
+            return;
+        }
+        const pending = Object.values(uploads).filter(state => !state.cancelled);
+        if (pending.length === 0 || !navigator.onLine) {
+            // Hors ligne : ne pas attendre les reprises, offline.js met la demande en file
+            return;
+        }
+
+        e.preventDefault();
+        e.stopImmediatePropagation();
+        Promise.all(pending.map(state => state.promise)).then(() => {
+            // Les fichiers déjà envoyés ne sont pas renvoyés avec le formulaire
+            form.querySelectorAll('input[type="file"]').forEach(input => {
+                const hidden = form.querySelector(`input[name="${input.name}_upload_id"]`);
+                if (hidden && hidden.value) {
+                    input.disabled = true;
+                }
+            });
+            form.dataset.uploadsReady = '1';
+            form.requestSubmit ? form.requestSubmit() : form.submit();
+        });
+    }, true);
+
+    form.addEventListener('reset', function() {
+        Object.values(uploads).forEach(state => { state.cancelled = true; });
+        form.querySelectorAll('input[name$="_upload_id"], input[name$="_upload_token"]').forEach(hidden => { hidden.value = ''; });
+        form.querySelectorAll('.upload-status').forEach(status => { status.textContent = ''; });
+        form.querySelectorAll('input[type="file"]').forEach(input => { input.disabled = false; });
+        delete form.dataset.uploadsReady;
+    });
+});
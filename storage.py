@@ -0,0 +1,181 @@
+"""Stockage des documents envoyés : disque local ou service compatible S3.
+
+Le pilote est choisi par STORAGE_BACKEND ('local' par défaut, ou 's3').
+Le pilote S3 fonctionne avec AWS, MinIO ou tout autre service compatible
+(S3_ENDPOINT_URL) ; les téléchargements passent par des URL présignées et
+ne traversent donc pas les workers Python.
+"""
+import os
+import shutil
+
+from flask import current_app, send_from_directory, redirect, abort
+from werkzeug.security import safe_join
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 n'est requis que pour STORAGE_BACKEND=s3
+    boto3 = None
+    ClientError = Exception
+
+
+class LocalStorage:
+    """Documents stockés dans UPLOAD_FOLDER (un seul serveur)"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, name):
+        # Refuser les noms qui sortiraient du dossier (../, chemins absolus)
+        path = safe_join(self.folder, name)
+        if path is None:
+            raise ValueError(f"Nom de fichier invalide: {name}")
+        return path
+
+    def save(self, fileobj, name, content_type=None):
+        with open(self._path(name), 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+
+    def save_path(self, local_path, name, content_type=None):
+        """Déplacer un fichier local déjà écrit (envoi fragmenté terminé)."""
+        os.replace(local_path, self._path(name))
+
+    def open(self, name):
+        return open(self._path(name), 'rb')
+
+    def exists(self, name):
+        try:
+            return os.path.isfile(self._path(name))
+        except ValueError:
+            return False
+
+    def size(self, name):
+        return os.path.getsize(self._path(name))
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self):
+        """Itérer sur (nom, taille, date de modification) des documents stockés."""
+        if not os.path.isdir(self.folder):
+            return
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, stat.st_mtime
+
+    def url(self, name):
+        return None
+
+    def send(self, name):
+        if not self.exists(name):
+            abort(404)
+        return send_from_directory(self.folder, name)
+
+
+class S3Storage:
+    """Documents stockés dans un bucket compatible S3 (plusieurs serveurs)"""
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, url_expires=300):
+        if boto3 is None:
+            raise RuntimeError("boto3 est requis pour STORAGE_BACKEND=s3")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.url_expires = url_expires
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None
+        )
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def save(self, fileobj, name, content_type=None):
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, self._key(name), ExtraArgs=extra)
+
+    def save_path(self, local_path, name, content_type=None):
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(local_path, self.bucket, self._key(name), ExtraArgs=extra)
+        os.remove(local_path)
+
+    def open(self, name):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body']
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except ClientError:
+            return None
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['ContentLength']
+
+    def delete(self, name):
+        if not self.exists(name):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+        return True
+
+    def list(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(self.prefix):]
+                if name and '/' not in name:
+                    yield name, obj['Size'], obj['LastModified'].timestamp()
+
+    def url(self, name):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(name)},
+            ExpiresIn=self.url_expires
+        )
+
+    def send(self, name):
+        # Le navigateur télécharge directement depuis le bucket
+        return redirect(self.url(name), code=302)
+
+
+def create_storage(config):
+    """Construire le pilote décrit par la configuration."""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            prefix=config.get('S3_PREFIX', ''),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY_ID'),
+            secret_key=config.get('S3_SECRET_ACCESS_KEY'),
+            url_expires=config.get('S3_PRESIGNED_URL_EXPIRES', 300)
+        )
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    raise ValueError(f"STORAGE_BACKEND inconnu: {backend}")
+
+
+def init_storage(app):
+    app.extensions['storage'] = create_storage(app.config)
+    return app.extensions['storage']
+
+
+def get_storage():
+    """Pilote de stockage de l'application courante."""
+    return current_app.extensions['storage']
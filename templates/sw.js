@@ -0,0 +1,119 @@
+// Service worker du formulaire de demande (voir offline.py)
+{% if disabled %}
+// Mode hors ligne désactivé (OFFLINE_FORM_ENABLED=0) : nettoyer puis se désinstaller
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => key.startsWith('reed-')).map(key => caches.delete(key))))
+            .then(() => self.registration.unregister())
+    );
+});
+{% else %}
+const CACHE_NAME = 'reed-shell-{{ version }}';
+const FORM_URL = {{ form_url|tojson }};
+const PRECACHE = {{ precache|tojson }};
+
+importScripts({{ store_url|tojson }});
+
+let flushing = null;
+
+function flushOutbox() {
+    // Une seule vidange à la fois (sync, message de la page)
+    if (!flushing) {
+        flushing = ReedOffline.flushOutbox(FORM_URL)
+            .then(result => notifyClients(Object.assign({ type: 'reed-outbox' }, result)))
+            .finally(() => { flushing = null; });
+    }
+    return flushing;
+}
+
+async function notifyClients(message) {
+    const clients = await self.clients.matchAll({ type: 'window' });
+    clients.forEach(client => client.postMessage(message));
+}
+
+async function cacheShell(response) {
+    // Seule une page sans message flash est réutilisable (en-tête X-Offline-Shell)
+    if (response.ok && response.headers.get('X-Offline-Shell') === '1') {
+        const cache = await caches.open(CACHE_NAME);
+        await cache.put(FORM_URL, response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(CACHE_NAME);
+        await Promise.all(PRECACHE.map(async url => {
+            try {
+                // CDN sans CORS : réponse opaque, conservée telle quelle
+                const response = await fetch(url, { mode: url.startsWith('http') ? 'no-cors' : 'same-origin' });
+                if (response.ok || response.type === 'opaque') {
+                    await cache.put(url, response);
+                }
+            } catch (error) {
+                console.log('Mise en cache impossible:', url, error);
+            }
+        }));
+        await fetch(FORM_URL, { credentials: 'same-origin', cache: 'reload' })
+            .then(cacheShell)
+            .catch(() => null);
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const keys = await caches.keys();
+        await Promise.all(keys.filter(key => key.startsWith('reed-shell-') && key !== CACHE_NAME)
+            .map(key => caches.delete(key)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    // Page du formulaire : réponse immédiate depuis le cache, rafraîchie en arrière-plan
+    // (avec une requête, ex. ?retour=1 après un refus : le réseau, pour les messages flash)
+    if (request.mode === 'navigate' && url.origin === self.location.origin && url.pathname === FORM_URL) {
+        if (url.search) {
+            event.respondWith(fetch(request).catch(() => caches.match(FORM_URL)));
+            return;
+        }
+        event.respondWith((async () => {
+            const network = fetch(request).then(cacheShell);
+            const cached = await caches.match(FORM_URL);
+            if (cached) {
+                event.waitUntil(network.catch(() => null));
+                return cached;
+            }
+            return network;
+        })());
+        return;
+    }
+
+    // Fichiers empreintés et CDN : le cache d'abord (contenu immuable pour une URL donnée)
+    const precached = url.origin === self.location.origin ? url.pathname : request.url;
+    if (PRECACHE.includes(precached) || url.pathname.startsWith('/assets/')) {
+        event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === ReedOffline.SYNC_TAG) {
+        event.waitUntil(flushOutbox());
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'reed-flush') {
+        event.waitUntil(flushOutbox().catch(error => console.log('Envoi différé:', error.message)));
+    }
+});
+{% endif %}
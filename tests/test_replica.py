@@ -0,0 +1,104 @@
+"""Routage des lectures vers le réplica, avec deux bases SQLite locales."""
+import os
+import sys
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, StudentRequest  # noqa: E402
+from replica import init_replica, read_only, mark_primary_reads  # noqa: E402
+
+
+def _add_student(nom):
+    db.session.add(StudentRequest(nom=nom, prenom='Test', adresse='Dakar',
+                                  telephone='770000000', email=f'{nom.lower()}@example.sn'))
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        DATABASE_REPLICA_URL=f"sqlite:///{tmp_path / 'replica.db'}",
+        DB_ENGINE_PROFILES=False,
+        REPLICA_MAX_LAG_SECONDS=5,
+        REPLICA_HEALTH_CHECK_INTERVAL=0,
+        REPLICA_READ_YOUR_WRITES_SECONDS=10,
+    )
+    db.init_app(app)
+    init_replica(app)
+
+    # Même schéma, contenus différents : on voit quelle base a répondu
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(app.extensions['replica'].engine)
+        _add_student('Primaire')
+        db.session.commit()
+    with app.extensions['replica'].engine.begin() as conn:
+        conn.execute(StudentRequest.__table__.insert().values(
+            nom='Replica', prenom='Test', adresse='Dakar', telephone='770000000',
+            email='replica@example.sn', region_universitaire='Dakar', status='pending'))
+
+    def names():
+        return ','.join(s.nom for s in StudentRequest.query.order_by(StudentRequest.id))
+
+    @app.route('/read')
+    @read_only
+    def read():
+        return names()
+
+    @app.route('/plain')
+    def plain():
+        return names()
+
+    @app.route('/write', methods=['POST'])
+    @read_only
+    def write():
+        _add_student('Nouveau')
+        db.session.commit()
+        mark_primary_reads()
+        return 'ok'
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions['replica'].engine.dispose()
+
+
+def test_read_only_view_reads_replica(app):
+    client = app.test_client()
+    assert client.get('/read').text == 'Replica'
+    assert client.get('/plain').text == 'Primaire'
+
+
+def test_flush_goes_to_primary(app):
+    client = app.test_client()
+    assert client.post('/write').text == 'ok'
+
+    with app.app_context():
+        assert [s.nom for s in StudentRequest.query.order_by(StudentRequest.id)] == ['Primaire', 'Nouveau']
+    with app.extensions['replica'].engine.connect() as conn:
+        assert conn.execute(text('SELECT nom FROM student_request')).scalars().all() == ['Replica']
+
+
+def test_falls_back_to_primary_when_probe_fails(app, monkeypatch):
+    def unavailable():
+        raise ConnectionError('réplica arrêté')
+
+    monkeypatch.setattr(app.extensions['replica'], '_probe', unavailable)
+    assert app.test_client().get('/read').text == 'Primaire'
+
+
+def test_mark_primary_reads_forces_primary(app):
+    client = app.test_client()
+    client.post('/write')
+    assert client.get('/read').text == 'Primaire,Nouveau'
+
+    # Un autre admin (autre session) lit toujours le réplica
+    assert app.test_client().get('/read').text == 'Replica'
@@ -0,0 +1,104 @@
+"""Pilotes de stockage : disque local et S3 simulé par moto."""
+import io
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import LocalStorage, S3Storage, create_storage  # noqa: E402
+
+
+def test_local_storage_roundtrip(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'uploads'))
+    storage.save(io.BytesIO(b'%PDF-1.4 test'), 'doc.pdf')
+
+    assert storage.exists('doc.pdf')
+    assert storage.size('doc.pdf') == 13
+    with storage.open('doc.pdf') as stream:
+        assert stream.read() == b'%PDF-1.4 test'
+    assert [name for name, _, _ in storage.list()] == ['doc.pdf']
+    assert storage.url('doc.pdf') is None
+
+    assert storage.delete('doc.pdf')
+    assert not storage.delete('doc.pdf')
+    assert not storage.exists('doc.pdf')
+
+
+def test_local_storage_save_path(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'uploads'))
+    source = tmp_path / 'chunked.part'
+    source.write_bytes(b'abc')
+    storage.save_path(str(source), 'doc.png')
+
+    assert not source.exists()
+    assert storage.size('doc.png') == 3
+
+
+@pytest.mark.parametrize('name', ['../secret.txt', '/etc/passwd', 'a/../../secret.txt'])
+def test_local_storage_rejects_paths_outside_folder(tmp_path, name):
+    (tmp_path / 'secret.txt').write_text('secret')
+    storage = LocalStorage(str(tmp_path / 'uploads'))
+
+    assert not storage.exists(name)
+    with pytest.raises(ValueError):
+        storage.open(name)
+    with pytest.raises(ValueError):
+        storage.save(io.BytesIO(b'x'), name)
+
+
+def test_local_storage_send(tmp_path):
+    storage = LocalStorage(str(tmp_path / 'uploads'))
+    storage.save(io.BytesIO(b'hello'), 'doc.pdf')
+    app = Flask(__name__)
+
+    with app.test_request_context():
+        response = storage.send('doc.pdf')
+        response.direct_passthrough = False
+        assert response.status_code == 200
+        assert response.get_data() == b'hello'
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='reed')
+        yield create_storage({
+            'STORAGE_BACKEND': 's3',
+            'S3_BUCKET': 'reed',
+            'S3_PREFIX': 'uploads',
+            'S3_REGION': 'us-east-1',
+            'S3_PRESIGNED_URL_EXPIRES': 60
+        })
+
+
+def test_s3_storage_roundtrip(s3_storage):
+    assert isinstance(s3_storage, S3Storage)
+    s3_storage.save(io.BytesIO(b'%PDF-1.4 test'), 'doc.pdf', 'application/pdf')
+
+    assert s3_storage.exists('doc.pdf')
+    assert s3_storage.size('doc.pdf') == 13
+    assert s3_storage.open('doc.pdf').read() == b'%PDF-1.4 test'
+    assert [name for name, _, _ in s3_storage.list()] == ['doc.pdf']
+
+    assert s3_storage.delete('doc.pdf')
+    assert not s3_storage.delete('doc.pdf')
+    with pytest.raises(FileNotFoundError):
+        s3_storage.size('doc.pdf')
+
+
+def test_s3_storage_send_redirects_to_presigned_url(s3_storage):
+    s3_storage.save(io.BytesIO(b'x'), 'doc.pdf')
+    app = Flask(__name__)
+
+    with app.test_request_context():
+        response = s3_storage.send('doc.pdf')
+    assert response.status_code == 302
+    assert 'uploads/doc.pdf' in response.location
+    assert 'Expires=' in response.location or 'X-Amz-Expires=60' in response.location
@@ -0,0 +1,239 @@
+"""Envois fragmentés et reprenables des documents (protocole inspiré de tus 1.0).
+
+Déroulement côté navigateur, pour chaque document :
+
+1. POST /upload-sessions {"field", "filename", "size"} -> {"id", "token", "offset": 0}
+2. PATCH /upload-sessions/<id> avec l'en-tête Upload-Offset et un fragment
+   (application/offset+octet-stream) jusqu'à atteindre la taille annoncée
+3. Après une coupure : HEAD /upload-sessions/<id> renvoie Upload-Offset
+   et l'envoi reprend à partir de cet octet
+4. Le formulaire transmet <field>_upload_id et <field>_upload_token au lieu
+   du fichier
+
+Le jeton, gardé en base (upload_session.owner_token), prouve que l'envoi
+appartient au navigateur : il accompagne chaque appel dans l'en-tête
+Upload-Token. Les envois d'un même formulaire sont créés en parallèle : un
+cookie de session réécrit par chaque réponse en perdrait.
+"""
+import os
+import secrets
+import mimetypes
+from datetime import datetime
+
+from flask import request, jsonify, current_app
+from werkzeug.utils import secure_filename
+
+from database import db, UploadSession, DOCUMENT_FIELDS
+from storage import get_storage
+from inventory import hash_stream, register_document
+
+TUS_VERSION = '1.0.0'
+PARTIAL_DIRNAME = '.partial'
+
+
+def _partial_folder():
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIRNAME)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _partial_path(upload_id):
+    return os.path.join(_partial_folder(), f"{upload_id}.part")
+
+
+def _extension(filename):
+    if '.' not in filename:
+        return None
+    ext = filename.rsplit('.', 1)[1].lower()
+    return ext if ext in current_app.config['ALLOWED_EXTENSIONS'] else None
+
+
+def _tus_headers(response, upload):
+    response.headers['Tus-Resumable'] = TUS_VERSION
+    response.headers['Upload-Offset'] = str(upload.offset)
+    response.headers['Upload-Length'] = str(upload.total_size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _owned_upload(upload_id, token=None):
+    """Retourner la session d'envoi si le jeton est celui remis à sa création."""
+    if token is None:
+        token = request.headers.get('Upload-Token', '')
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or not upload.owner_token or not token:
+        return None
+    if not secrets.compare_digest(upload.owner_token, token):
+        return None
+    return upload
+
+
+def purge_expired_uploads():
+    """Supprimer les envois abandonnés plus vieux que UPLOAD_SESSION_TTL."""
+    limit = datetime.utcnow() - current_app.config['UPLOAD_SESSION_TTL']
+    expired = UploadSession.query.filter(UploadSession.created_at < limit).limit(100).all()
+    for upload in expired:
+        try:
+            os.remove(_partial_path(upload.id))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"✗ Erreur suppression envoi partiel {upload.id}: {str(e)}")
+        db.session.delete(upload)
+    if expired:
+        db.session.commit()
+        print(f"✓ {len(expired)} envoi(s) expiré(s) supprimé(s)")
+
+
+def upload_ready(upload_id, field, token):
+    """Vérifier qu'un envoi est terminé et correspond au document attendu."""
+    upload = _owned_upload(upload_id, token)
+    return upload is not None and upload.field == field and upload.is_complete
+
+
+def claim_upload(upload_id, field, request_id, token):
+    """Rattacher un envoi terminé à une demande et retourner le nom du fichier.
+
+    Retourne None si l'envoi est inconnu, incomplet, appartient à un autre
+    navigateur (jeton différent) ou a été fait pour un autre document.
+    """
+    if not upload_ready(upload_id, field, token):
+        return None
+
+    upload = _owned_upload(upload_id, token)
+    ext = _extension(upload.filename)
+    filename = secure_filename(f"{request_id}_{field}.{ext}")
+    with open(_partial_path(upload.id), 'rb') as f:
+        reader = hash_stream(f)
+    get_storage().save_path(_partial_path(upload.id), filename, mimetypes.guess_type(filename)[0])
+    register_document(filename, request_id, field, reader)
+
+    db.session.delete(upload)
+    return filename
+
+
+def init_uploads(app):
+    """Enregistrer les routes du protocole d'envoi fragmenté."""
+
+    @app.route('/upload-sessions', methods=['POST'])
+    def create_upload_session():
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'Données JSON requises'}), 400
+
+        field = data.get('field')
+        filename = str(data.get('filename', '')).strip()
+        try:
+            size = int(data.get('size', 0))
+        except (TypeError, ValueError):
+            size = 0
+
+        if field not in DOCUMENT_FIELDS:
+            return jsonify({'error': 'Document inconnu'}), 400
+        if not _extension(filename):
+            return jsonify({'error': 'Le fichier doit être au format PDF, PNG ou JPG'}), 400
+        if size <= 0 or size > app.config['MAX_UPLOAD_SIZE']:
+            return jsonify({'error': 'Taille de fichier invalide (max 16MB)'}), 413
+
+        try:
+            purge_expired_uploads()
+
+            upload = UploadSession(
+                id=secrets.token_hex(16),
+                field=field,
+                filename=filename,
+                total_size=size,
+                offset=0,
+                owner_token=secrets.token_urlsafe(32)
+            )
+            db.session.add(upload)
+            db.session.commit()
+            open(_partial_path(upload.id), 'wb').close()
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Erreur création envoi: {str(e)}")
+            return jsonify({'error': 'Erreur interne du serveur'}), 500
+
+        response = jsonify({
+            'id': upload.id,
+            'token': upload.owner_token,
+            'offset': 0,
+            'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+        })
+        response.status_code = 201
+        response.headers['Location'] = f"/upload-sessions/{upload.id}"
+        return _tus_headers(response, upload)
+
+    @app.route('/upload-sessions/<upload_id>', methods=['GET', 'HEAD'])
+    def upload_session_status(upload_id):
+        upload = _owned_upload(upload_id)
+        if upload is None:
+            return jsonify({'error': 'Envoi introuvable'}), 404
+
+        response = jsonify({
+            'id': upload.id,
+            'field': upload.field,
+            'offset': upload.offset,
+            'size': upload.total_size,
+            'complete': upload.is_complete
+        })
+        return _tus_headers(response, upload)
+
+    @app.route('/upload-sessions/<upload_id>', methods=['PATCH'])
+    def upload_session_chunk(upload_id):
+        upload = _owned_upload(upload_id)
+        if upload is None:
+            return jsonify({'error': 'Envoi introuvable'}), 404
+
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({'error': 'En-tête Upload-Offset requis'}), 400
+
+        # Le client reprend toujours à l'offset connu du serveur
+        if offset != upload.offset:
+            return _tus_headers(jsonify({'error': 'Offset invalide', 'offset': upload.offset}), upload), 409
+
+        length = request.content_length
+        if length is None or length > app.config['UPLOAD_CHUNK_SIZE']:
+            return jsonify({'error': 'Fragment trop volumineux'}), 413
+        if offset + length > upload.total_size:
+            return jsonify({'error': 'Le fragment dépasse la taille annoncée'}), 400
+
+        try:
+            chunk = request.stream.read(length)
+            with open(_partial_path(upload.id), 'r+b') as f:
+                f.seek(offset)
+                f.write(chunk)
+                f.truncate()
+
+            # Mise à jour conditionnelle : un seul PATCH gagne par offset
+            updated = UploadSession.query.filter_by(id=upload.id, offset=offset).update(
+                {'offset': offset + len(chunk), 'updated_at': datetime.utcnow()}
+            )
+            db.session.commit()
+            if not updated:
+                db.session.refresh(upload)
+                return _tus_headers(jsonify({'error': 'Offset invalide', 'offset': upload.offset}), upload), 409
+            db.session.refresh(upload)
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Erreur écriture fragment {upload_id}: {str(e)}")
+            return jsonify({'error': 'Erreur interne du serveur'}), 500
+
+        response = _tus_headers(app.response_class(status=204), upload)
+        return response
+
+    @app.route('/upload-sessions/<upload_id>', methods=['DELETE'])
+    def cancel_upload_session(upload_id):
+        upload = _owned_upload(upload_id)
+        if upload is None:
+            return jsonify({'error': 'Envoi introuvable'}), 404
+
+        try:
+            os.remove(_partial_path(upload.id))
+        except FileNotFoundError:
+            pass
+        db.session.delete(upload)
+        db.session.commit()
+        return jsonify({'success': True})
@@ -0,0 +1,82 @@
+"""Démarrage de l'application sous gunicorn avec preload_app.
+
+Avec preload_app, app.py est importé une seule fois dans le processus maître
+(modules, configuration, modèles et gabarits Jinja compilés), puis les
+workers sont créés par fork et partagent cette mémoire. Les connexions à la
+base ouvertes dans le maître ne doivent pas être réutilisées par les workers :
+post_fork (gunicorn.conf.py) appelle reset_after_fork() puis warm_pool() pour
+que chaque worker ouvre ses propres connexions avant de recevoir du trafic.
+
+GET /healthz : sonde de disponibilité légère (un SELECT 1 sur le pool).
+"""
+import threading
+
+from flask import jsonify
+from sqlalchemy import text
+
+from database import db
+
+
+def precompile_templates(app):
+    """Compiler tous les gabarits dans le cache de l'environnement Jinja."""
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as e:
+            print(f"✗ Erreur compilation gabarit {name}: {str(e)}")
+    return count
+
+
+def _engines(app):
+    with app.app_context():
+        engines = list(db.engines.values())
+    router = app.extensions.get('replica')
+    if router is not None:
+        engines.append(router.engine)
+    return engines
+
+
+def reset_after_fork(app):
+    """Abandonner dans le worker les connexions héritées du maître."""
+    for engine in _engines(app):
+        # close=False : ne pas fermer les sockets encore utilisées par le maître
+        engine.dispose(close=False)
+
+    router = app.extensions.get('replica')
+    if router is not None:
+        router._lock = threading.Lock()
+        router._checked_at = 0.0
+
+
+def warm_pool(app, size=1):
+    """Ouvrir size connexions à la base principale et les rendre au pool."""
+    with app.app_context():
+        engine = db.engine
+    connections = []
+    try:
+        for _ in range(max(1, size)):
+            conn = engine.connect()
+            conn.execute(text('SELECT 1'))
+            connections.append(conn)
+    except Exception as e:
+        print(f"✗ Préchauffage du pool incomplet: {str(e)}")
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+
+def init_warmup(app):
+
+    @app.route('/healthz')
+    def healthz():
+        """Disponibilité du worker et de la base (pour le répartiteur de charge)"""
+        try:
+            db.session.execute(text('SELECT 1'))
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ /healthz: base indisponible: {str(e)}")
+            return jsonify({'status': 'unavailable'}), 503
+        return jsonify({'status': 'ok'})